@@ -0,0 +1,112 @@
+"""Import time of the Lambda handler, measured with python -X importtime
+
+Imports app.py in fresh interpreters and reports the time of the slowest
+imports, to find what to defer when the cold start gets slower. The budget
+of the import and the modules deferred to their first use are checked by
+tests/test_importtime.py.
+
+Usage: python benchmarks/importtime.py [--repeat N] [--output FILE]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@dataclass
+class Import:
+    """A line of the -X importtime report, the times are in microseconds"""
+
+    module: str
+    self_time: int
+    cumulative: int
+    depth: int
+
+
+def measure(module: str) -> list[Import]:
+    """Imports a module in a fresh interpreter
+
+    Args:
+        module (str): The module to import
+
+    Returns:
+        list[Import]: The imports, in the order they finished
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT / "src"), str(ROOT)]))
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        imports.append(
+            Import(
+                name.strip(),
+                int(self_time),
+                int(cumulative),
+                (len(name) - len(name.lstrip())) // 2,
+            )
+        )
+    return imports
+
+
+def main() -> None:
+    """Measures the import of the handler and reports the slowest imports"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", type=Path, help="write the report to a file")
+    args = parser.parse_args()
+
+    # the fastest run is the least disturbed by the rest of the machine
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda imports: imports[-1].cumulative)
+    total = best[-1].cumulative / 1000
+    slowest = sorted(
+        (item for item in best if item.depth <= 2),
+        key=lambda item: item.cumulative,
+        reverse=True,
+    )[: args.top]
+
+    for item in slowest:
+        print(
+            f"{'  ' * item.depth + item.module:<60} {item.cumulative / 1000:>8.1f} ms",
+            file=sys.stderr,
+        )
+    print(f"{'total':<60} {total:>8.1f} ms", file=sys.stderr)
+
+    report = json.dumps(
+        {
+            "module": args.module,
+            "python": sys.version.split()[0],
+            "total_ms": total,
+            "slowest": [
+                {"module": item.module, "cumulative_ms": item.cumulative / 1000}
+                for item in slowest
+            ],
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
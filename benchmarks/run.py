@@ -0,0 +1,406 @@
+"""Benchmarks of the game engine and of the request paths
+
+Runs offline: redis is replaced by fakeredis, or by the in-memory database
+with --storage memory, and the Firebase token verification by a stub. The
+results are printed as JSON so runs on different commits can be compared.
+
+With --move-mode script the moves are played in redis by the Lua script,
+which needs lupa installed for fakeredis.
+
+Usage: python benchmarks/run.py [--quick] [--repeat N] [--storage fakeredis|memory]
+                                [--cache-size N] [--move-mode python|script]
+                                [--output FILE]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from cinasweeper_backend.cinasweeper_logic import (BoardSize, GameMode,  # noqa: E402
+                                                   GameState, Move, User)
+from cinasweeper_backend.cinasweeper_logic import minesweeper  # noqa: E402
+
+BOARDS = [
+    BoardSize(14, 14, 30),
+    BoardSize(16, 30, 99),
+    BoardSize(100, 100, 1000),
+    BoardSize(100, 100, 2000),
+    BoardSize(500, 500, 37500),
+    BoardSize(1000, 1000, 150000),
+]
+QUICK_BOARDS = BOARDS[:4]
+# the flags sent in one request by the batch benchmark
+BATCH_MOVES = 10
+
+
+@dataclass
+class Case:
+    """A single benchmark
+
+    setup is called before every run and returns the function to time.
+    """
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    params: dict = field(default_factory=dict)
+
+
+def size_params(size: BoardSize) -> dict:
+    """Returns the parameters describing a board size"""
+    return {"height": size.height, "width": size.width, "mines": size.num_mines}
+
+
+def center(size: BoardSize) -> tuple[int, int]:
+    """Returns the cell in the center of the board"""
+    return (size.height // 2, size.width // 2)
+
+
+def played_state(size: BoardSize) -> GameState:
+    """Returns the state of a game with one reveal in the center"""
+    state = GameState(None, size)
+    state.seed = 0
+    state.first_click = center(size)
+    state.progress = minesweeper.Progress(
+        size.num_mines, size.cells - size.num_mines
+    )
+    state.play_move(Move(*center(size), 1))
+    return state
+
+
+def closed_safe_cell(state: GameState) -> tuple[int, int]:
+    """Returns a random closed cell without a mine"""
+    rng = random.Random(0)
+    board = state.board
+    while True:
+        row, col = rng.randrange(board.height), rng.randrange(board.width)
+        if not board.is_open(row, col) and not board.is_mine(row, col):
+            return row, col
+
+
+def engine_cases(size: BoardSize) -> list[Case]:
+    """Returns the benchmarks of the minesweeper engine for a board size"""
+    params = size_params(size)
+    step = center(size)
+    mines = minesweeper.set_mines(size.height, size.width, size.num_mines, step, 0)
+
+    def flood_fill() -> Callable[[], object]:
+        board = minesweeper.create_board(
+            size.height, size.width, size.num_mines, step, 0
+        )
+        return lambda: minesweeper.check_ceil(board, step)
+
+    def play_move() -> Callable[[], object]:
+        state = played_state(size)
+        move = Move(*closed_safe_cell(state), 1)
+        return lambda: state.play_move(move)
+
+    def play_flag() -> Callable[[], object]:
+        state = played_state(size)
+        move = Move(*closed_safe_cell(state), 0)
+        return lambda: state.play_move(move)
+
+    def check_win() -> Callable[[], object]:
+        progress = played_state(size).progress
+        return lambda: minesweeper.check_win(progress)
+
+    return [
+        Case(
+            "generate_board",
+            lambda: lambda: minesweeper.generate_board(size.height, size.width),
+            params,
+        ),
+        Case(
+            "set_mines",
+            lambda: lambda: minesweeper.set_mines(
+                size.height, size.width, size.num_mines, step, 0
+            ),
+            params,
+        ),
+        Case(
+            "get_info_board",
+            lambda: lambda: minesweeper.get_info_board(
+                size.height, size.width, mines
+            ),
+            params,
+        ),
+        Case(
+            "create_board",
+            lambda: lambda: minesweeper.create_board(
+                size.height, size.width, size.num_mines, step, 0
+            ),
+            params,
+        ),
+        Case("check_ceil", flood_fill, params),
+        Case("check_win", check_win, params),
+        Case("GameState.play_move[reveal]", play_move, params),
+        Case("GameState.play_move[flag]", play_flag, params),
+    ]
+
+
+def serializer_cases() -> list[Case]:
+    """Returns the benchmarks of the game serializer"""
+    from cinasweeper_backend.cinasweeper_database.database import Serializer
+
+    serializer = Serializer(None)
+    game_json = {
+        "id": "benchmark",
+        "owner": "benchmark",
+        "started": True,
+        "started_time": 0,
+        "type": GameMode.SINGLEPLAYER.name,
+        "opponent_id": None,
+        "score": 0,
+        "ended": False,
+    }
+    game = serializer.from_json(game_json)
+    return [
+        Case("Serializer.to_json", lambda: lambda: serializer.to_json(game)),
+        Case(
+            "Serializer.from_json", lambda: lambda: serializer.from_json(game_json)
+        ),
+    ]
+
+
+def state_serializer_cases(size: BoardSize) -> list[Case]:
+    """Returns the benchmarks of the game state serializer and of the state
+    codecs for a board size; the codecs also report the size of a record"""
+    from cinasweeper_backend.cinasweeper_database import BinaryStateCodec
+    from cinasweeper_backend.cinasweeper_database.database import Serializer
+
+    params = size_params(size)
+    serializer = Serializer(None)
+    codec = BinaryStateCodec()
+    record = json.dumps(serializer.state_to_json(played_state(size)))
+    packed = codec.pack(played_state(size))
+
+    def state_to_json() -> Callable[[], object]:
+        state = played_state(size)
+        return lambda: serializer.state_to_json(state)
+
+    def state_from_json() -> Callable[[], object]:
+        obj = json.loads(json.dumps(serializer.state_to_json(played_state(size))))
+        return lambda: serializer.state_from_json(obj).board
+
+    def json_encode() -> Callable[[], object]:
+        state = played_state(size)
+        return lambda: json.dumps(serializer.state_to_json(state))
+
+    def json_decode() -> Callable[[], object]:
+        return lambda: serializer.state_from_json(json.loads(record)).board
+
+    def binary_encode() -> Callable[[], object]:
+        state = played_state(size)
+        return lambda: codec.pack(state)
+
+    def binary_decode() -> Callable[[], object]:
+        return lambda: codec.unpack(serializer, packed).board
+
+    json_params = dict(params, bytes=len(record))
+    binary_params = dict(params, bytes=len(packed))
+    return [
+        Case("Serializer.state_to_json", state_to_json, params),
+        Case("Serializer.state_from_json", state_from_json, params),
+        Case("JsonStateCodec.encode", json_encode, json_params),
+        Case("JsonStateCodec.decode", json_decode, json_params),
+        Case("BinaryStateCodec.pack", binary_encode, binary_params),
+        Case("BinaryStateCodec.unpack", binary_decode, binary_params),
+    ]
+
+
+def api_cases(
+    sizes: list[BoardSize],
+    storage: str = "fakeredis",
+    cache_size: int = 0,
+    move_mode: str = "python",
+) -> list[Case]:
+    """Returns the end to end benchmarks of POST /games/{id}/moves, and of
+    POST /games/{id}/moves/batch with BATCH_MOVES flags
+
+    The API runs against fakeredis, with a cache of the games of cache_size
+    games if it is set and the moves played by MOVE_SCRIPT in the script
+    move mode, or against the in-memory database, with a stub instead of
+    Firebase.
+    """
+    import fakeredis
+    from fastapi.testclient import TestClient
+
+    from cinasweeper_backend.cinasweeper_api import api
+    from cinasweeper_backend.cinasweeper_database import (AsyncDatabase,
+                                                          AsyncInMemoryDatabase,
+                                                          BinaryStateCodec,
+                                                          Database, GameCache)
+
+    class StubAuthManager:
+        """Accepts every token as the id of the user"""
+
+        def verify(self, token: str) -> dict[str, str]:
+            return {"user_id": token, "email": f"{token}@example.com"}
+
+        def name_from_token(self, token: dict[str, str]) -> None:
+            return None
+
+        def display_names(self, user_ids: list[str]) -> dict[str, None]:
+            return dict.fromkeys(user_ids)
+
+    if storage == "memory":
+        # the sync methods of the in-memory database set up the games
+        async_database = database = AsyncInMemoryDatabase()
+        create_game, get_game_state = database.new_game, database.load_game_state
+    else:
+        server = fakeredis.FakeServer()
+        codec = BinaryStateCodec(raw_cells=True) if move_mode == "script" else None
+        database = Database(fakeredis.FakeRedis(server=server), codec)
+        async_database = AsyncDatabase(
+            database,
+            fakeredis.aioredis.FakeRedis(server=server),
+            GameCache(cache_size, ttl=3600) if cache_size else None,
+        )
+        create_game, get_game_state = database.create_game, database.get_game_state
+    manager = StubAuthManager()
+
+    async def database_dependency() -> AsyncDatabase | AsyncInMemoryDatabase:
+        return async_database
+
+    async def manager_dependency() -> StubAuthManager:
+        return manager
+
+    api.app.dependency_overrides[api.database_dependency] = database_dependency
+    api.app.dependency_overrides[api.manager_dependency] = manager_dependency
+    # entered once, so that every request runs on the same event loop
+    client = TestClient(api.app).__enter__()
+    user = User("benchmark", database)
+    headers = {"Authorization": f"Bearer {user.identifier}"}
+
+    def post_move(size: BoardSize, query: str, batch: int) -> Callable[[], object]:
+        game = create_game(user, GameMode.SINGLEPLAYER, size)
+        url = f"/games/{game.identifier}/moves?{query}"
+        row, col = center(size)
+        client.post(
+            url, json={"x": row, "y": col, "action": 1}, headers=headers
+        ).raise_for_status()
+        row, col = closed_safe_cell(get_game_state(game.identifier))
+        flag = {"x": row, "y": col, "action": 0}
+        if batch:
+            url = f"/games/{game.identifier}/moves/batch?{query}"
+            flag = [flag] * batch
+
+        def run() -> None:
+            response = client.post(url, json=flag, headers=headers)
+            response.raise_for_status()
+
+        return run
+
+    return [
+        Case(
+            name,
+            lambda size=size, query=query, batch=batch: post_move(size, query, batch),
+            dict(size_params(size), moves=batch or 1),
+        )
+        for size in sizes
+        for name, query, batch in (
+            ("api.post_move", "rows=20&cols=20", 0),
+            ("api.post_move[delta]", "delta=true", 0),
+            ("api.post_moves[delta]", "delta=true", BATCH_MOVES),
+        )
+    ]
+
+
+def run_case(case: Case, repeat: int) -> dict:
+    """Times a benchmark
+
+    Args:
+        case (Case): The benchmark
+        repeat (int): The number of runs
+
+    Returns:
+        dict: The timings in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        function = case.setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "name": case.name,
+        "params": case.params,
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+def commit() -> str | None:
+    """Returns the current git commit, if there is one"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """Runs the benchmarks and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="skip large boards")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--storage", choices=["fakeredis", "memory"], default="fakeredis"
+    )
+    parser.add_argument("--cache-size", type=int, default=0, help="games cached")
+    parser.add_argument("--move-mode", choices=["python", "script"], default="python")
+    parser.add_argument("--output", type=Path, help="write the results to a file")
+    args = parser.parse_args()
+
+    sizes = QUICK_BOARDS if args.quick else BOARDS
+    cases = serializer_cases()
+    for size in sizes:
+        cases += engine_cases(size)
+        cases += state_serializer_cases(size)
+    cases += api_cases(sizes, args.storage, args.cache_size, args.move_mode)
+
+    results = []
+    for case in cases:
+        result = run_case(case, args.repeat)
+        print(
+            f"{case.name:<30} {json.dumps(case.params):<50} "
+            f"{result['median'] * 1000:>10.3f} ms",
+            file=sys.stderr,
+        )
+        results.append(result)
+
+    report = json.dumps(
+        {
+            "commit": commit(),
+            "python": platform.python_version(),
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-move latency of the engine against the size of the board
+
+Every move loads the state from its serialized form, plays the move
+and serializes the state again, the way a request does.
+
+Usage: python benchmarks/scaling.py [--moves N]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from cinasweeper_backend.cinasweeper_database.database import Serializer  # noqa: E402
+from cinasweeper_backend.cinasweeper_logic import (BoardSize, GameState,  # noqa: E402
+                                                   Move)
+
+SIZES = [(14, 14), (50, 50), (100, 100), (250, 250), (500, 500), (1000, 1000)]
+DENSITY = 0.15
+
+
+def move_latencies(size: BoardSize, moves: int) -> list[float]:
+    """Plays random moves on a board of the given size
+
+    Args:
+        size (BoardSize): The size of the board
+        moves (int): The number of moves to play
+
+    Returns:
+        list[float]: The latency of every move in seconds
+    """
+    rng = random.Random(0)
+    serializer = Serializer(None)
+    state = GameState(None, size)
+    state.play_move(Move(size.height // 2, size.width // 2, 1))
+    obj = serializer.state_to_json(state)
+    latencies = []
+    for _ in range(moves):
+        move = Move(rng.randrange(size.height), rng.randrange(size.width), 0)
+        start = time.perf_counter()
+        state = serializer.state_from_json(obj)
+        if not state.board.is_open(move.x, move.y):
+            state.play_move(move)
+        obj = serializer.state_to_json(state)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> None:
+    """Prints the median and the worst move latency for every board size"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--moves", type=int, default=20)
+    args = parser.parse_args()
+    print(f"{'board':>11} {'mines':>7} {'median ms':>10} {'max ms':>10}")
+    for height, width in SIZES:
+        size = BoardSize(height, width, int(height * width * DENSITY))
+        latencies = move_latencies(size, args.moves)
+        print(
+            f"{height:>5}x{width:<5} {size.num_mines:>7} "
+            f"{statistics.median(latencies) * 1000:>10.2f} "
+            f"{max(latencies) * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
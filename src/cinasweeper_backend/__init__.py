@@ -1,3 +1,18 @@
-from .cinasweeper_api.api import app
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .cinasweeper_api.api import app
 
 __all__ = ["app"]
+
+
+def __getattr__(name: str):
+    """Imports the app only when it is used, so the game logic can be
+    imported without configuring the API"""
+    if name == "app":
+        from .cinasweeper_api.api import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
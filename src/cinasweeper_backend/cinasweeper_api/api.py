@@ -1,51 +1,42 @@
 """The API itself"""
+import asyncio
 import datetime
 import json
-import os
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
-import redis
-from fastapi import Body, Depends, FastAPI, Header, HTTPException
+from fastapi import (Body, Depends, FastAPI, Header, HTTPException, Query,
+                     Response, WebSocket, WebSocketDisconnect)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 # фром .сіна_дейтабез імпорт датабейз
-from ..cinasweeper_database import Database
-from ..cinasweeper_logic import CellAlreadyOpenError
+from ..cinasweeper_database import AsyncDatabase
+from ..cinasweeper_logic import (BoardSize, CellAlreadyOpenError,
+                                 CellOutOfBoardError, Difficulty)
 from ..cinasweeper_logic import Game as LogicGame  # {перелік класів}
 from ..cinasweeper_logic import GameEndedError, GameMode, GameNotStartedError
 from ..cinasweeper_logic import GameState as LogicGameState
-from ..cinasweeper_logic import Move, PlayingAgainstSelfError, User
-from .authentication import AuthManager
+from ..cinasweeper_logic import (InvalidBoardSizeError, Move, MoveOutcome,
+                                 PlayingAgainstSelfError, User)
+from ..cinasweeper_logic.board import COUNT, FLAG, MINE, OPEN
+from ..cinasweeper_logic.exceptions import GameNotFoundError
+from .authentication import AuthManager, TokenVerificationError
+from .events import EventBus
+from .leaderboard import LeaderboardSnapshots, Snapshot
+from .resources import (database_dependency, events_dependency,
+                        leaderboards_dependency, manager_dependency)
+
+
+# the seconds the browsers and the CDNs may keep a leaderboard
+LEADERBOARD_MAX_AGE = 10
+# the most moves sent in one batch
+MAX_BATCH_MOVES = 100
 
-
-def get_conf_value(key: str) -> str:
-    """Get a value from the config file
-    Args:
-        key (str): The key to get the value from
-    Raises:
-        KeyError: If the key doesn't exist
-    Returns:
-        str: The value
-    """
-    try:
-        with open("environment.json", "r") as file:
-            return json.load(file)[key]
-    except FileNotFoundError:
-        return os.getenv(key)
-
-
-host = get_conf_value("REDIS_HOST")
-port = get_conf_value("REDIS_PORT")
-redis_client = redis.Redis(
-    host=host if host else "localhost",
-    port=int(port) if port and port.isdigit() else 6379,
-    password=get_conf_value("REDIS_PASSWORD"),
-    db=0,
-)
 app = FastAPI()
-database = Database(redis_client)
-manager = AuthManager()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -69,15 +60,18 @@ class Game:
     ended: bool
 
     @classmethod
-    def from_logic(cls, game: LogicGame) -> "Game":
+    def from_logic(cls, game: LogicGame, names: Mapping[str, Optional[str]]) -> "Game":
         """Convert a logic game to the API game
         Args:
             game (LogicGame): The logic game
+            names (Mapping[str, Optional[str]]): The display names of the
+                owners whose names are not stored with their games
         Returns:
             Game: The API game
         """
-        user = None if game.owner is None else manager.get_user(game.owner.identifier)
-        username = None if user is None else user.display_name
+        username = None
+        if game.owner is not None:
+            username = game.owner.name or names.get(game.owner.identifier)
         return Game(
             game.identifier,
             username,
@@ -90,6 +84,37 @@ class Game:
         )
 
 
+async def games_from_logic(
+    games: Iterable[LogicGame], manager: AuthManager
+) -> List[Game]:
+    """Convert logic games to API games, looking up the names of all their
+    owners at once, in the threadpool as the lookup blocks
+    Args:
+        games (Iterable[LogicGame]): The logic games
+        manager (AuthManager): The manager to look up the owners with
+    Returns:
+        List[Game]: The API games
+    """
+    games = list(games)
+    owners = [
+        game.owner.identifier
+        for game in games
+        if game.owner is not None and game.owner.name is None
+    ]
+    names = await run_in_threadpool(manager.display_names, owners) if owners else {}
+    return [Game.from_logic(game, names) for game in games]
+
+
+@dataclass
+class Viewport:
+    """The part of the board to send, the whole board by default"""
+
+    top: int = 0
+    left: int = 0
+    rows: Optional[int] = None
+    cols: Optional[int] = None
+
+
 @dataclass
 class GameState:
     """The state of a game"""
@@ -98,38 +123,66 @@ class GameState:
 
     @classmethod
     def gameboard_to_board(
-        cls, state: LogicGameState, full: bool = False
+        cls,
+        state: LogicGameState,
+        full: bool = False,
+        viewport: Optional[Viewport] = None,
     ) -> List[List[Optional[int]]]:  # save only opend ceils (tuples -> None)
         """Convert a gameboard to a board that can be sent to the client
         (remove all unopened cells)
         Args:
             state (LogicGameState): The gameboard
+            full (bool): Whether to send the full board or not.
+            viewport (Optional[Viewport]): The part of the board to send.
         Returns:
             List[List[Optional[int]]]: The board
         """
-        if state.gameboard is None:
-            return [[None] * 14] * 14
-        return [
-            [
-                None
-                if isinstance(cell, list)
-                else (-2 if isinstance(cell, str) else cell)
-                for cell in row
+        viewport = viewport or Viewport()
+        if state.board is None:
+            height = state.size.height - viewport.top
+            width = state.size.width - viewport.left
+            return [
+                [None] * max(0, min(width, viewport.cols or width))
+                for _ in range(max(0, min(height, viewport.rows or height)))
             ]
-            for row in (state.game_info if full else state.gameboard)
+        return [
+            [cls.cell_to_value(cell, full) for cell in row]
+            for row in state.board.rows(
+                viewport.top, viewport.left, viewport.rows, viewport.cols
+            )
         ]
 
+    @staticmethod
+    def cell_to_value(cell: int, full: bool = False) -> Optional[int]:
+        """Convert a cell of the board to the value sent to the client
+        Args:
+            cell (int): The cell
+            full (bool): Whether to show the closed cells or not.
+        Returns:
+            Optional[int]: The number of mines around, -1 for a mine,
+                -2 for a flag and None for a closed cell
+        """
+        if full or cell & OPEN:
+            return -1 if cell & MINE else cell & COUNT
+        return -2 if cell & FLAG else None
+
     @classmethod
-    def from_logic(cls, state: LogicGameState, full: bool = False) -> "GameState":
+    def from_logic(
+        cls,
+        state: LogicGameState,
+        full: bool = False,
+        viewport: Optional[Viewport] = None,
+    ) -> "GameState":
         """Convert a logic game to the API game state
         Args:
             state (LogicGameState): The logic game state
             full (bool): Whether to send the full board or not.
+            viewport (Optional[Viewport]): The part of the board to send.
         Returns:
             GameState: The API game state
         """
         return GameState(
-            cls.gameboard_to_board(state, full),
+            cls.gameboard_to_board(state, full, viewport),
         )
 
 
@@ -141,6 +194,101 @@ class MoveResult:
     game_changed: bool
 
 
+@dataclass
+class CellChange:
+    """A cell changed by a move"""
+
+    x: int
+    y: int
+    value: Optional[int]
+
+
+@dataclass
+class MoveDelta:
+    """The result of a move, with only the cells changed by it"""
+
+    cells: List[CellChange]
+    version: int
+    game_changed: bool
+
+    @classmethod
+    def from_logic(
+        cls, state: LogicGameState, game_changed: bool, full: bool = False
+    ) -> "MoveDelta":
+        """Convert the last move of a logic game state to a delta
+        Args:
+            state (LogicGameState): The logic game state after the move
+            game_changed (bool): Whether the game has ended with the move
+            full (bool): Whether the game has ended and the mines are shown.
+        Returns:
+            MoveDelta: The cells changed by the move
+        """
+        cells = dict.fromkeys(state.changes)
+        if full:
+            cells.update(dict.fromkeys(state.board.mines))
+        return MoveDelta(
+            [
+                CellChange(
+                    x,
+                    y,
+                    GameState.cell_to_value(
+                        state.board.cells[state.board.index(x, y)], full
+                    ),
+                )
+                for x, y in cells
+            ],
+            state.version,
+            game_changed,
+        )
+
+    @classmethod
+    def from_outcome(cls, outcome: MoveOutcome, full: bool = False) -> "MoveDelta":
+        """Convert a move applied by the database to a delta
+        Args:
+            outcome (MoveOutcome): The outcome of the move
+            full (bool): Whether the game has ended and the mines are shown.
+        Returns:
+            MoveDelta: The cells changed by the move
+        """
+        cells = {(x, y): cell for x, y, cell in outcome.changes}
+        if full:
+            cells.update({(x, y): cell for x, y, cell in outcome.mines})
+        return MoveDelta(
+            [
+                CellChange(x, y, GameState.cell_to_value(cell, full))
+                for (x, y), cell in cells.items()
+            ],
+            outcome.version,
+            outcome.decided,
+        )
+
+
+@dataclass
+class MovesResult:
+    """The results of a batch of moves, and the state after them"""
+
+    results: List[Optional[str]]
+    state: GameState
+    game_changed: bool
+
+
+@dataclass
+class MovesDelta:
+    """The results of a batch of moves, with only the cells changed by them"""
+
+    results: List[Optional[str]]
+    cells: List[CellChange]
+    version: int
+    game_changed: bool
+
+
+@dataclass
+class Rank:
+    """A place on the leaderboard, None if there is no finished game"""
+
+    rank: Optional[int]
+
+
 @dataclass
 class UnauthorizedMessage:
     """The message to send when the user is unauthorized"""
@@ -148,28 +296,41 @@ class UnauthorizedMessage:
     detail: str = "Bearer token missing or unknown"
 
 
-def user_from_jwt(jwt: str) -> User:
-    """Get the user object from a JWT
+async def user_from_jwt(
+    jwt: str, manager: AuthManager, database: AsyncDatabase
+) -> User:
+    """Get the user object from a JWT, verified in a thread as firebase blocks
     Args:
         jwt (str): The JWT to get the user id and user object from
+        manager (AuthManager): The manager to verify the JWT with
+        database (AsyncDatabase): The database of the user
     Raises:
-        HTTPException: If the JWT is invalid
+        HTTPException: If the JWT is invalid, or cannot be verified for now
     Returns:
         User: The user object
     """
-    user_id = manager.verify(jwt)
+    try:
+        user_id = await run_in_threadpool(manager.verify, jwt)
+    except TokenVerificationError:
+        raise HTTPException(503, "The token cannot be verified, try again later.")
     if not user_id:
         raise HTTPException(401, UnauthorizedMessage.detail)
 
-    return User(user_id["user_id"], database=database)
+    return User(
+        user_id["user_id"], database=database, name=manager.name_from_token(user_id)
+    )
 
 
 async def get_token(
     authorization: str = Header(default="Bearer "),
+    manager: AuthManager = Depends(manager_dependency),
+    database: AsyncDatabase = Depends(database_dependency),
 ) -> User:
     """Get the user id and user object from the authorization header
     Args:
         authorization (str): The authorization header.
+        manager (AuthManager): The authentication manager.
+        database (AsyncDatabase): The database.
     Raises:
         HTTPException: If the authorization header is invalid
     Returns:
@@ -178,7 +339,7 @@ async def get_token(
     method, token = authorization.split(" ")
     if method != "Bearer":
         raise HTTPException(401, UnauthorizedMessage.detail)
-    return user_from_jwt(token)
+    return await user_from_jwt(token, manager, database)
 
 
 # /games post (приймає жейсон веб ток)
@@ -188,11 +349,29 @@ async def get_token(
     response_model=Game,
     responses={401: dict(model=UnauthorizedMessage)},
 )
-def create_game(
-    gamemode: GameMode = Body(embed=True), user: User = Depends(get_token)
+async def create_game(
+    gamemode: GameMode = Body(embed=True),
+    difficulty: Difficulty = Body(Difficulty.CLASSIC, embed=True),
+    height: Optional[int] = Body(None, embed=True),
+    width: Optional[int] = Body(None, embed=True),
+    mines: Optional[int] = Body(None, embed=True),
+    user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
 ) -> Game:
-    """Create a new game"""
-    return Game.from_logic(database.create_game(owner=user, gamemode=gamemode))
+    """Create a new game; height, width and mines override the difficulty preset"""
+    preset = BoardSize.from_difficulty(difficulty)
+    try:
+        size = BoardSize(
+            height or preset.height,
+            width or preset.width,
+            mines or preset.num_mines,
+        )
+    except InvalidBoardSizeError as error:
+        raise HTTPException(400, str(error))
+    game = await database.create_game(owner=user, gamemode=gamemode, size=size)
+    (game,) = await games_from_logic([game], manager)
+    return game
 
 
 # /games get список датакласів
@@ -204,33 +383,133 @@ def create_game(
     "/games",
     responses={401: dict(model=UnauthorizedMessage)},
 )
-def get_games(
+async def get_games(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
     user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
 ) -> List[Game]:
-    """Get your own games"""
-    return [Game.from_logic(game) for game in user.games]
+    """Get a page of your own games, best games first"""
+    games = await database.get_games(user, offset, limit)
+    return await games_from_logic(games, manager)
+
+
+async def build_leaderboard(
+    game_mode: Optional[GameMode],
+    database: AsyncDatabase,
+    manager: AuthManager,
+    size: int,
+) -> Snapshot:
+    """Build the response of a leaderboard
+    Args:
+        game_mode (Optional[GameMode]): The game mode, None for all of them
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        size (int): The number of games
+    Returns:
+        Snapshot: The serialized response
+    """
+    games = await games_from_logic(
+        await database.get_leaderboard(game_mode).top_n(size), manager
+    )
+    body = JSONResponse(jsonable_encoder(games)).body
+    return Snapshot.from_body(body, [game.score for game in games])
+
+
+async def record_score(
+    game: LogicGame,
+    database: AsyncDatabase,
+    manager: AuthManager,
+    leaderboards: LeaderboardSnapshots,
+) -> None:
+    """Rebuild the leaderboards an ended game enters, once its score is saved
+    Args:
+        game (LogicGame): The ended game
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        leaderboards (LeaderboardSnapshots): The snapshots of the leaderboards
+    """
+    await leaderboards.record(
+        game,
+        lambda game_mode: build_leaderboard(
+            game_mode, database, manager, leaderboards.size
+        ),
+    )
 
 
 # /leaders_board get ретурнить список геймів
-@app.get("/leaders_board")
-def get_top_games() -> List[Game]:
-    """Get the global top games"""
-    return [Game.from_logic(game) for game in database.get_leaderboard().top_n(15)]
+@app.get("/leaders_board", response_model=List[Game])
+async def get_top_games(
+    game_mode: Optional[GameMode] = None,
+    if_none_match: Optional[str] = Header(None),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+    leaderboards: LeaderboardSnapshots = Depends(leaderboards_dependency),
+) -> Response:
+    """Get the top games, of all the game modes or of one of them; the response
+    is built when the leaderboard changes and can be cached for a few seconds"""
+    snapshot = await leaderboards.get(
+        game_mode,
+        lambda game_mode: build_leaderboard(
+            game_mode, database, manager, leaderboards.size
+        ),
+    )
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={LEADERBOARD_MAX_AGE}",
+    }
+    if snapshot.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+
+@app.get(
+    "/leaders_board/rank",
+    responses={401: dict(model=UnauthorizedMessage)},
+)
+async def get_user_rank(
+    game_mode: Optional[GameMode] = None,
+    user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+) -> Rank:
+    """Get the place of your best game on the leaderboard"""
+    return Rank(await database.get_leaderboard(game_mode).user_rank(user))
 
 
 @app.get("/games/{game_id}")
-def get_game_info(game_id: str) -> Game:
+async def get_game_info(
+    game_id: str,
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+) -> Game:
     """Get the game"""
-    return Game.from_logic(database.get_game(game_id))
+    (game,) = await games_from_logic([await database.get_game(game_id)], manager)
+    return game
+
+
+@app.get("/games/{game_id}/rank")
+async def get_game_rank(
+    game_id: str,
+    game_mode: Optional[GameMode] = None,
+    database: AsyncDatabase = Depends(database_dependency),
+) -> Rank:
+    """Get the place of a game on the leaderboard"""
+    return Rank(await database.get_game_rank(game_id, game_mode))
 
 
 # /games/{id гри} інфо про стан
 # (з імпортованого викликаю get_game_state(id) з нього можу .мувз)
 @app.get("/games/{game_id}/state")
-def get_game_info(game_id: str) -> GameState:
-    """Get the state of a game"""
-    game = database.get_game(game_id)
-    return GameState.from_logic(game.state, game.ended)
+async def get_game_info(
+    game_id: str,
+    viewport: Viewport = Depends(),
+    database: AsyncDatabase = Depends(database_dependency),
+) -> GameState:
+    """Get the state of a game; large boards can be fetched part by part"""
+    game = await database.unit_of_work().get_game(game_id)
+    state = await game.get_state_async()
+    return GameState.from_logic(state, game.ended, viewport)
 
 
 # /games/{id гри} put викликаю get_game(id).claim(owner). Воно приймає жейсон веб ток
@@ -238,34 +517,349 @@ def get_game_info(game_id: str) -> GameState:
     "/games/{game_id}",
     responses={401: dict(model=UnauthorizedMessage)},
 )
-def put_game(game_id: str, user: User = Depends(get_token)) -> Game:
+async def put_game(
+    game_id: str,
+    user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+    events: EventBus = Depends(events_dependency),
+) -> Game:
     """Claim a game; only applies to games that don't have an owner"""
 
-    game = database.get_game(game_id)
-    try:
-        game.claim(user)
-    except PlayingAgainstSelfError:
-        raise HTTPException(400, "You can`t play against yourself.")
-    return Game.from_logic(game)
+    async with database.unit_of_work() as unit:
+        game = await unit.get_game(game_id)
+        claimed = game.owner is None and game.opponent_id is not None
+        try:
+            await game.claim_async(user)
+        except PlayingAgainstSelfError:
+            raise HTTPException(400, "You can`t play against yourself.")
+    (api_game,) = await games_from_logic([game], manager)
+    if claimed:
+        # the owner of the opponent game follows this one
+        await events.publish(
+            game_id, {"type": "start", "game": jsonable_encoder(api_game)}
+        )
+    return api_game
 
 
-@app.post(
-    "/games/{game_id}/moves",
-    responses={401: dict(model=UnauthorizedMessage)},
-)
-def post_move(game_id: str, move: Move, user: User = Depends(get_token)) -> MoveResult:
-    """Make a move on a specific game; you must be the owner of the game"""
-    game = database.get_game(game_id)
-    if game.owner != user:
-        raise HTTPException(403, "You are not the owner of this game.")
+@contextmanager
+def move_errors() -> Iterator[None]:
+    """Turn the errors of a move into the responses of the API"""
     try:
-        game_changed = game.play_move(move)
+        yield
     except GameEndedError:
         raise HTTPException(409, "Game over.")
     except GameNotStartedError:
         raise HTTPException(409, "Game is not started.")
     except CellAlreadyOpenError:
         raise HTTPException(409, "Cell already open.")
+    except CellOutOfBoardError:
+        raise HTTPException(400, "Cell is outside of the board.")
+
+
+@app.post(
+    "/games/{game_id}/moves",
+    responses={401: dict(model=UnauthorizedMessage)},
+)
+async def post_move(
+    game_id: str,
+    move: Move,
+    viewport: Viewport = Depends(),
+    delta: bool = False,
+    user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+    leaderboards: LeaderboardSnapshots = Depends(leaderboards_dependency),
+    events: EventBus = Depends(events_dependency),
+) -> Union[MoveResult, MoveDelta]:
+    """Make a move on a specific game; you must be the owner of the game.
+    With delta, only the cells changed by the move are sent."""
+    game, state, move_delta = await play_move(
+        game_id, move, user, database, manager, leaderboards, events, not delta
+    )
+    if delta:
+        return move_delta
+    return MoveResult(
+        GameState.from_logic(state, game.ended, viewport), move_delta.game_changed
+    )
+
+
+async def play_move(
+    game_id: str,
+    move: Move,
+    user: User,
+    database: AsyncDatabase,
+    manager: AuthManager,
+    leaderboards: LeaderboardSnapshots,
+    events: EventBus,
+    with_state: bool = False,
+) -> Tuple[LogicGame, Optional[LogicGameState], MoveDelta]:
+    """Play a move for a user, then record the score of an ended game and
+    publish the events of a 1v1 game
+    Args:
+        game_id (str): The id of the game
+        move (Move): The move
+        user (User): The user, who must own the game
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        leaderboards (LeaderboardSnapshots): The snapshots of the leaderboards
+        events (EventBus): The bus of the live events
+        with_state (bool): Also return the state after the move, without
+            reading it again. Defaults to False.
+    Raises:
+        HTTPException: If the user does not own the game or the move is invalid
+    Returns:
+        Tuple[LogicGame, Optional[LogicGameState], MoveDelta]: The game, the state
+            after the move, if it was asked for or loaded, and the cells changed
+    """
+    move_delta = None
+    if database.scripted_moves:
+        # played in redis, unless the state cannot be changed there yet; the
+        # owner is checked on the stored game, another instance may have
+        # claimed it since it was cached
+        game = await database.get_game(game_id, cached=False)
+        if game.owner != user:
+            raise HTTPException(403, "You are not the owner of this game.")
+        with move_errors():
+            outcome = await game.play_move_atomic_async(move, with_state)
+        if outcome is not None:
+            state = outcome.state
+            move_delta = MoveDelta.from_outcome(outcome, game.ended)
+
+    if move_delta is None:
+        async with database.unit_of_work() as unit:
+            game = await unit.get_game(game_id)
+            if game.owner != user:
+                raise HTTPException(403, "You are not the owner of this game.")
+            # loaded with the game, the move is played on it
+            state = await game.get_state_async()
+            with move_errors():
+                game_changed = await game.play_move_async(move)
+        move_delta = MoveDelta.from_logic(state, game_changed, game.ended)
+
+    await announce_moves(game, move_delta, database, manager, leaderboards, events)
+    return game, state, move_delta
+
 
-    state = GameState.from_logic(game.state, game.ended)
-    return MoveResult(state, game_changed)
+@app.post(
+    "/games/{game_id}/moves/batch",
+    responses={401: dict(model=UnauthorizedMessage)},
+)
+async def post_moves(
+    game_id: str,
+    moves: List[Move] = Body(..., min_items=1, max_items=MAX_BATCH_MOVES),
+    viewport: Viewport = Depends(),
+    delta: bool = False,
+    user: User = Depends(get_token),
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+    leaderboards: LeaderboardSnapshots = Depends(leaderboards_dependency),
+    events: EventBus = Depends(events_dependency),
+) -> Union[MovesResult, MovesDelta]:
+    """Make several moves on a specific game at once, in order, until one of them
+    ends the game; you must be the owner of the game. The result of every move
+    played is sent, "Open" for a flag on an open cell, which is skipped.
+    With delta, only the cells changed by the moves are sent."""
+    game, state, results, move_delta = await play_moves(
+        game_id, moves, user, database, manager, leaderboards, events, not delta
+    )
+    if delta:
+        return MovesDelta(
+            results, move_delta.cells, move_delta.version, move_delta.game_changed
+        )
+    return MovesResult(
+        results,
+        GameState.from_logic(state, game.ended, viewport),
+        move_delta.game_changed,
+    )
+
+
+async def play_moves(
+    game_id: str,
+    moves: List[Move],
+    user: User,
+    database: AsyncDatabase,
+    manager: AuthManager,
+    leaderboards: LeaderboardSnapshots,
+    events: EventBus,
+    with_state: bool = False,
+) -> Tuple[LogicGame, Optional[LogicGameState], List[Optional[str]], MoveDelta]:
+    """Play moves for a user on the state loaded once, saved once, like play_move
+    Args:
+        game_id (str): The id of the game
+        moves (List[Move]): The moves, in order
+        user (User): The user, who must own the game
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        leaderboards (LeaderboardSnapshots): The snapshots of the leaderboards
+        events (EventBus): The bus of the live events
+        with_state (bool): Also return the state after the moves, without
+            reading it again. Defaults to False.
+    Raises:
+        HTTPException: If the user does not own the game or a move is invalid
+    Returns:
+        Tuple[LogicGame, Optional[LogicGameState], List[Optional[str]], MoveDelta]:
+            The game, the state after the moves, if it was asked for or
+            loaded, the results of the moves played and the cells changed
+    """
+    move_delta = None
+    if database.scripted_moves:
+        game = await database.get_game(game_id, cached=False)
+        if game.owner != user:
+            raise HTTPException(403, "You are not the owner of this game.")
+        with move_errors():
+            outcome = await game.play_moves_atomic_async(moves, with_state)
+        if outcome is not None:
+            state, results = outcome.state, outcome.results
+            move_delta = MoveDelta.from_outcome(outcome, game.ended)
+
+    if move_delta is None:
+        async with database.unit_of_work() as unit:
+            game = await unit.get_game(game_id)
+            if game.owner != user:
+                raise HTTPException(403, "You are not the owner of this game.")
+            # loaded with the game, the moves are played on it
+            state = await game.get_state_async()
+            with move_errors():
+                results = await game.play_moves_async(moves)
+        # the game was playable, so it has ended with these moves if at all
+        move_delta = MoveDelta.from_logic(state, game.ended, game.ended)
+
+    await announce_moves(game, move_delta, database, manager, leaderboards, events)
+    return game, state, results, move_delta
+
+
+async def announce_moves(
+    game: LogicGame,
+    move_delta: MoveDelta,
+    database: AsyncDatabase,
+    manager: AuthManager,
+    leaderboards: LeaderboardSnapshots,
+    events: EventBus,
+) -> None:
+    """Record the score of a game ended by moves, and publish the moves and the
+    end of a 1v1 game
+    Args:
+        game (LogicGame): The game
+        move_delta (MoveDelta): The cells changed by the moves
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        leaderboards (LeaderboardSnapshots): The snapshots of the leaderboards
+        events (EventBus): The bus of the live events
+    """
+    if move_delta.game_changed:
+        await record_score(game, database, manager, leaderboards)
+    if game.opponent_id is None:
+        return
+    await events.publish(
+        game.identifier,
+        {"type": "move", "game": game.identifier, **jsonable_encoder(move_delta)},
+    )
+    if move_delta.game_changed:
+        (api_game,) = await games_from_logic([game], manager)
+        await events.publish(
+            game.identifier, {"type": "end", "game": jsonable_encoder(api_game)}
+        )
+
+
+@app.websocket("/games/{game_id}/live")
+async def live_game(
+    websocket: WebSocket,
+    game_id: str,
+    token: str = "",
+    database: AsyncDatabase = Depends(database_dependency),
+    manager: AuthManager = Depends(manager_dependency),
+    leaderboards: LeaderboardSnapshots = Depends(leaderboards_dependency),
+    events: EventBus = Depends(events_dependency),
+) -> None:
+    """Follow your game and its opponent game live, and play moves on yours.
+    The token is a query parameter, browsers cannot set the headers of a
+    WebSocket. The games are sent first, then the events of both games:
+    "move" with the cells changed, "start" when the opponent joins and "end"
+    when a game ends. A message {"x", "y", "action"} plays a move, answered
+    with a "result" holding the cells changed, or an "error"."""
+    try:
+        claims = await run_in_threadpool(manager.verify, token)
+    except TokenVerificationError:
+        await websocket.close(code=1013)  # try again later
+        return
+    user = None
+    if claims:
+        user = User(claims["user_id"], database, manager.name_from_token(claims))
+    try:
+        game = await database.get_game(game_id)
+    except GameNotFoundError:
+        game = None
+    if user is None or game is None or game.owner != user:
+        await websocket.close(code=1008)  # policy violation
+        return
+
+    await websocket.accept()
+    followed = [game_id] if game.opponent_id is None else [game_id, game.opponent_id]
+    async with events.subscribe(followed) as queue:
+        games = await games_from_logic(
+            await database.get_games_by_ids(followed), manager
+        )
+        await websocket.send_json({"type": "games", "games": jsonable_encoder(games)})
+        receiving = asyncio.ensure_future(websocket.receive_text())
+        forwarding = asyncio.ensure_future(queue.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    (receiving, forwarding), return_when=asyncio.FIRST_COMPLETED
+                )
+                if forwarding in done:
+                    await websocket.send_json(forwarding.result())
+                    forwarding = asyncio.ensure_future(queue.get())
+                if receiving in done:
+                    reply = await live_move(
+                        game_id,
+                        receiving.result(),
+                        user,
+                        database,
+                        manager,
+                        leaderboards,
+                        events,
+                    )
+                    await websocket.send_json(reply)
+                    receiving = asyncio.ensure_future(websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiving.cancel()
+            forwarding.cancel()
+
+
+async def live_move(
+    game_id: str,
+    message: str,
+    user: User,
+    database: AsyncDatabase,
+    manager: AuthManager,
+    leaderboards: LeaderboardSnapshots,
+    events: EventBus,
+) -> Dict[str, Any]:
+    """Play a move sent on a WebSocket
+    Args:
+        game_id (str): The id of the game
+        message (str): The message, the move as JSON
+        user (User): The user, who must own the game
+        database (AsyncDatabase): The database
+        manager (AuthManager): The manager to look up the owners with
+        leaderboards (LeaderboardSnapshots): The snapshots of the leaderboards
+        events (EventBus): The bus of the live events
+    Returns:
+        Dict[str, Any]: The result of the move, or the error
+    """
+    try:
+        fields = json.loads(message)
+        move = Move(int(fields["x"]), int(fields["y"]), int(fields["action"]))
+    except (ValueError, TypeError, KeyError):
+        return {"type": "error", "status": 422, "detail": "Invalid move."}
+    try:
+        _, _, move_delta = await play_move(
+            game_id, move, user, database, manager, leaderboards, events
+        )
+    except HTTPException as error:
+        return {"type": "error", "status": error.status_code, "detail": error.detail}
+    return {"type": "result", "game": game_id, **jsonable_encoder(move_delta)}
@@ -1,20 +1,166 @@
 """Manage google oauth"""
 from __future__ import annotations
 
+import hashlib
+import json
 import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
 
-import firebase_admin
-from firebase_admin import auth, credentials
+# the certificates are fetched again once this part of their max-age has passed
+CERTIFICATE_REFRESH_AT = 0.9
+# the seconds before retrying a failed refresh, or when there is no max-age
+CERTIFICATE_RETRY = 60.0
+# the seconds a fetch of the certificates may take
+CERTIFICATE_TIMEOUT = 10.0
+# the certificates signing the ID tokens of firebase, published by Google
+CERTIFICATE_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+# the issuer of the ID tokens of firebase, followed by the id of the project
+TOKEN_ISSUER = "https://securetoken.google.com/"
+# the most users firebase returns for one get_users call
+GET_USERS_LIMIT = 100
+# returned by ExpiringCache.get on a miss, as None is a valid display name
+MISSING = object()
+
+
+class TokenVerificationError(Exception):
+    """The token could not be verified, because the signing certificates
+    have not been fetched yet; the token itself may be valid"""
+
+
+class ExpiringCache:
+    """A bounded cache whose entries expire at a given time, dropping the
+    least recently used entry when it is full"""
+
+    def __init__(self, maxsize: int, clock: Callable[[], float]) -> None:
+        """Initializes the cache
+
+        Args:
+            maxsize (int): The maximal number of entries, 0 to cache nothing
+            clock (Callable[[], float]): The clock the expiries are on
+        """
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a value, if it is cached and has not expired
+
+        Args:
+            key (Hashable): The key
+            default (Any): Returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The value, or the default
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any, expiry: float) -> None:
+        """Caches a value until the expiry
+
+        Args:
+            key (Hashable): The key
+            value (Any): The value
+            expiry (float): The time the value expires at, on the clock
+        """
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (expiry, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
 
 
 class AuthManager:
-    """Manage the authentication of users"""
+    """Manage the authentication of users
+
+    firebase_admin is imported when the manager is created, it is slow to import.
+
+    The decoded tokens are cached until they expire, by the hash of the token,
+    so a token is verified once per instance rather than on every request.
+    The verification blocks, so the async code runs it in a thread. The
+    tokens are verified against the signing certificates of Google kept by
+    the manager, with the checks of firebase. They are fetched before the
+    first verification, then again in the background shortly before they
+    expire, so no request waits for them once they are fetched. A failed
+    refresh is counted and retried, the previous certificates are used
+    meanwhile.
+
+    The display names of the owners are looked up in batches and cached for
+    name_ttl seconds. With store_names, the name in the token of a user is
+    stored in the games they create or claim, so those need no lookup; a
+    renamed user keeps the old name in those games.
+    """
+
+    def __init__(
+        self,
+        restrict_users: bool = False,
+        cache_size: int = 1024,
+        clock: Callable[[], float] = time.time,
+        name_ttl: float = 300.0,
+        store_names: bool = False,
+    ) -> None:
+        """Initialize the AuthManager
+
+        Args:
+            restrict_users (bool): Only accept the emails of ucu.
+                Defaults to False.
+            cache_size (int): The maximal number of cached tokens and of
+                cached display names, 0 to cache nothing. Defaults to 1024.
+            clock (Callable[[], float]): The time, compared to the expiry of
+                the tokens. Defaults to time.time.
+            name_ttl (float): The seconds a display name is cached for.
+                Defaults to 300.
+            store_names (bool): Store the names of the users in their games.
+                Defaults to False.
+        """
+        import firebase_admin
+        from firebase_admin import credentials
 
-    def __init__(self, restrict_users: bool = False) -> None:
-        """Initialize the AuthManager"""
         self.cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(self.cred)
+        self.app = firebase_admin.initialize_app(self.cred)
+        self.project_id = self.app.project_id
         self.restrict_users = restrict_users
+        self.clock = clock
+        self.name_ttl = name_ttl
+        self.store_names = store_names
+        self.lock = threading.Lock()
+        # the decoded tokens, by the hash of the token
+        self.tokens = ExpiringCache(cache_size, clock)
+        # the display names, by the id of the user
+        self.names = ExpiringCache(cache_size, clock)
+        self.rejected = 0
+        self.verifications = 0
+        self.verification_time = 0.0
+        # the signing certificates, by their key id
+        self.certificates: dict[str, str] = {}
+        self.certificates_due = 0.0
+        self.refreshing: threading.Thread | None = None
+        # held while the first certificates are fetched
+        self.fetching = threading.Lock()
+        self.refresh_failures = 0
+        self.name_failures = 0
 
     def validate(self, email: str) -> bool:
         """Validate the email of a user
@@ -31,34 +177,215 @@ class AuthManager:
         )
 
     def verify(self, token: str) -> dict[str, str] | None:
-        """Verify a jwt token
+        """Verify a jwt token, or get it from the cache if it was verified
+        and has not expired
 
         Args:
             token (str): The token to verify
 
+        Raises:
+            TokenVerificationError: The certificates could not be fetched.
+
         Returns:
-            dict: The decoded token
+            dict: The decoded token, None if it is invalid or expired
         """
-        try:
-            user = auth.verify_id_token(token)
-        except Exception:
+        user = self.cached(token)
+        if user is None:
+            user = self.verify_signature(token)
+        if user is None:
             return None
         email = user["email"]
         if self.validate(email):
             return user
         return None
 
-    def get_user(self, user_id: str) -> dict[str, str] | None:
-        """Get a user from the database
+    def cached(self, token: str) -> dict[str, Any] | None:
+        """Returns a decoded token from the cache, if it has not expired
 
         Args:
-            user_id (str): The id of the user
+            token (str): The token
 
         Returns:
-            dict: The user
+            dict[str, Any] | None: The decoded token, None on a miss
         """
+        return self.tokens.get(hashlib.sha256(token.encode()).digest())
+
+    def verify_signature(self, token: str) -> dict[str, Any] | None:
+        """Verifies a token against the signing certificates and caches it
+        until it expires
+
+        Args:
+            token (str): The token
+
+        Raises:
+            TokenVerificationError: The certificates could not be fetched.
+
+        Returns:
+            dict[str, Any] | None: The decoded token, None if it is invalid
+        """
+        from google.auth import jwt
+
+        certificates = self.current_certificates()
+        start = time.perf_counter()
         try:
-            user = auth.get_user(user_id)
-        except Exception:
+            if jwt.decode_header(token).get("alg") != "RS256":
+                raise ValueError("The token is not signed with RS256")
+            user = jwt.decode(token, certs=certificates, audience=self.project_id)
+            subject = user.get("sub")
+            if user.get("iss") != TOKEN_ISSUER + str(self.project_id):
+                raise ValueError("The token was issued for another project")
+            if not isinstance(subject, str) or not 0 < len(subject) <= 128:
+                raise ValueError("The token has no valid subject")
+        except ValueError:
+            with self.lock:
+                self.rejected += 1
             return None
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.verifications += 1
+                self.verification_time += elapsed
+        user["uid"] = subject
+        key = hashlib.sha256(token.encode()).digest()
+        self.tokens.put(key, user, float(user["exp"]))
         return user
+
+    def current_certificates(self) -> dict[str, str]:
+        """Returns the signing certificates, fetching the first ones and
+        refreshing them in the background when they are about to expire
+
+        Raises:
+            TokenVerificationError: No certificates could be fetched yet.
+
+        Returns:
+            dict[str, str]: The certificates, by their key id
+        """
+        certificates = self.certificates
+        if certificates:
+            self.schedule_refresh()
+            return certificates
+        with self.fetching:
+            # a failed fetch is retried once CERTIFICATE_RETRY has passed
+            if not self.certificates and self.clock() >= self.certificates_due:
+                self.refresh_certificates()
+        if not self.certificates:
+            raise TokenVerificationError("The certificates could not be fetched")
+        return self.certificates
+
+    def schedule_refresh(self) -> None:
+        """Refreshes the certificates in a background thread, when they are
+        about to expire"""
+        with self.lock:
+            if self.clock() < self.certificates_due or self.refreshing is not None:
+                return
+            self.refreshing = threading.Thread(
+                target=self.refresh_certificates, daemon=True
+            )
+        self.refreshing.start()
+
+    def refresh_certificates(self) -> None:
+        """Fetches the signing certificates, bypassing the HTTP caches, keeps
+        them and schedules the next refresh from their max-age; a failed
+        refresh is counted and retried later"""
+        from google.auth.transport.requests import Request
+
+        delay = CERTIFICATE_RETRY
+        certificates = None
+        try:
+            response = Request()(
+                CERTIFICATE_URL,
+                headers={"Cache-Control": "no-cache"},
+                timeout=CERTIFICATE_TIMEOUT,
+            )
+            if response.status == 200:
+                certificates = dict(json.loads(response.data))
+                max_age = re.search(
+                    r"max-age=(\d+)", response.headers.get("Cache-Control", "")
+                )
+                if max_age:
+                    delay = int(max_age.group(1)) * CERTIFICATE_REFRESH_AT
+        except Exception:  # the thread has no caller to raise to
+            certificates = None
+        with self.lock:
+            if certificates:
+                self.certificates = certificates
+            else:
+                self.refresh_failures += 1
+            self.certificates_due = self.clock() + delay
+            self.refreshing = None
+
+    def stats(self) -> dict[str, float]:
+        """Returns the counters of the token and name caches
+
+        Returns:
+            dict[str, float]: The hits, the misses, the rejected tokens, the
+                number of cached tokens, the average verification in ms, the
+                failed refreshes of the certificates, and the hits, the misses
+                and the failed batches of the names
+        """
+        with self.lock:
+            verified = self.verifications or 1
+            return {
+                "hits": self.tokens.hits,
+                "misses": self.tokens.misses,
+                "rejected": self.rejected,
+                "size": len(self.tokens),
+                "verification_ms": self.verification_time / verified * 1000,
+                "refresh_failures": self.refresh_failures,
+                "name_hits": self.names.hits,
+                "name_misses": self.names.misses,
+                "name_failures": self.name_failures,
+            }
+
+    def name_from_token(self, token: dict[str, Any]) -> str | None:
+        """Returns the display name to store in the games of a user
+
+        Args:
+            token (dict[str, Any]): The decoded token of the user
+
+        Returns:
+            str | None: The name in the token, None unless store_names is on
+        """
+        return token.get("name") if self.store_names else None
+
+    def display_names(self, user_ids: Iterable[str]) -> dict[str, str | None]:
+        """Get the display names of users, from the cache or from firebase,
+        in batches of GET_USERS_LIMIT users
+
+        A batch that fails leaves its names unknown, without caching them, so
+        a listing is still sent while firebase is unavailable.
+
+        Args:
+            user_ids (Iterable[str]): The ids of the users, repeated or not
+
+        Returns:
+            dict[str, str | None]: The names by id, None for the users without
+                a name, not found or not looked up
+        """
+        from firebase_admin import auth, exceptions
+
+        names = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            name = self.names.get(user_id, MISSING)
+            if name is MISSING:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+        for start in range(0, len(missing), GET_USERS_LIMIT):
+            batch = missing[start : start + GET_USERS_LIMIT]
+            names.update(dict.fromkeys(batch))
+            try:
+                result = auth.get_users(
+                    [auth.UidIdentifier(user_id) for user_id in batch], self.app
+                )
+            except exceptions.FirebaseError:
+                with self.lock:
+                    self.name_failures += 1
+                continue
+            found = {user.uid: user.display_name for user in result.users}
+            expiry = self.clock() + self.name_ttl
+            for user_id in batch:
+                names[user_id] = found.get(user_id)
+                self.names.put(user_id, names[user_id], expiry)
+        return names
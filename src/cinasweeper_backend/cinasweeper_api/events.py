@@ -0,0 +1,149 @@
+"""The live events of the games, sent to the connections following them
+
+The events of a game, its moves, its start and its end, are published on
+the bus and delivered to every connection subscribed to the game. The
+RedisEventBus fans them out across the instances through redis pub/sub,
+with a single subscription per instance.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+import redis
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    import redis.asyncio
+
+# the prefix of the channel of the events of a game
+CHANNEL_PREFIX = "events:"
+# the events kept for a connection that does not read them, then dropped
+QUEUE_SIZE = 256
+
+
+class EventBus:
+    """Delivers the events of the games within the process"""
+
+    def __init__(self) -> None:
+        """Initializes the bus"""
+        # the queues of the connections following a game, by the id of the game
+        self.queues: defaultdict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, game_id: str, event: dict[str, Any]) -> None:
+        """Sends an event of a game to the connections following it
+
+        Args:
+            game_id (str): The id of the game
+            event (dict[str, Any]): The event, serializable as JSON
+        """
+        self.deliver(game_id, event)
+
+    def deliver(self, game_id: str, event: dict[str, Any]) -> None:
+        """Puts an event in the queues of the connections following the game,
+        dropping it for the connections whose queues are full
+
+        Args:
+            game_id (str): The id of the game
+            event (dict[str, Any]): The event
+        """
+        for queue in tuple(self.queues.get(game_id, ())):
+            if not queue.full():
+                queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(
+        self, game_ids: Sequence[str]
+    ) -> AsyncIterator[asyncio.Queue[dict[str, Any]]]:
+        """Follows games while in the context
+
+        Args:
+            game_ids (Sequence[str]): The ids of the games
+
+        Yields:
+            asyncio.Queue[dict[str, Any]]: The queue the events are put in
+        """
+        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(QUEUE_SIZE)
+        new = [game_id for game_id in game_ids if not self.queues.get(game_id)]
+        for game_id in game_ids:
+            self.queues[game_id].add(queue)
+        try:
+            await self.followed(new)
+            yield queue
+        finally:
+            unfollowed = []
+            for game_id in game_ids:
+                self.queues[game_id].discard(queue)
+                if not self.queues[game_id]:
+                    del self.queues[game_id]
+                    unfollowed.append(game_id)
+            await self.unfollowed(unfollowed)
+
+    async def followed(self, game_ids: Sequence[str]) -> None:
+        """Called when games start being followed in the process"""
+
+    async def unfollowed(self, game_ids: Sequence[str]) -> None:
+        """Called when games stop being followed in the process"""
+
+
+class RedisEventBus(EventBus):
+    """Publishes the events on redis, and delivers the events of the games
+    followed in the process from one subscription, whichever instance
+    published them"""
+
+    def __init__(self, redis_client: redis.asyncio.Redis) -> None:
+        """Initializes the bus
+
+        Args:
+            redis_client (redis.asyncio.Redis): The client, without a socket
+                timeout, as the subscription waits for the messages.
+        """
+        super().__init__()
+        self.redis_client = redis_client
+        self.pubsub: redis.asyncio.client.PubSub | None = None
+        self.reader: asyncio.Task | None = None
+
+    async def publish(self, game_id: str, event: dict[str, Any]) -> None:
+        """Publishes an event of a game on its channel
+
+        Args:
+            game_id (str): The id of the game
+            event (dict[str, Any]): The event, serializable as JSON
+        """
+        await self.redis_client.publish(CHANNEL_PREFIX + game_id, json.dumps(event))
+
+    async def followed(self, game_ids: Sequence[str]) -> None:
+        """Subscribes to the channels of the games, starting the reader"""
+        if not game_ids:
+            return
+        if self.pubsub is None:
+            self.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(*[CHANNEL_PREFIX + game_id for game_id in game_ids])
+        if self.reader is None or self.reader.done():
+            self.reader = asyncio.get_running_loop().create_task(self.read())
+
+    async def unfollowed(self, game_ids: Sequence[str]) -> None:
+        """Unsubscribes from the channels of the games"""
+        if game_ids and self.pubsub is not None:
+            await self.pubsub.unsubscribe(
+                *[CHANNEL_PREFIX + game_id for game_id in game_ids]
+            )
+
+    async def read(self) -> None:
+        """Delivers the messages of the subscription, until cancelled; the
+        subscription is set up again after a connection error"""
+        while True:
+            try:
+                message = await self.pubsub.get_message(timeout=1.0)
+            except (redis.ConnectionError, redis.TimeoutError):
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"]
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            self.deliver(channel[len(CHANNEL_PREFIX) :], json.loads(message["data"]))
@@ -0,0 +1,219 @@
+"""The materialized responses of the leaderboards
+
+The response of a leaderboard only changes when a game enters its top, so
+it is built once, serialized, and kept in redis, shared by the instances,
+and in the process. It is rebuilt when a won game would enter it, and after
+SNAPSHOT_TTL seconds at the latest, which also refreshes the names.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+if TYPE_CHECKING:
+    import redis.asyncio
+
+    from ..cinasweeper_logic import Game, GameMode
+
+# the seconds a snapshot is kept in redis, at the latest until it is rebuilt
+SNAPSHOT_TTL = 300
+# the seconds a snapshot is kept in the process before it is read again
+LOCAL_TTL = 2.0
+
+
+@dataclass
+class Snapshot:
+    """A serialized leaderboard
+
+    Attributes:
+        body (bytes): The response
+        etag (str): The entity tag of the response, quoted
+        floor (int): The lowest score on the leaderboard
+        count (int): The number of games on the leaderboard
+    """
+
+    body: bytes
+    etag: str
+    floor: int
+    count: int
+
+    @classmethod
+    def from_body(cls, body: bytes, scores: list[int]) -> Snapshot:
+        """Builds the snapshot of a response
+
+        Args:
+            body (bytes): The response
+            scores (list[int]): The scores of the games on the leaderboard
+
+        Returns:
+            Snapshot: The snapshot
+        """
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        return cls(body, etag, min(scores, default=0), len(scores))
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """Whether the client already has the response
+
+        Args:
+            if_none_match (str | None): The If-None-Match header
+
+        Returns:
+            bool: True if one of the entity tags is the one of the snapshot
+        """
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+        return self.etag in tags or "*" in tags
+
+
+class LeaderboardSnapshots:
+    """Keeps the snapshots of the leaderboards of every game mode, of the
+    top size games"""
+
+    def __init__(
+        self,
+        redis_client: redis.asyncio.Redis | None = None,
+        size: int = 15,
+        local_ttl: float = LOCAL_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initializes the snapshots
+
+        Args:
+            redis_client (redis.asyncio.Redis | None): The client the
+                snapshots are shared with, None to keep them in the process
+                only. Defaults to None.
+            size (int): The number of games on a leaderboard. Defaults to 15.
+            local_ttl (float): The seconds a snapshot is kept in the process
+                before it is read from redis again. Defaults to LOCAL_TTL.
+            clock (Callable[[], float]): The clock of the local ttl.
+                Defaults to time.monotonic.
+        """
+        self.redis_client = redis_client
+        self.size = size
+        self.local_ttl = local_ttl
+        self.clock = clock
+        self.local: dict[GameMode | None, tuple[float, Snapshot]] = {}
+        self.locks: defaultdict[GameMode | None, asyncio.Lock] = defaultdict(
+            asyncio.Lock
+        )
+
+    @staticmethod
+    def key(game_mode: GameMode | None) -> str:
+        """Returns the key of the snapshot of a game mode
+
+        Args:
+            game_mode (GameMode | None): The game mode, None for all of them
+
+        Returns:
+            str: The key
+        """
+        return f"leaderboard:snapshot:{'all' if game_mode is None else game_mode.value}"
+
+    async def get(
+        self,
+        game_mode: GameMode | None,
+        build: Callable[[GameMode | None], Awaitable[Snapshot]],
+    ) -> Snapshot:
+        """Returns the snapshot of a leaderboard, building it if there is none
+
+        Args:
+            game_mode (GameMode | None): The game mode, None for all of them
+            build (Callable[[GameMode | None], Awaitable[Snapshot]]): Builds
+                the snapshot of a game mode
+
+        Returns:
+            Snapshot: The snapshot
+        """
+        snapshot = await self.read(game_mode)
+        if snapshot is not None:
+            return snapshot
+        async with self.locks[game_mode]:
+            # built by another request while this one waited
+            entry = self.local.get(game_mode)
+            if entry is not None and entry[0] > self.clock():
+                return entry[1]
+            return await self.store(game_mode, await build(game_mode))
+
+    async def read(self, game_mode: GameMode | None) -> Snapshot | None:
+        """Returns the snapshot of a leaderboard from the process or redis
+
+        Args:
+            game_mode (GameMode | None): The game mode, None for all of them
+
+        Returns:
+            Snapshot | None: The snapshot, None if there is none
+        """
+        entry = self.local.get(game_mode)
+        if entry is not None and entry[0] > self.clock():
+            return entry[1]
+        if self.redis_client is None:
+            return None
+        fields = await self.redis_client.hgetall(self.key(game_mode))
+        if not fields:
+            self.local.pop(game_mode, None)
+            return None
+        snapshot = Snapshot(
+            fields[b"body"],
+            fields[b"etag"].decode(),
+            int(fields[b"floor"]),
+            int(fields[b"count"]),
+        )
+        self.local[game_mode] = (self.clock() + self.local_ttl, snapshot)
+        return snapshot
+
+    async def store(self, game_mode: GameMode | None, snapshot: Snapshot) -> Snapshot:
+        """Keeps a snapshot in the process and in redis
+
+        Args:
+            game_mode (GameMode | None): The game mode, None for all of them
+            snapshot (Snapshot): The snapshot
+
+        Returns:
+            Snapshot: The snapshot
+        """
+        # without redis, the process has the only copy
+        ttl = SNAPSHOT_TTL if self.redis_client is None else self.local_ttl
+        self.local[game_mode] = (self.clock() + ttl, snapshot)
+        if self.redis_client is not None:
+            key = self.key(game_mode)
+            async with self.redis_client.pipeline(transaction=True) as pipeline:
+                pipeline.hset(
+                    key,
+                    mapping={
+                        "body": snapshot.body,
+                        "etag": snapshot.etag,
+                        "floor": snapshot.floor,
+                        "count": snapshot.count,
+                    },
+                )
+                pipeline.expire(key, SNAPSHOT_TTL)
+                await pipeline.execute()
+        return snapshot
+
+    async def record(
+        self,
+        game: Game,
+        build: Callable[[GameMode | None], Awaitable[Snapshot]],
+    ) -> None:
+        """Rebuilds the leaderboards a won game enters, once its score is saved
+
+        Args:
+            game (Game): The ended game
+            build (Callable[[GameMode | None], Awaitable[Snapshot]]): Builds
+                the snapshot of a game mode
+        """
+        if game.score <= 0:
+            return
+        for game_mode in (None, game.game_mode):
+            snapshot = await self.read(game_mode)
+            if snapshot is None:  # built on the next read
+                continue
+            if snapshot.count < self.size or game.score > snapshot.floor:
+                async with self.locks[game_mode]:
+                    await self.store(game_mode, await build(game_mode))
@@ -0,0 +1,244 @@
+"""The configuration and the connections of the API
+
+Everything is built on first use and kept, so a cold start only sets up
+what its request needs and warm invocations reuse the connections.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from functools import lru_cache
+from typing import Any, Optional
+
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+from ..cinasweeper_database import (AsyncDatabase, AsyncInMemoryDatabase,
+                                    BinaryStateCodec, Database,
+                                    EventSourcedDatabase, GameCache)
+from .authentication import AuthManager
+from .events import EventBus, RedisEventBus
+from .leaderboard import LeaderboardSnapshots
+
+# the errors after which a command is retried, with an exponential backoff
+RETRY_ON = [redis.ConnectionError, redis.TimeoutError]
+RETRIES = 3
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 1.0
+# seconds
+SOCKET_TIMEOUT = 5.0
+CONNECT_TIMEOUT = 2.0
+HEALTH_CHECK_INTERVAL = 30
+MAX_CONNECTIONS = 50
+# the games are cached for GAME_CACHE_TTL seconds when GAME_CACHE_SIZE is set
+GAME_CACHE_TTL = 5.0
+# the number of verified tokens kept by the manager, unless AUTH_CACHE_SIZE is set
+AUTH_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def load_config() -> dict[str, Any]:
+    """Load the config file once
+
+    Returns:
+        dict[str, Any]: The config, empty if there is no config file
+    """
+    try:
+        with open("environment.json", "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def get_conf_value(key: str) -> Optional[str]:
+    """Get a value from the config file, or from the environment
+    Args:
+        key (str): The key to get the value from
+    Returns:
+        Optional[str]: The value, None if it is not set
+    """
+    config = load_config()
+    return config[key] if key in config else os.getenv(key)
+
+
+def connection_settings() -> dict[str, Any]:
+    """Get the settings of the redis connections
+    Returns:
+        dict[str, Any]: The keyword arguments of the connection pools
+    """
+    host = get_conf_value("REDIS_HOST")
+    port = get_conf_value("REDIS_PORT")
+    timeout = get_conf_value("REDIS_SOCKET_TIMEOUT")
+    return dict(
+        host=host if host else "localhost",
+        port=int(port) if port and str(port).isdigit() else 6379,
+        password=get_conf_value("REDIS_PASSWORD"),
+        db=0,
+        socket_timeout=float(timeout) if timeout else SOCKET_TIMEOUT,
+        socket_connect_timeout=CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        retry_on_error=RETRY_ON,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """Get the blocking redis client
+    Returns:
+        redis.Redis: The client
+    """
+    return redis.Redis(
+        connection_pool=redis.ConnectionPool(
+            retry=Retry(ExponentialBackoff(BACKOFF_CAP, BACKOFF_BASE), RETRIES),
+            **connection_settings(),
+        )
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """Get the async redis client; the requests wait for a free connection
+    when all the connections are in use
+    Returns:
+        redis.asyncio.Redis: The client
+    """
+    max_connections = get_conf_value("REDIS_MAX_CONNECTIONS")
+    return redis.asyncio.Redis(
+        connection_pool=redis.asyncio.BlockingConnectionPool(
+            max_connections=int(max_connections or MAX_CONNECTIONS),
+            timeout=SOCKET_TIMEOUT,
+            retry=AsyncRetry(ExponentialBackoff(BACKOFF_CAP, BACKOFF_BASE), RETRIES),
+            **connection_settings(),
+        )
+    )
+
+
+@lru_cache(maxsize=None)
+def get_game_cache() -> Optional[GameCache]:
+    """Get the cache of the games, shared by the requests of the instance;
+    GAME_CACHE_TRACKING "true" drops the games changed by other instances
+    right away instead of after the ttl
+    Returns:
+        Optional[GameCache]: The cache, None unless GAME_CACHE_SIZE is set
+    """
+    size = get_conf_value("GAME_CACHE_SIZE")
+    if not size or int(size) <= 0:
+        return None
+    ttl = get_conf_value("GAME_CACHE_TTL")
+    return GameCache(int(size), float(ttl) if ttl else GAME_CACHE_TTL)
+
+
+@lru_cache(maxsize=None)
+def track_game_cache() -> Optional[asyncio.Task]:
+    """Start following the invalidations of the cached games, once; must be
+    called from the event loop of the async client. The tracking is off
+    unless GAME_CACHE_TRACKING is "true", as fakeredis cannot check it: test
+    it with a redis server in REDIS_TEST_URL before turning it on
+    Returns:
+        Optional[asyncio.Task]: The task, None if the tracking is off
+    """
+    cache = get_game_cache()
+    if cache is None or str(get_conf_value("GAME_CACHE_TRACKING")).lower() != "true":
+        return None
+    # the subscription waits for the messages, without a socket timeout
+    client = redis.asyncio.Redis(**dict(connection_settings(), socket_timeout=None))
+    return asyncio.get_running_loop().create_task(cache.track_invalidations(client))
+
+
+@lru_cache(maxsize=None)
+def get_database() -> AsyncDatabase | AsyncInMemoryDatabase:
+    """Get the database; STORAGE_MODE "events" stores the moves of every game
+    instead of rewriting its state, "memory" keeps the games in the process,
+    without redis, for a single node. STATE_CODEC "binary" stores the states
+    as packed bytes, migrating the JSON ones as they are played; MOVE_MODE
+    "script" also stores the cells uncompressed and plays the moves in redis
+    Returns:
+        AsyncDatabase | AsyncInMemoryDatabase: The database
+    """
+    if get_conf_value("STORAGE_MODE") == "memory":
+        return AsyncInMemoryDatabase()
+    codec = None
+    if get_conf_value("MOVE_MODE") == "script":
+        codec = BinaryStateCodec(raw_cells=True)
+    elif get_conf_value("STATE_CODEC") == "binary":
+        codec = BinaryStateCodec()
+    database = (
+        EventSourcedDatabase(get_redis_client(), state_codec=codec)
+        if get_conf_value("STORAGE_MODE") == "events"
+        else Database(get_redis_client(), codec)
+    )
+    return AsyncDatabase(database, get_async_redis_client(), get_game_cache())
+
+
+@lru_cache(maxsize=None)
+def get_manager() -> AuthManager:
+    """Get the authentication manager, setting up Firebase; AUTH_CACHE_SIZE
+    is the number of verified tokens and of display names kept, 0 to verify
+    every request, and STORE_USER_NAMES "true" stores the display names of
+    the users in the games they create or claim
+    Returns:
+        AuthManager: The manager
+    """
+    size = get_conf_value("AUTH_CACHE_SIZE")
+    return AuthManager(
+        cache_size=int(size) if size else AUTH_CACHE_SIZE,
+        store_names=str(get_conf_value("STORE_USER_NAMES")).lower() == "true",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_leaderboards() -> LeaderboardSnapshots:
+    """Get the snapshots of the leaderboards, shared through redis unless
+    STORAGE_MODE is "memory"
+    Returns:
+        LeaderboardSnapshots: The snapshots
+    """
+    if get_conf_value("STORAGE_MODE") == "memory":
+        return LeaderboardSnapshots()
+    return LeaderboardSnapshots(get_async_redis_client())
+
+
+@lru_cache(maxsize=None)
+def get_event_bus() -> EventBus:
+    """Get the bus of the live events, through redis pub/sub unless
+    STORAGE_MODE is "memory"
+    Returns:
+        EventBus: The bus
+    """
+    if get_conf_value("STORAGE_MODE") == "memory":
+        return EventBus()
+    # the subscription waits for the messages, without a socket timeout
+    return RedisEventBus(
+        redis.asyncio.Redis(
+            retry=AsyncRetry(ExponentialBackoff(BACKOFF_CAP, BACKOFF_BASE), RETRIES),
+            **dict(connection_settings(), socket_timeout=None),
+        )
+    )
+
+
+# FastAPI runs sync dependencies in the threadpool, these run on the event loop
+async def database_dependency() -> AsyncDatabase | AsyncInMemoryDatabase:
+    """get_database, as a dependency; starts tracking the cached games"""
+    database = get_database()
+    track_game_cache()
+    return database
+
+
+async def manager_dependency() -> AuthManager:
+    """get_manager, as a dependency"""
+    return get_manager()
+
+
+async def leaderboards_dependency() -> LeaderboardSnapshots:
+    """get_leaderboards, as a dependency"""
+    return get_leaderboards()
+
+
+async def events_dependency() -> EventBus:
+    """get_event_bus, as a dependency"""
+    return get_event_bus()
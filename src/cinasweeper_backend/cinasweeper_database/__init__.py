@@ -1,4 +1,22 @@
-"""A redis database for cinasweeper."""
+"""The databases of cinasweeper, in redis or in memory."""
+from .asyncdatabase import AsyncRedisDatabase as AsyncDatabase
+from .cache import CachedDatabase, GameCache
+from .codec import BinaryStateCodec, JsonStateCodec
 from .database import RedisDatabase as Database
+from .eventsourced import EventSourcedRedisDatabase as EventSourcedDatabase
+from .memory import AsyncInMemoryDatabase, InMemoryDatabase
+from .unitofwork import AsyncUnitOfWork, UnitOfWork
 
-__all__ = ["Database"]
+__all__ = [
+    "AsyncDatabase",
+    "AsyncInMemoryDatabase",
+    "AsyncUnitOfWork",
+    "BinaryStateCodec",
+    "CachedDatabase",
+    "Database",
+    "EventSourcedDatabase",
+    "GameCache",
+    "InMemoryDatabase",
+    "JsonStateCodec",
+    "UnitOfWork",
+]
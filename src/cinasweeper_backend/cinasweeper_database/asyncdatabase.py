@@ -0,0 +1,457 @@
+"""The redis database, with an async client"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+from redis.commands.json.path import Path
+from redis.exceptions import NoScriptError
+
+from ..cinasweeper_logic import Leaderboard
+from ..cinasweeper_logic.exceptions import GameNotFoundError
+from .database import Serializer
+from .scripts import (MOVE_SCRIPT, MOVE_SCRIPT_SHA, move_script_arguments,
+                      outcome_from_reply)
+from .unitofwork import AsyncUnitOfWork
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import redis.asyncio
+
+    from ..cinasweeper_logic import (BoardSize, Game, GameMode, GameState,
+                                     Move, MoveOutcome, User)
+    from .cache import GameCache
+    from .database import RedisDatabase
+
+T = TypeVar("T")
+
+
+class AsyncRedisDatabase:
+    """A database that sends the commands of a RedisDatabase with an async client
+
+    The commands are queued on async pipelines by the wrapped database, so
+    the records are the same and both the snapshot and the event-sourced
+    storage can be used. The client of the wrapped database is never used,
+    the log of an event-sourced state is read by a script on the same pipeline.
+
+    With a cache, the games are read through it and written to it on save.
+    """
+
+    def __init__(
+        self,
+        database: RedisDatabase,
+        redis_client: redis.asyncio.Redis,
+        cache: GameCache | None = None,
+    ) -> None:
+        """Initialize the database
+
+        Args:
+            database (RedisDatabase): The database building the commands
+            redis_client (redis.asyncio.Redis): The async redis client to use
+            cache (GameCache | None): The cache of the games. Defaults to None.
+        """
+        self.database = database
+        self.redis_client = redis_client
+        self.cache = cache
+        self.serializer = Serializer(self)
+
+    async def execute(self, write: Callable[[RedisDatabase], T]) -> T:
+        """Runs a write of the wrapped database on a pipeline and sends it
+
+        Args:
+            write (Callable[[RedisDatabase], T]): The write
+
+        Returns:
+            T: The result of the write
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        result = write(self.with_client(pipeline))
+        await pipeline.execute()
+        return result
+
+    def unit_of_work(self) -> AsyncUnitOfWork:
+        """Returns a unit of work over the database, for a request
+
+        Returns:
+            AsyncUnitOfWork: The unit of work
+        """
+        return AsyncUnitOfWork(self, self.cache)
+
+    def with_client(self, redis_client: redis.asyncio.Redis) -> RedisDatabase:
+        """Returns the wrapped database using another client,
+        such as an async pipeline to queue the writes on.
+
+        Args:
+            redis_client (redis.asyncio.Redis): The client to use
+
+        Returns:
+            RedisDatabase: The copy of the wrapped database
+        """
+        return self.database.with_client(redis_client)
+
+    async def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object,
+        best games first.
+
+        Args:
+            owner (User): The User object to retrieve games for.
+            offset (int): The number of games to skip. Defaults to 0.
+            limit (int): The maximal number of games to return. Defaults to 10.
+
+        Returns:
+            tuple[Game]:
+                A tuple containing the Game objects owned by the given User object.
+        """
+        games = await self.redis_client.ft().search(
+            self.database.games_query(owner, offset, limit)
+        )
+        return tuple(self.serializer.from_document(game) for game in games.docs)
+
+    async def get_game(self, identifier: str, cached: bool = True) -> Game:
+        """Returns a game by its id
+
+        Args:
+            identifier (str): The id of the game
+            cached (bool): Whether the game can be taken from the cache,
+                False to authorize a change with it. Defaults to True.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            Game: The game
+        """
+        record = (await self.get_records([identifier], cached))[identifier]
+        if not record:
+            raise GameNotFoundError(identifier)
+        return self.serializer.from_json(record)
+
+    async def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids, reading the ones that are not
+        cached with one JSON.MGET
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[Game, ...]: The games, in the order of the ids
+        """
+        records = await self.get_records(identifiers)
+        for identifier in identifiers:
+            if not records[identifier]:
+                raise GameNotFoundError(identifier)
+        return tuple(
+            self.serializer.from_json(records[identifier]) for identifier in identifiers
+        )
+
+    async def get_records(
+        self, identifiers: Sequence[str], cached: bool = True
+    ) -> dict[str, dict | None]:
+        """Returns the records of several games by their ids, reading the
+        ones that are not cached with one JSON.MGET
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+            cached (bool): Whether the records can be taken from the cache,
+                they are written to it in any case. Defaults to True.
+
+        Returns:
+            dict[str, dict | None]: The records by id, None if not found
+        """
+        records = {
+            identifier: None
+            if self.cache is None or not cached
+            else self.cache.get(identifier)
+            for identifier in identifiers
+        }
+        missing = [identifier for identifier, record in records.items() if not record]
+        if missing:
+            games = await self.redis_client.json().mget(
+                [f"game:{identifier}" for identifier in missing], Path.root_path()
+            )
+            for identifier, game in zip(missing, games):
+                records[identifier] = game
+                if game and self.cache is not None:
+                    self.cache.put(identifier, game)
+        return records
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard of a game mode, whose methods return coroutines.
+
+        Args:
+            game_mode (GameMode | None): The game mode of the leaderboard.
+                Defaults to None, the global leaderboard.
+
+        Returns:
+            Leaderboard: The leaderboard.
+        """
+        return Leaderboard(self, game_mode)
+
+    async def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Get the top_n games, removing the games that are not found any
+        more from the leaderboard
+
+        Args:
+            num_of_games (int): The number of games to get
+            game_mode (GameMode | None): The game mode of the games,
+                None for all the game modes.
+
+        Returns:
+            tuple[Game, ...]: The top_n games
+        """
+        key = self.database.leaderboard_key("games", game_mode)
+        games: list[Game] = []
+        while len(games) < num_of_games:
+            identifiers = [
+                identifier.decode()
+                for identifier in await self.redis_client.zrevrange(
+                    key, len(games), num_of_games - 1
+                )
+            ]
+            if not identifiers:
+                break
+            records = await self.get_records(identifiers)
+            games.extend(
+                self.serializer.from_json(records[identifier])
+                for identifier in identifiers
+                if records[identifier]
+            )
+            missing = [
+                identifier for identifier in identifiers if not records[identifier]
+            ]
+            if not missing:
+                break
+            # the games after them move up, read them instead
+            await self.redis_client.zrem(key, *missing)
+        return tuple(games)
+
+    async def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard
+
+        Args:
+            identifier (str): The ID of the game.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the game, starting from 1,
+                or None if the game was not won.
+        """
+        rank = await self.redis_client.zrevrank(
+            self.database.leaderboard_key("games", game_mode), identifier
+        )
+        return None if rank is None else rank + 1
+
+    async def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard
+
+        Args:
+            user (User): The user.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the user, starting from 1,
+                or None if the user has not won any game.
+        """
+        rank = await self.redis_client.zrevrank(
+            self.database.leaderboard_key("users", game_mode), user.identifier
+        )
+        return None if rank is None else rank + 1
+
+    async def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game.
+
+        Args:
+            identifier (str): The ID of the game to retrieve the state for.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The state of the game.
+        """
+        (state,) = await self.get_game_states([identifier])
+        return state
+
+    async def get_game_states(
+        self, identifiers: Sequence[str]
+    ) -> tuple[GameState, ...]:
+        """Returns the current states of several games with one pipeline.
+
+        Args:
+            identifiers (Sequence[str]): The IDs of the games.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[GameState, ...]: The states, in the order of the IDs.
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        bounds = [0]
+        for identifier in identifiers:
+            self.read_game_state(pipeline, identifier)
+            bounds.append(len(pipeline))
+        replies = await pipeline.execute() if identifiers else []
+        return tuple(
+            self.game_state_from_replies(identifier, replies[start:end])
+            for identifier, start, end in zip(identifiers, bounds, bounds[1:])
+        )
+
+    def read_game_state(
+        self, pipeline: redis.asyncio.client.Pipeline, identifier: str
+    ) -> None:
+        """Queues the commands reading the state of a game on a pipeline.
+
+        Args:
+            pipeline (redis.asyncio.client.Pipeline): The pipeline to queue
+                the commands on
+            identifier (str): The ID of the game.
+        """
+        self.database.read_game_state(pipeline, identifier)
+
+    def game_state_from_replies(self, identifier: str, replies: list) -> GameState:
+        """Builds the state of a game from the replies to read_game_state.
+
+        Args:
+            identifier (str): The ID of the game.
+            replies (list): The replies to the commands of read_game_state.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The state of the game.
+        """
+        state = self.database.game_state_from_replies(identifier, replies)
+        state.database = self
+        return state
+
+    async def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a given game state to the database.
+
+        Args:
+            identifier (str): The ID of the game to save the state for.
+            gamestate (GameState): The GameState object to save.
+        """
+        await self.execute(
+            lambda database: database.save_game_state(identifier, gamestate)
+        )
+
+    async def save_move(
+        self, identifier: str, move: Move, gamestate: GameState
+    ) -> None:
+        """Saves a move and the state of the game after it.
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+        await self.execute(
+            lambda database: database.save_move(identifier, move, gamestate)
+        )
+
+    async def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves moves and the state of the game after them.
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves, in order.
+            gamestate (GameState): The GameState object after the moves.
+        """
+        await self.execute(
+            lambda database: database.save_moves(identifier, moves, gamestate)
+        )
+
+    @property
+    def scripted_moves(self) -> bool:
+        """Whether the moves are played in redis by MOVE_SCRIPT"""
+        return self.database.scripted_moves
+
+    async def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays moves on the stored state of a game with MOVE_SCRIPT.
+
+        Args:
+            identifier (str): The ID of the game.
+            moves (Sequence[Move]): The moves, in order.
+            with_state (bool): Send back the state after the moves with the
+                outcome, in the same round trip. Defaults to False.
+
+        Raises:
+            GameEndedError: The game was already decided.
+            CellOutOfBoardError: A move is outside of the board.
+
+        Returns:
+            MoveOutcome | None: The outcome of the moves, None if the state
+                cannot be changed by the script.
+        """
+        if not self.scripted_moves:
+            return None
+        arguments = move_script_arguments(identifier, moves, with_state)
+        try:
+            reply = await self.redis_client.evalsha(MOVE_SCRIPT_SHA, *arguments)
+        except NoScriptError:
+            reply = await self.redis_client.eval(MOVE_SCRIPT, *arguments)
+        outcome = outcome_from_reply(reply)
+        if outcome is not None and with_state:
+            outcome.state = self.game_state_from_replies(identifier, [reply[5]])
+        return outcome
+
+    async def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboards.
+
+        Args:
+            game (Game): The ended game.
+        """
+        await self.execute(lambda database: database.save_score(game))
+
+    async def save_game(self, game: Game) -> None:
+        """Saves the state of a given game.
+
+        Args:
+            game (Game): The Game object to save the state for.
+        """
+        await self.execute(lambda database: database.save_game(game))
+        if self.cache is not None:
+            self.cache.put(game.identifier, self.serializer.to_json(game))
+
+    async def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game owned by the specified User object,
+        or by no one if owner is None; a 1v1 game is created with its opponent.
+
+        Args:
+            owner (User | None): The User object to create the game for,
+                or None if the game should have no owner.
+            gamemode (GameMode): The GameMode object to create the game for.
+            size (BoardSize | None): The size of the board.
+                Defaults to the classic 14x14 board with 30 mines.
+
+        Returns:
+            Game: The newly created Game object.
+        """
+        game = await self.execute(
+            lambda database: database.create_game(owner, gamemode, size)
+        )
+        game.database = self
+        if self.cache is not None:
+            self.cache.put(game.identifier, self.serializer.to_json(game))
+        return game
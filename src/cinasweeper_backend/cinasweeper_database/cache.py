@@ -0,0 +1,323 @@
+"""A cache of the games, in front of a database
+
+Only the games are cached, not their states: a game changes when it is
+claimed and when it ends, while its state changes on every move.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable
+
+import redis
+
+from ..cinasweeper_logic import Leaderboard
+from .database import Serializer
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import redis.asyncio
+
+    from ..cinasweeper_logic import (BoardSize, Database, Game, GameMode,
+                                     GameState, Move, MoveOutcome, User)
+
+# the channel redis sends the invalidated keys to, when tracking is redirected
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+class GameCache:
+    """Keeps the records of the recently used games
+
+    The least recently used game is dropped when the cache is full, and a
+    game is read again after ttl seconds, so the changes made by other
+    instances are seen after at most ttl seconds. With track_invalidations
+    they are seen right away. Either way a cached game can be stale, so the
+    claims and the moves are authorized with the games read from redis.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initializes the cache
+
+        Args:
+            maxsize (int): The maximal number of games. Defaults to 1024.
+            ttl (float): The seconds a game is kept for. Defaults to 5.
+            clock (Callable[[], float]): The clock of the ttl.
+                Defaults to time.monotonic.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.records: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, identifier: str) -> dict | None:
+        """Returns the record of a game, if it is cached and has not expired
+
+        Args:
+            identifier (str): The id of the game
+
+        Returns:
+            dict | None: The record, None on a miss
+        """
+        with self.lock:
+            entry = self.records.get(identifier)
+            if entry is not None and entry[0] > self.clock():
+                self.records.move_to_end(identifier)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.records[identifier]
+            self.misses += 1
+            return None
+
+    def put(self, identifier: str, record: dict) -> None:
+        """Caches the record of a game, dropping the least recently used
+        game when the cache is full
+
+        Args:
+            identifier (str): The id of the game
+            record (dict): The record, as serialized by Serializer.to_json
+        """
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.records[identifier] = (self.clock() + self.ttl, record)
+            self.records.move_to_end(identifier)
+            while len(self.records) > self.maxsize:
+                self.records.popitem(last=False)
+
+    def invalidate(self, identifier: str) -> None:
+        """Drops a game from the cache
+
+        Args:
+            identifier (str): The id of the game
+        """
+        with self.lock:
+            self.records.pop(identifier, None)
+
+    def clear(self) -> None:
+        """Drops all the games"""
+        with self.lock:
+            self.records.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Returns the counters of the cache
+
+        Returns:
+            dict[str, int]: The hits, the misses and the number of cached games
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.records)}
+
+    async def track_invalidations(
+        self, redis_client: redis.asyncio.Redis, prefix: str = "game:"
+    ) -> None:
+        """Drops the games changed by any client, until cancelled
+
+        Uses the client-side caching of redis: the keys starting with the
+        prefix are tracked in broadcast mode, and the invalidations are
+        redirected to a connection subscribed to them. The cache is cleared
+        whenever the tracking is set up again, as changes may have been missed.
+
+        Args:
+            redis_client (redis.asyncio.Redis): The client, without a socket
+                timeout, as the subscription waits for the messages.
+            prefix (str): The prefix of the keys of the games.
+                Defaults to "game:".
+        """
+        while True:
+            try:
+                await self.follow_invalidations(redis_client, prefix)
+            except (redis.ConnectionError, redis.TimeoutError):
+                self.clear()
+                await asyncio.sleep(1)
+
+    async def follow_invalidations(
+        self, redis_client: redis.asyncio.Redis, prefix: str
+    ) -> None:
+        """Sets up the tracking and follows the invalidations, as described
+        in track_invalidations
+        """
+        async with redis_client.pubsub() as pubsub, redis_client.client() as tracker:
+            await pubsub.execute_command("CLIENT", "ID")
+            client_id = await pubsub.parse_response(block=True)
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+            await tracker.client_tracking_on(client_id, [prefix], bcast=True)
+            self.clear()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                if message["data"] is None:  # the database was flushed
+                    self.clear()
+                    continue
+                for key in message["data"]:
+                    key = key.decode() if isinstance(key, bytes) else key
+                    self.invalidate(key[len(prefix) :])
+
+
+class CachedDatabase:
+    """Wraps any database, reading the games through a GameCache
+
+    The saved and created games are written to the cache as well as to the
+    wrapped database. The other methods are passed through; the games and
+    states they return are bound to this database, so that they are saved
+    through the cache too.
+    """
+
+    def __init__(self, database: Database, cache: GameCache) -> None:
+        """Initializes the database
+
+        Args:
+            database (Database): The wrapped database
+            cache (GameCache): The cache of the games
+        """
+        self.database = database
+        self.cache = cache
+        self.serializer = Serializer(self)
+
+    def adopt(self, game: Game) -> Game:
+        """Binds a game of the wrapped database to this database
+
+        Args:
+            game (Game): The game
+
+        Returns:
+            Game: The game, bound to this database
+        """
+        return self.serializer.from_json(self.serializer.to_json(game))
+
+    def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object."""
+        games = self.database.get_games(owner, offset, limit)
+        return tuple(self.adopt(game) for game in games)
+
+    def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id, from the cache if it is there
+
+        Args:
+            identifier (str): The id of the game
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            Game: The game
+        """
+        (game,) = self.get_games_by_ids([identifier])
+        return game
+
+    def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids, reading the ones that are
+        not cached at once
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[Game, ...]: The games, in the order of the ids
+        """
+        records = {identifier: self.cache.get(identifier) for identifier in identifiers}
+        missing = [identifier for identifier, record in records.items() if not record]
+        for game in self.database.get_games_by_ids(missing) if missing else ():
+            records[game.identifier] = self.serializer.to_json(game)
+            self.cache.put(game.identifier, records[game.identifier])
+        return tuple(
+            self.serializer.from_json(records[identifier]) for identifier in identifiers
+        )
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard of a game mode."""
+        return Leaderboard(self, game_mode)
+
+    def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Returns the top games."""
+        games = self.database.get_top_games(num_of_games, game_mode)
+        return tuple(self.adopt(game) for game in games)
+
+    def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard."""
+        return self.database.get_game_rank(identifier, game_mode)
+
+    def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard."""
+        return self.database.get_user_rank(user, game_mode)
+
+    def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game."""
+        state = self.database.get_game_state(identifier)
+        state.database = self
+        return state
+
+    def get_game_states(self, identifiers: Sequence[str]) -> tuple[GameState, ...]:
+        """Returns the current states of several games."""
+        states = self.database.get_game_states(identifiers)
+        for state in states:
+            state.database = self
+        return states
+
+    def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a given game state to the database."""
+        self.database.save_game_state(identifier, gamestate)
+
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Saves the state of a game after a move."""
+        self.database.save_move(identifier, move, gamestate)
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves the state of a game after moves."""
+        self.database.save_moves(identifier, moves, gamestate)
+
+    @property
+    def scripted_moves(self) -> bool:
+        """Whether the wrapped database plays the moves itself"""
+        return self.database.scripted_moves
+
+    def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays moves in the wrapped database, if it can."""
+        return self.database.apply_moves(identifier, moves, with_state)
+
+    def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboards."""
+        self.database.save_score(game)
+
+    def save_game(self, game: Game) -> None:
+        """Saves a game to the wrapped database, then to the cache
+
+        Args:
+            game (Game): The Game object to save.
+        """
+        self.database.save_game(game)
+        self.cache.put(game.identifier, self.serializer.to_json(game))
+
+    def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game in the wrapped database and caches it."""
+        game = self.adopt(self.database.create_game(owner, gamemode, size))
+        self.cache.put(game.identifier, self.serializer.to_json(game))
+        return game
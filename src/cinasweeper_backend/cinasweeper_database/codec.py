@@ -0,0 +1,277 @@
+"""The formats the states of the games are stored in
+
+A codec queues the commands reading a state on a pipeline, builds the
+state from their replies, and writes it. The redis databases take the
+codec to use, JSON by default.
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import TYPE_CHECKING, Protocol
+
+from redis.commands.json.path import Path
+
+from ..cinasweeper_logic import Board, BoardSize, GameState
+from ..cinasweeper_logic.exceptions import UnknownStateFormatError
+from ..cinasweeper_logic.minesweeper import Progress
+
+if TYPE_CHECKING:
+    import redis
+
+    from .database import Serializer
+
+# the first byte of a binary state, increased when the layout changes
+FORMAT_VERSION = 1
+# format version, flags, height, width, number of mines, version, moves, seed
+HEADER = struct.Struct("<BBIIIIIQ")
+PROGRESS = struct.Struct("<5I")
+FIRST_CLICK = struct.Struct("<2I")
+# the flags of a binary state: which optional parts follow the header
+HAS_SEED = 1
+HAS_PROGRESS = 2
+HAS_FIRST_CLICK = 4  # followed by the compressed marks of the player
+HAS_BOARD = 8  # followed by the compressed cells of the whole board
+HAS_CELLS = 16  # followed by the cells, uncompressed, that scripts can change
+DECIDED = 32  # set by MOVE_SCRIPT once the game is won or lost
+
+
+class StateCodec(Protocol):
+    """The format the states are stored in"""
+
+    # whether the states can be changed by MOVE_SCRIPT
+    scriptable: bool
+
+    def queue_read(self, pipeline: redis.client.Pipeline, identifier: str) -> None:
+        """Queues the commands reading the state of a game"""
+
+    def decode(self, serializer: Serializer, replies: list) -> GameState | None:
+        """Builds a state from the replies to queue_read, None if not found"""
+
+    def write(
+        self,
+        redis_client: redis.Redis,
+        serializer: Serializer,
+        identifier: str,
+        state: GameState,
+    ) -> None:
+        """Writes the state of a game"""
+
+
+class JsonStateCodec:
+    """Stores a state as a RedisJSON document, as serialized by
+    Serializer.state_to_json"""
+
+    scriptable = False
+
+    def queue_read(self, pipeline: redis.client.Pipeline, identifier: str) -> None:
+        """Queues the commands reading the state of a game
+
+        Args:
+            pipeline (redis.client.Pipeline): The pipeline
+            identifier (str): The ID of the game
+        """
+        pipeline.json().get(f"gamestate:{identifier}")
+
+    def decode(self, serializer: Serializer, replies: list) -> GameState | None:
+        """Builds a state from the replies to queue_read
+
+        Args:
+            serializer (Serializer): The serializer of the database
+            replies (list): The replies
+
+        Returns:
+            GameState | None: The state, None if it was not found
+        """
+        return None if replies[0] is None else serializer.state_from_json(replies[0])
+
+    def write(
+        self,
+        redis_client: redis.Redis,
+        serializer: Serializer,
+        identifier: str,
+        state: GameState,
+    ) -> None:
+        """Writes the state of a game
+
+        Args:
+            redis_client (redis.Redis): The client or the pipeline to write with
+            serializer (Serializer): The serializer of the database
+            identifier (str): The ID of the game
+            state (GameState): The state
+        """
+        redis_client.json().set(
+            f"gamestate:{identifier}", Path.root_path(), serializer.state_to_json(state)
+        )
+
+
+class BinaryStateCodec:
+    """Stores a state as packed bytes with plain GET and SET
+
+    The bytes start with FORMAT_VERSION and the HEADER, then the progress,
+    the first click and the compressed marks, or the compressed cells of
+    converted boards. It takes a fraction of the memory of the JSON document
+    and needs no JSON parsing.
+
+    States still stored as JSON are read too while migrate is on, and the
+    JSON document is deleted when the state is written again, so the states
+    are migrated as the games are played. The client must not decode the
+    responses.
+
+    With raw_cells, the cells are stored uncompressed after the first move,
+    one byte per cell, so that MOVE_SCRIPT can play the moves in redis.
+    """
+
+    def __init__(self, migrate: bool = True, raw_cells: bool = False) -> None:
+        """Initializes the codec
+
+        Args:
+            migrate (bool): Read the states stored as JSON and delete them
+                once they are rewritten. Defaults to True.
+            raw_cells (bool): Store the cells uncompressed. Defaults to False.
+        """
+        self.migrate = migrate
+        self.raw_cells = raw_cells
+        self.scriptable = raw_cells
+        self.json = JsonStateCodec()
+
+    def queue_read(self, pipeline: redis.client.Pipeline, identifier: str) -> None:
+        """Queues the commands reading the state of a game
+
+        Args:
+            pipeline (redis.client.Pipeline): The pipeline
+            identifier (str): The ID of the game
+        """
+        pipeline.get(f"state:{identifier}")
+        if self.migrate:
+            self.json.queue_read(pipeline, identifier)
+
+    def decode(self, serializer: Serializer, replies: list) -> GameState | None:
+        """Builds a state from the replies to queue_read
+
+        Args:
+            serializer (Serializer): The serializer of the database
+            replies (list): The replies
+
+        Raises:
+            UnknownStateFormatError: The state was written in a newer format.
+
+        Returns:
+            GameState | None: The state, None if it was not found
+        """
+        if replies[0] is not None:
+            return self.unpack(serializer, replies[0])
+        if self.migrate:
+            return self.json.decode(serializer, replies[1:])
+        return None
+
+    def write(
+        self,
+        redis_client: redis.Redis,
+        serializer: Serializer,
+        identifier: str,
+        state: GameState,
+    ) -> None:
+        """Writes the state of a game, deleting its JSON document
+
+        Args:
+            redis_client (redis.Redis): The client or the pipeline to write with
+            serializer (Serializer): The serializer of the database
+            identifier (str): The ID of the game
+            state (GameState): The state
+        """
+        redis_client.set(f"state:{identifier}", self.pack(state))
+        if self.migrate:
+            redis_client.unlink(f"gamestate:{identifier}")
+
+    def pack(self, state: GameState) -> bytes:
+        """Packs a state into bytes
+
+        Args:
+            state (GameState): The state
+
+        Returns:
+            bytes: The packed state
+        """
+        board = state.board
+        flags = 0 if state.seed is None else HAS_SEED
+        parts = []
+        progress = state.progress
+        if board is not None and progress is None and self.raw_cells:
+            progress = state.progress = Progress.from_board(board)
+        if board is not None and progress is not None:
+            flags |= HAS_PROGRESS
+            parts.append(
+                PROGRESS.pack(
+                    progress.num_mines,
+                    progress.safe_cells,
+                    progress.correct_flags,
+                    progress.wrong_flags,
+                    progress.opened_cells,
+                )
+            )
+        if board is not None and state.first_click is not None:
+            flags |= HAS_FIRST_CLICK
+            parts.append(FIRST_CLICK.pack(*state.first_click))
+        if board is not None and self.raw_cells:
+            flags |= HAS_CELLS
+            parts.append(bytes(board.cells))
+        elif board is not None and state.first_click is not None:
+            parts.append(zlib.compress(board.marks()))
+        elif board is not None:
+            flags |= HAS_BOARD
+            parts.append(zlib.compress(board.cells))
+        header = HEADER.pack(
+            FORMAT_VERSION,
+            flags,
+            state.size.height,
+            state.size.width,
+            state.size.num_mines,
+            state.version,
+            state.moves,
+            state.seed or 0,
+        )
+        return header + b"".join(parts)
+
+    def unpack(self, serializer: Serializer, data: bytes) -> GameState:
+        """Unpacks a state packed by pack
+
+        Args:
+            serializer (Serializer): The serializer of the database
+            data (bytes): The packed state
+
+        Raises:
+            UnknownStateFormatError: The state was written in a newer format.
+
+        Returns:
+            GameState: The state
+        """
+        if data[0] != FORMAT_VERSION:
+            raise UnknownStateFormatError(data[0])
+        _, flags, height, width, num_mines, version, moves, seed = HEADER.unpack_from(
+            data
+        )
+        offset = HEADER.size
+        progress = None
+        if flags & HAS_PROGRESS:
+            progress = Progress(*PROGRESS.unpack_from(data, offset))
+            offset += PROGRESS.size
+        state = GameState(
+            database=serializer.database,
+            size=BoardSize(height, width, num_mines),
+            seed=seed if flags & HAS_SEED else None,
+            progress=progress,
+            version=version,
+            moves=moves,
+        )
+        if flags & HAS_FIRST_CLICK:
+            state.first_click = FIRST_CLICK.unpack_from(data, offset)
+            offset += FIRST_CLICK.size
+        if flags & HAS_CELLS:
+            state.board = Board(height, width, bytearray(data[offset:]))
+        elif flags & HAS_FIRST_CLICK:
+            state.marks = zlib.decompress(data[offset:])
+        elif flags & HAS_BOARD:
+            cells = bytearray(zlib.decompress(data[offset:]))
+            state.board = Board(height, width, cells)
+        return state
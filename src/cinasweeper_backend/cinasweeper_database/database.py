@@ -1,23 +1,55 @@
 """The implementation of the redis database"""
 from __future__ import annotations
 
+import base64
+import copy
 import datetime
 import json
+import random
+import re
 import uuid
+import zlib
 from typing import TYPE_CHECKING
 
 from redis.commands.json.path import Path
-from redis.commands.search.field import NumericField, TagField, TextField
-from redis.commands.search.indexDefinition import IndexDefinition, IndexType
-from redis.commands.search.query import Query
+from redis.exceptions import NoScriptError, ResponseError
 
-from ..cinasweeper_logic import Game, GameMode, GameState, Leaderboard, User
+from ..cinasweeper_logic import (Board, BoardSize, Game, GameMode, GameState,
+                                 Leaderboard, Move, User)
 from ..cinasweeper_logic.exceptions import GameNotFoundError
+from ..cinasweeper_logic.minesweeper import Progress
+from .codec import JsonStateCodec
+from .scripts import (MOVE_SCRIPT, MOVE_SCRIPT_SHA, move_script_arguments,
+                      outcome_from_reply)
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     import redis
+    from redis.commands.search.document import Document
+    from redis.commands.search.query import Query
+
+    from ..cinasweeper_logic import Database, MoveOutcome
+    from .codec import StateCodec
+
+# the fields of a game document returned by searches, the id is in the key
+GAME_FIELDS = (
+    "owner",
+    "started",
+    "started_time",
+    "type",
+    "opponent_id",
+    "score",
+    "ended",
+    "owner_name",
+)
+# the fields returned as json by searches, the rest are plain strings
+JSON_GAME_FIELDS = ("started", "started_time", "score", "ended")
+
 
-    from ..cinasweeper_logic import Database
+def _escape_tag(value: str) -> str:
+    """Escapes a value to be matched exactly in a tag query"""
+    return re.sub(r"(\W)", r"\\\1", value)
 
 
 class Serializer:
@@ -44,7 +76,9 @@ class Serializer:
         """
         return Game(
             identifier=json["id"],
-            owner=None if json["owner"] is None else User(json["owner"], self.database),
+            owner=None
+            if json["owner"] is None
+            else User(json["owner"], self.database, json.get("owner_name")),
             started=json["started"],
             started_time=datetime.datetime.fromtimestamp(json["started_time"]),
             game_mode=GameMode[json["type"]],
@@ -72,87 +106,221 @@ class Serializer:
             "opponent_id": game.opponent_id,
             "score": game.score,
             "ended": game.ended,
+            "owner_name": None if game.owner is None else game.owner.name,
         }
 
+    def from_document(self, document: Document) -> Game:
+        """Deserializes a game from a search result with the GAME_FIELDS returned
+
+        Args:
+            document (Document): The search result
+
+        Returns:
+            Game: The deserialized game
+        """
+        obj = {"id": document.id.split(":", 1)[1]}
+        for name in GAME_FIELDS:
+            value = getattr(document, name, None)
+            if value == "null":
+                value = None
+            if value is not None and name in JSON_GAME_FIELDS:
+                value = json.loads(value)
+            obj[name] = value
+        return self.from_json(obj)
+
     def state_from_json(self, obj: dict) -> GameState:
         """Deserializes a game state from json
 
+        States saved with the whole board (before boards were generated from
+        a seed, or with "gameboard" and "game_info" lists before the compact
+        board was introduced) are converted on load.
+
         Args:
             obj (dict): The json to deserialize
 
         Returns:
             GameState: The deserialized game state
         """
-        # Check it with the GameState
-        return GameState(
+        progress = obj.get("progress")
+        state = GameState(
             database=self.database,
-            gameboard=obj.get("gameboard"),
-            mines=obj.get("mines"),
-            game_info=obj.get("game_info"),
-            zeros=obj.get("zeros", []),
+            seed=obj.get("seed"),
+            size=BoardSize(
+                obj.get("height", 14), obj.get("width", 14), obj.get("num_mines", 30)
+            ),
+            progress=None if progress is None else Progress(**progress),
+            version=obj.get("version", 0),
+            moves=obj.get("moves", 0),
         )
+        if obj.get("first_click") is not None:
+            state.first_click = tuple(obj["first_click"])
+            state.marks = zlib.decompress(base64.b64decode(obj["marks"]))
+        elif obj.get("board") is not None:
+            state.board = Board(
+                obj["height"],
+                obj["width"],
+                bytearray(base64.b64decode(obj["board"])),
+            )
+        elif obj.get("gameboard") is not None:
+            state.board = Board.from_legacy(obj["gameboard"], obj["game_info"])
+        return state
 
     def state_to_json(self, state: GameState) -> dict:
         """Serializes a game state to json
 
+        Only the seed, the first click and the marks of the player are stored
+        for generated boards, the whole board is stored for converted ones.
+
         Args:
             state (GameState): The game state to serialize
 
         Returns:
             dict: The serialized game state
         """
-        return {
-            "gameboard": state.gameboard,
-            "mines": state.mines,
-            "game_info": state.game_info,
-            "zeros": state.zeros,
+        obj: dict = {
+            "height": state.size.height,
+            "width": state.size.width,
+            "num_mines": state.size.num_mines,
+            "version": state.version,
+            "moves": state.moves,
+            "seed": state.seed,
         }
+        board = state.board
+        if board is None:
+            obj["board"] = None
+            return obj
+        obj["progress"] = (
+            None
+            if state.progress is None
+            else {
+                "num_mines": state.progress.num_mines,
+                "safe_cells": state.progress.safe_cells,
+                "correct_flags": state.progress.correct_flags,
+                "wrong_flags": state.progress.wrong_flags,
+                "opened_cells": state.progress.opened_cells,
+            }
+        )
+        if state.first_click is None:
+            obj["board"] = base64.b64encode(board.cells).decode("ascii")
+        else:
+            obj["first_click"] = state.first_click
+            obj["marks"] = base64.b64encode(zlib.compress(board.marks())).decode(
+                "ascii"
+            )
+        return obj
 
 
 class RedisDatabase:
     """A database that uses RedisJson and RedisSearch to store the games"""
 
-    def __init__(self, redis_client: redis.Redis) -> None:
+    def __init__(
+        self, redis_client: redis.Redis, state_codec: StateCodec | None = None
+    ) -> None:
         """Initialize the database
 
         Args:
             redis_client (redis.Redis): The redis client to use
+            state_codec (StateCodec | None): The format of the stored states.
+                Defaults to JSON documents.
         """
         self.redis_client = redis_client
         self.serializer = Serializer(self)
+        self.state_codec = state_codec or JsonStateCodec()
 
     def setup_index(self) -> None:
-        """Set up the index for the games"""
+        """Set up the index for the games, replacing the previous one"""
+        from redis.commands.search.field import NumericField, TagField
+        from redis.commands.search.indexDefinition import (IndexDefinition,
+                                                           IndexType)
+
         schema = (
-            TextField("$.owner", as_name="owner"),
+            TagField("$.owner", as_name="owner"),
             TagField("$.type", as_name="type"),
-            NumericField("$.score", as_name="score"),
+            NumericField("$.score", as_name="score", sortable=True),
         )
 
+        try:
+            self.redis_client.ft().dropindex()
+        except ResponseError:  # there is no index yet
+            pass
         self.redis_client.ft().create_index(
             schema,
             definition=IndexDefinition(prefix=["game:"], index_type=IndexType.JSON),
         )
 
-    def get_games(self, owner: User) -> tuple[Game, ...]:
-        """Returns top N games owned by a given User object.
+    def setup_leaderboard(self) -> None:
+        """Fill the leaderboards with the games that ended before they existed"""
+        keys = list(self.redis_client.scan_iter(match="game:*"))
+        for start in range(0, len(keys), 1000):
+            pipeline = self.redis_client.pipeline(transaction=False)
+            database = self.with_client(pipeline)
+            for game in self.redis_client.json().mget(
+                keys[start : start + 1000], Path.root_path()
+            ):
+                if game is not None and game["ended"]:
+                    database.save_score(self.serializer.from_json(game))
+            pipeline.execute()
+        # the lost games were ranked with a score of 0 before
+        for kind in ("games", "users"):
+            for game_mode in (None, *GameMode):
+                self.redis_client.zremrangebyscore(
+                    self.leaderboard_key(kind, game_mode), 0, 0
+                )
+
+    @staticmethod
+    def leaderboard_key(kind: str, game_mode: GameMode | None) -> str:
+        """Returns the key of a leaderboard sorted set
+
+        Args:
+            kind (str): "games" for the scores of the games,
+                "users" for the best score of every user.
+            game_mode (GameMode | None): The game mode, None for all of them.
+
+        Returns:
+            str: The key
+        """
+        return f"leaderboard:{kind}:{'all' if game_mode is None else game_mode.value}"
+
+    def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object,
+        best games first.
 
         Args:
             owner (User): The User object to retrieve games for.
+            offset (int): The number of games to skip. Defaults to 0.
+            limit (int): The maximal number of games to return. Defaults to 10.
 
         Returns:
             tuple[Game]:
-                A tuple containing all Game objects owned by the given User object.
+                A tuple containing the Game objects owned by the given User object.
         """
-        query = Query(owner.identifier).sort_by("score", asc=False)
-        games = (
-            self.redis_client.ft()
-            .search(
-                query,
-            )
-            .docs
+        games = self.redis_client.ft().search(self.games_query(owner, offset, limit))
+        return tuple(self.serializer.from_document(game) for game in games.docs)
+
+    @staticmethod
+    def games_query(owner: User, offset: int, limit: int) -> Query:
+        """Returns the search for a page of the games of a user
+
+        Args:
+            owner (User): The owner of the games.
+            offset (int): The number of games to skip.
+            limit (int): The maximal number of games to return.
+
+        Returns:
+            Query: The search, returning only the GAME_FIELDS
+        """
+        from redis.commands.search.query import Query
+
+        query = (
+            Query(f"@owner:{{{_escape_tag(owner.identifier)}}}")
+            .sort_by("score", asc=False)
+            .paging(offset, limit)
         )
-        return tuple(self.serializer.from_json(json.loads(game.json)) for game in games)
+        for name in GAME_FIELDS:
+            query.return_field(f"$.{name}", as_field=name)
+        return query
 
     def get_game(self, identifier: str) -> Game:
         """Returns a game by its id
@@ -171,25 +339,106 @@ class RedisDatabase:
             raise GameNotFoundError(identifier)
         return self.serializer.from_json(game)
 
-    def get_top_games(self, num_of_games: int) -> tuple[Game, ...]:
-        """Get the global top_n games
+    def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids with one JSON.MGET
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[Game, ...]: The games, in the order of the ids
+        """
+        if not identifiers:
+            return ()
+        games = self.redis_client.json().mget(
+            [f"game:{identifier}" for identifier in identifiers], Path.root_path()
+        )
+        for identifier, game in zip(identifiers, games):
+            if not game:
+                raise GameNotFoundError(identifier)
+        return tuple(self.serializer.from_json(game) for game in games)
+
+    def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Get the top_n games, removing the games that are not found any
+        more from the leaderboard
 
         Args:
             num_of_games (int): The number of games to get
+            game_mode (GameMode | None): The game mode of the games,
+                None for all the game modes.
 
         Returns:
             tuple[Game, ...]: The top_n games
         """
-        # TODO: think about how to make this *not* top-10 but top-n
-        query = Query("*").sort_by("score", asc=False)
-        games = (
-            self.redis_client.ft()
-            .search(
-                query,
+        key = self.leaderboard_key("games", game_mode)
+        games: list[Game] = []
+        while len(games) < num_of_games:
+            identifiers = [
+                identifier.decode()
+                for identifier in self.redis_client.zrevrange(
+                    key, len(games), num_of_games - 1
+                )
+            ]
+            if not identifiers:
+                break
+            records = self.redis_client.json().mget(
+                [f"game:{identifier}" for identifier in identifiers],
+                Path.root_path(),
             )
-            .docs
+            games.extend(self.serializer.from_json(game) for game in records if game)
+            missing = [
+                identifier
+                for identifier, game in zip(identifiers, records)
+                if not game
+            ]
+            if not missing:
+                break
+            # the games after them move up, read them instead
+            self.redis_client.zrem(key, *missing)
+        return tuple(games)
+
+    def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard
+
+        Args:
+            identifier (str): The ID of the game.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the game, starting from 1,
+                or None if the game was not won.
+        """
+        rank = self.redis_client.zrevrank(
+            self.leaderboard_key("games", game_mode), identifier
+        )
+        return None if rank is None else rank + 1
+
+    def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard
+
+        Args:
+            user (User): The user.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the user, starting from 1,
+                or None if the user has not won any game.
+        """
+        rank = self.redis_client.zrevrank(
+            self.leaderboard_key("users", game_mode), user.identifier
         )
-        return tuple(self.serializer.from_json(json.loads(game.json)) for game in games)
+        return None if rank is None else rank + 1
 
     def get_game_state(self, identifier: str) -> GameState:
         """Returns the current state of a given game.
@@ -204,10 +453,75 @@ class RedisDatabase:
             GameState:The GameState object representing
                 the current state of the specified game.
         """
-        state = self.redis_client.json().get(f"gamestate:{identifier}")
+        pipeline = self.redis_client.pipeline(transaction=False)
+        self.read_game_state(pipeline, identifier)
+        return self.game_state_from_replies(identifier, pipeline.execute())
+
+    def get_game_states(self, identifiers: Sequence[str]) -> tuple[GameState, ...]:
+        """Returns the current states of several games with one pipeline.
+
+        Args:
+            identifiers (Sequence[str]): The IDs of the games.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[GameState, ...]: The states, in the order of the IDs.
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        bounds = [0]
+        for identifier in identifiers:
+            self.read_game_state(pipeline, identifier)
+            bounds.append(len(pipeline))
+        replies = pipeline.execute() if identifiers else []
+        return tuple(
+            self.game_state_from_replies(identifier, replies[start:end])
+            for identifier, start, end in zip(identifiers, bounds, bounds[1:])
+        )
+
+    def read_game_state(
+        self, pipeline: redis.client.Pipeline, identifier: str
+    ) -> None:
+        """Queues the commands reading the state of a game on a pipeline.
+
+        Args:
+            pipeline (redis.client.Pipeline): The pipeline to queue the commands on
+            identifier (str): The ID of the game.
+        """
+        self.state_codec.queue_read(pipeline, identifier)
+
+    def game_state_from_replies(self, identifier: str, replies: list) -> GameState:
+        """Builds the state of a game from the replies to read_game_state.
+
+        Args:
+            identifier (str): The ID of the game.
+            replies (list): The replies to the commands of read_game_state.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The state of the game.
+        """
+        state = self.state_codec.decode(self.serializer, replies)
         if state is None:
             raise GameNotFoundError(identifier)
-        return self.serializer.state_from_json(state)
+        return state
+
+    def with_client(self, redis_client: redis.Redis) -> RedisDatabase:
+        """Returns a copy of the database using another client,
+        such as a pipeline to queue the writes on.
+
+        Args:
+            redis_client (redis.Redis): The client to use
+
+        Returns:
+            RedisDatabase: The copy of the database
+        """
+        database = copy.copy(self)
+        database.redis_client = redis_client
+        return database
 
     def save_game_state(self, identifier: str, gamestate: GameState) -> None:
         """Saves a given game state to the database.
@@ -216,12 +530,90 @@ class RedisDatabase:
             identifier (str): The ID of the game to save the state for.
             gamestate (GameState): The GameState object to save.
         """
-        self.redis_client.json().set(
-            f"gamestate:{identifier}",
-            Path.root_path(),
-            self.serializer.state_to_json(gamestate),
+        self.state_codec.write(
+            self.redis_client, self.serializer, identifier, gamestate
         )
 
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Saves the state of a game after a move.
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+        self.save_game_state(identifier, gamestate)
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves the state of a game after moves, once.
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves.
+            gamestate (GameState): The GameState object after the moves.
+        """
+        self.save_game_state(identifier, gamestate)
+
+    @property
+    def scripted_moves(self) -> bool:
+        """Whether the moves are played in redis by MOVE_SCRIPT, which needs
+        the states stored with the cells uncompressed"""
+        return self.state_codec.scriptable
+
+    def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays moves on the stored state of a game with MOVE_SCRIPT.
+
+        Args:
+            identifier (str): The ID of the game.
+            moves (Sequence[Move]): The moves, in order.
+            with_state (bool): Send back the state after the moves with the
+                outcome, in the same round trip. Defaults to False.
+
+        Raises:
+            GameEndedError: The game was already decided.
+            CellOutOfBoardError: A move is outside of the board.
+
+        Returns:
+            MoveOutcome | None: The outcome of the moves, None if the state
+                cannot be changed by the script, such as before the first move.
+        """
+        if not self.scripted_moves:
+            return None
+        arguments = move_script_arguments(identifier, moves, with_state)
+        try:
+            reply = self.redis_client.evalsha(MOVE_SCRIPT_SHA, *arguments)
+        except NoScriptError:
+            reply = self.redis_client.eval(MOVE_SCRIPT, *arguments)
+        outcome = outcome_from_reply(reply)
+        if outcome is not None and with_state:
+            outcome.state = self.game_state_from_replies(identifier, [reply[5]])
+        return outcome
+
+    def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboards of all games and of its mode,
+        and raises the best score of its owner if it is beaten. The lost
+        games, which score nothing, are not ranked.
+
+        Args:
+            game (Game): The ended game.
+        """
+        if not game.score:
+            return
+        for game_mode in (None, game.game_mode):
+            self.redis_client.zadd(
+                self.leaderboard_key("games", game_mode), {game.identifier: game.score}
+            )
+            if game.owner is not None:
+                self.redis_client.zadd(
+                    self.leaderboard_key("users", game_mode),
+                    {game.owner.identifier: game.score},
+                    gt=True,
+                )
+
     def save_game(self, game: Game) -> None:
         """
         Saves the state of a given game.
@@ -236,7 +628,11 @@ class RedisDatabase:
         )
 
     def create_game(
-        self, owner: User | None, gamemode: GameMode, opponent_id: str | None = None
+        self,
+        owner: User | None,
+        gamemode: GameMode,
+        size: BoardSize | None = None,
+        opponent_id: str | None = None,
     ) -> Game:
         """Creates a new game owned by the specified User object,
         or by no one if owner is None.
@@ -245,6 +641,8 @@ class RedisDatabase:
             owner (User | None): The User object to create the game for,
                 or None if the game should have no owner.
             gamemode (GameMode): The GameMode object to create the game for.
+            size (BoardSize | None): The size of the board.
+                Defaults to the classic 14x14 board with 30 mines.
             opponent_id (str): The id of the opponent game. Defaults to None.
                 If None, the function will create an opponent for a 1v1 game.
 
@@ -254,7 +652,7 @@ class RedisDatabase:
         identifier = str(uuid.uuid4())
         if gamemode == GameMode.ONE_V_ONE and opponent_id is None:
             opponent_id = self.create_game(
-                None, GameMode.ONE_V_ONE, opponent_id=identifier
+                None, GameMode.ONE_V_ONE, size, opponent_id=identifier
             ).identifier
         game = Game(
             identifier,
@@ -267,14 +665,18 @@ class RedisDatabase:
             score=0,
         )
         self.save_game(game)
-        state = GameState(self)
+        state = GameState(self, size or BoardSize(), seed=random.getrandbits(32))
         self.save_game_state(identifier, state)
         return game
 
-    def get_leaderboard(self) -> Leaderboard:
-        """Returns the global leaderboard.
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard of a game mode.
+
+        Args:
+            game_mode (GameMode | None): The game mode of the leaderboard.
+                Defaults to None, the global leaderboard.
 
         Returns:
-            Leaderboard: The global leaderboard.
+            Leaderboard: The leaderboard.
         """
-        return Leaderboard(self)
+        return Leaderboard(self, game_mode)
@@ -0,0 +1,188 @@
+"""A redis database storing the moves of a game instead of its whole state"""
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+from ..cinasweeper_logic import GameState, Move
+from ..cinasweeper_logic.exceptions import GameNotFoundError
+from .database import RedisDatabase
+from .scripts import LOG_TAIL_SCRIPT
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import redis
+
+    from ..cinasweeper_logic import Game
+    from .codec import StateCodec
+
+
+class EventSourcedRedisDatabase(RedisDatabase):
+    """A database that appends every move to a per-game log
+
+    The state of a game is a snapshot, which records the number of moves
+    it includes, plus the moves played since the snapshot. A new snapshot
+    is taken every snapshot_every moves and when the game ends, so loading
+    a state replays only a few moves. The number of moves in the last
+    snapshot is kept next to it, so the moves since the snapshot are read
+    with it even if a snapshot was missed. The log itself is never trimmed,
+    it is kept as the history of the game.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        snapshot_every: int = 50,
+        state_codec: StateCodec | None = None,
+    ) -> None:
+        """Initialize the database
+
+        Args:
+            redis_client (redis.Redis): The redis client to use
+            snapshot_every (int): The number of moves between snapshots.
+                Defaults to 50.
+            state_codec (StateCodec | None): The format of the snapshots.
+                Defaults to JSON documents.
+        """
+        super().__init__(redis_client, state_codec)
+        self.snapshot_every = snapshot_every
+
+    @property
+    def scripted_moves(self) -> bool:
+        """The moves are always played in python, to be appended to the log"""
+        return False
+
+    def read_game_state(
+        self, pipeline: redis.client.Pipeline, identifier: str
+    ) -> None:
+        """Queues the commands reading the snapshot of a game and the moves
+        logged since it on a pipeline.
+
+        Args:
+            pipeline (redis.client.Pipeline): The pipeline to queue the commands on
+            identifier (str): The ID of the game.
+        """
+        super().read_game_state(pipeline, identifier)
+        pipeline.eval(
+            LOG_TAIL_SCRIPT,
+            2,
+            f"gamemoves:{identifier}",
+            f"gamesnapshot:{identifier}",
+        )
+
+    def game_state_from_replies(self, identifier: str, replies: list) -> GameState:
+        """Builds the state of a game from its snapshot and the moves since it.
+
+        Args:
+            identifier (str): The ID of the game.
+            replies (list): The replies to the commands of read_game_state.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The snapshot with the moves since it replayed.
+        """
+        state = super().game_state_from_replies(identifier, replies[:-1])
+        length, tail = replies[-1]
+        # the log can be read from before the snapshot, which is written first
+        for move in tail[state.moves - (length - len(tail)) :]:
+            state.play_move(Move(**json.loads(move)))
+        return state
+
+    def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a snapshot of a game, then the number of moves it includes.
+
+        Args:
+            identifier (str): The ID of the game to save the snapshot for.
+            gamestate (GameState): The GameState object to save.
+        """
+        super().save_game_state(identifier, gamestate)
+        self.redis_client.set(f"gamesnapshot:{identifier}", gamestate.moves)
+
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Appends a move to the log of a game, taking a snapshot if it is due.
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+        self.redis_client.rpush(
+            f"gamemoves:{identifier}",
+            json.dumps({"x": move.x, "y": move.y, "action": move.action}),
+        )
+        if gamestate.moves % self.snapshot_every == 0:
+            self.save_game_state(identifier, gamestate)
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Appends moves to the log of a game in one command, taking a
+        snapshot if one fell due during them.
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves, in order.
+            gamestate (GameState): The GameState object after the moves.
+        """
+        if not moves:
+            return
+        self.redis_client.rpush(
+            f"gamemoves:{identifier}",
+            *[
+                json.dumps({"x": move.x, "y": move.y, "action": move.action})
+                for move in moves
+            ],
+        )
+        before = gamestate.moves - len(moves)
+        if gamestate.moves // self.snapshot_every > before // self.snapshot_every:
+            self.save_game_state(identifier, gamestate)
+
+    def save_game(self, game: Game) -> None:
+        """Saves a game, compacting its log into a snapshot once it has ended.
+
+        Args:
+            game (Game): The Game object to save.
+        """
+        super().save_game(game)
+        if game.ended:
+            self.save_game_state(game.identifier, game.state)
+
+    def get_moves(self, identifier: str) -> tuple[Move, ...]:
+        """Returns all the moves played on a game.
+
+        Args:
+            identifier (str): The ID of the game.
+
+        Returns:
+            tuple[Move, ...]: The moves in the order they were played.
+        """
+        return tuple(
+            Move(**json.loads(move))
+            for move in self.redis_client.lrange(f"gamemoves:{identifier}", 0, -1)
+        )
+
+    def replay_game_state(self, identifier: str) -> GameState:
+        """Rebuilds the state of a game from its seed and all of its moves,
+        for auditing the snapshots and the scores.
+
+        Args:
+            identifier (str): The ID of the game.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The replayed state.
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        self.state_codec.queue_read(pipeline, identifier)
+        snapshot = self.state_codec.decode(self.serializer, pipeline.execute())
+        if snapshot is None:
+            raise GameNotFoundError(identifier)
+        state = GameState(self, snapshot.size, seed=snapshot.seed)
+        for move in self.get_moves(identifier):
+            state.play_move(move)
+        return state
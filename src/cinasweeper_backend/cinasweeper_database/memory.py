@@ -0,0 +1,505 @@
+"""A database keeping the games in the memory of the process"""
+from __future__ import annotations
+
+import datetime
+import random
+import threading
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from ..cinasweeper_logic import (BoardSize, Game, GameMode, GameState,
+                                 Leaderboard)
+from ..cinasweeper_logic.exceptions import GameNotFoundError
+from .database import Serializer
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from ..cinasweeper_logic import Move, MoveOutcome, User
+
+
+@dataclass
+class Ranking:
+    """Members sorted by their score, highest first, like a redis sorted set"""
+
+    scores: dict[str, int] = field(default_factory=dict)
+    order: list[tuple[int, str]] = field(default_factory=list)
+
+    def add(self, member: str, score: int, only_higher: bool = False) -> None:
+        """Adds a member or changes its score
+
+        Args:
+            member (str): The member
+            score (int): The score
+            only_higher (bool): Only change the score of a member if it is
+                higher than its current one. Defaults to False.
+        """
+        current = self.scores.get(member)
+        if current is not None:
+            if only_higher and current >= score:
+                return
+            del self.order[bisect_left(self.order, (-current, member))]
+        insort(self.order, (-score, member))
+        self.scores[member] = score
+
+    def top(self, count: int) -> list[str]:
+        """Returns the members with the highest scores
+
+        Args:
+            count (int): The number of members
+
+        Returns:
+            list[str]: The members, highest score first
+        """
+        return [member for _, member in self.order[: max(count, 0)]]
+
+    def rank(self, member: str) -> int | None:
+        """Returns the place of a member, starting from 0
+
+        Args:
+            member (str): The member
+
+        Returns:
+            int | None: The place, None if the member is not ranked
+        """
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect_left(self.order, (-score, member))
+
+
+class InMemoryDatabase:
+    """A database that keeps the games in memory, for tests, benchmarks
+    and deployments on a single node
+
+    The games and states are kept serialized, like in redis, so changes to
+    the loaded objects are only stored when they are saved. The games are
+    indexed by owner and the leaderboards are kept sorted. All the methods
+    hold a lock, so the database can be shared between threads.
+
+    The moves are played on the loaded states and the lock is only held by
+    each method, so concurrent moves on one game are last-writer-wins, like
+    redis without the move script. The async methods never suspend, so the
+    requests on one event loop cannot interleave the load and the save of a
+    move, but threads sharing the database can.
+    """
+
+    scripted_moves = False
+
+    def __init__(self) -> None:
+        """Initialize the database"""
+        self.serializer = Serializer(self)
+        self.lock = threading.RLock()
+        self.games: dict[str, dict] = {}
+        self.states: dict[str, dict] = {}
+        self.owned: defaultdict[str, set[str]] = defaultdict(set)
+        # by "games" or "users" and by game mode, None for all the game modes
+        self.rankings: defaultdict[tuple[str, GameMode | None], Ranking] = (
+            defaultdict(Ranking)
+        )
+
+    def load_game(self, identifier: str) -> Game:
+        """Builds a game from its record, like get_game"""
+        with self.lock:
+            game = self.games.get(identifier)
+        if game is None:
+            raise GameNotFoundError(identifier)
+        return self.serializer.from_json(game)
+
+    def load_game_state(self, identifier: str) -> GameState:
+        """Builds the state of a game from its record, like get_game_state"""
+        with self.lock:
+            state = self.states.get(identifier)
+        if state is None:
+            raise GameNotFoundError(identifier)
+        return self.serializer.state_from_json(state)
+
+    def store_game(self, game: Game) -> None:
+        """Stores the record of a game and indexes it by owner, like save_game"""
+        obj = self.serializer.to_json(game)
+        with self.lock:
+            previous = self.games.get(game.identifier)
+            if previous is not None and previous["owner"] is not None:
+                self.owned[previous["owner"]].discard(game.identifier)
+            if obj["owner"] is not None:
+                self.owned[obj["owner"]].add(game.identifier)
+            self.games[game.identifier] = obj
+
+    def store_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Stores the record of the state of a game, like save_game_state"""
+        state = self.serializer.state_to_json(gamestate)
+        with self.lock:
+            self.states[identifier] = state
+
+    def new_game(
+        self,
+        owner: User | None,
+        gamemode: GameMode,
+        size: BoardSize | None = None,
+        opponent_id: str | None = None,
+    ) -> Game:
+        """Creates and stores a game and its state, like create_game"""
+        identifier = str(uuid.uuid4())
+        if gamemode == GameMode.ONE_V_ONE and opponent_id is None:
+            opponent_id = self.new_game(
+                None, GameMode.ONE_V_ONE, size, opponent_id=identifier
+            ).identifier
+        game = Game(
+            identifier,
+            started=gamemode == GameMode.SINGLEPLAYER,
+            started_time=datetime.datetime.now(),
+            owner=owner,
+            database=self,
+            game_mode=gamemode,
+            opponent_id=opponent_id,
+            score=0,
+        )
+        self.store_game(game)
+        state = GameState(self, size or BoardSize(), seed=random.getrandbits(32))
+        self.store_game_state(identifier, state)
+        return game
+
+    def top_game_ids(self, num_of_games: int, game_mode: GameMode | None) -> list[str]:
+        """Returns the ids of the top games, like get_top_games"""
+        with self.lock:
+            return self.rankings["games", game_mode].top(num_of_games)
+
+    def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object,
+        best games first.
+
+        Args:
+            owner (User): The User object to retrieve games for.
+            offset (int): The number of games to skip. Defaults to 0.
+            limit (int): The maximal number of games to return. Defaults to 10.
+
+        Returns:
+            tuple[Game]:
+                A tuple containing the Game objects owned by the given User object.
+        """
+        with self.lock:
+            games = sorted(
+                (
+                    self.games[identifier]
+                    for identifier in self.owned.get(owner.identifier, ())
+                ),
+                key=lambda game: (-game["score"], game["id"]),
+            )[offset : offset + limit]
+            return tuple(self.serializer.from_json(game) for game in games)
+
+    def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id
+
+        Args:
+            identifier (str): The id of the game
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            Game: The game
+        """
+        return self.load_game(identifier)
+
+    def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[Game, ...]: The games, in the order of the ids
+        """
+        return tuple(self.load_game(identifier) for identifier in identifiers)
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard of a game mode.
+
+        Args:
+            game_mode (GameMode | None): The game mode of the leaderboard.
+                Defaults to None, the global leaderboard.
+
+        Returns:
+            Leaderboard: The leaderboard.
+        """
+        return Leaderboard(self, game_mode)
+
+    def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Get the top_n games
+
+        Args:
+            num_of_games (int): The number of games to get
+            game_mode (GameMode | None): The game mode of the games,
+                None for all the game modes.
+
+        Returns:
+            tuple[Game, ...]: The top_n games
+        """
+        return tuple(
+            self.load_game(identifier)
+            for identifier in self.top_game_ids(num_of_games, game_mode)
+        )
+
+    def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard
+
+        Args:
+            identifier (str): The ID of the game.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the game, starting from 1,
+                or None if the game was not won.
+        """
+        with self.lock:
+            rank = self.rankings["games", game_mode].rank(identifier)
+        return None if rank is None else rank + 1
+
+    def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard
+
+        Args:
+            user (User): The user.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+
+        Returns:
+            int | None: The place of the user, starting from 1,
+                or None if the user has not won any game.
+        """
+        with self.lock:
+            rank = self.rankings["users", game_mode].rank(user.identifier)
+        return None if rank is None else rank + 1
+
+    def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game.
+
+        Args:
+            identifier (str): The ID of the game to retrieve the state for.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The state of the game.
+        """
+        return self.load_game_state(identifier)
+
+    def get_game_states(self, identifiers: Sequence[str]) -> tuple[GameState, ...]:
+        """Returns the current states of several games.
+
+        Args:
+            identifiers (Sequence[str]): The IDs of the games.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[GameState, ...]: The states, in the order of the IDs.
+        """
+        return tuple(self.load_game_state(identifier) for identifier in identifiers)
+
+    def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a given game state to the database.
+
+        Args:
+            identifier (str): The ID of the game to save the state for.
+            gamestate (GameState): The GameState object to save.
+        """
+        self.store_game_state(identifier, gamestate)
+
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Saves the state of a game after a move.
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+        self.store_game_state(identifier, gamestate)
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves the state of a game after moves.
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves.
+            gamestate (GameState): The GameState object after the moves.
+        """
+        self.store_game_state(identifier, gamestate)
+
+    def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """The moves are not applied by the database, always None"""
+        return None
+
+    def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboards of all games and of its mode,
+        and raises the best score of its owner if it is beaten. The lost
+        games, which score nothing, are not ranked.
+
+        Args:
+            game (Game): The ended game.
+        """
+        if not game.score:
+            return
+        with self.lock:
+            for game_mode in (None, game.game_mode):
+                self.rankings["games", game_mode].add(game.identifier, game.score)
+                if game.owner is not None:
+                    self.rankings["users", game_mode].add(
+                        game.owner.identifier, game.score, only_higher=True
+                    )
+
+    def save_game(self, game: Game) -> None:
+        """
+        Saves the state of a given game.
+
+        Args:
+            game (Game): The Game object to save the state for.
+        """
+        self.store_game(game)
+
+    def create_game(
+        self,
+        owner: User | None,
+        gamemode: GameMode,
+        size: BoardSize | None = None,
+        opponent_id: str | None = None,
+    ) -> Game:
+        """Creates a new game owned by the specified User object,
+        or by no one if owner is None.
+
+        Args:
+            owner (User | None): The User object to create the game for,
+                or None if the game should have no owner.
+            gamemode (GameMode): The GameMode object to create the game for.
+            size (BoardSize | None): The size of the board.
+                Defaults to the classic 14x14 board with 30 mines.
+            opponent_id (str): The id of the opponent game. Defaults to None.
+                If None, the function will create an opponent for a 1v1 game.
+
+        Returns:
+            Game: The newly created Game object.
+        """
+        return self.new_game(owner, gamemode, size, opponent_id)
+
+
+class AsyncInMemoryDatabase(InMemoryDatabase):
+    """The in-memory database with the methods of the async database
+
+    Nothing waits, so the methods run on the event loop. There are no round
+    trips to save either, so the database is also its own unit of work.
+    """
+
+    async def __aenter__(self) -> AsyncInMemoryDatabase:
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    def unit_of_work(self) -> AsyncInMemoryDatabase:
+        """Returns the unit of work of a request, the database itself
+
+        Returns:
+            AsyncInMemoryDatabase: The database
+        """
+        return self
+
+    async def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object,
+        best games first."""
+        return super().get_games(owner, offset, limit)
+
+    async def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id"""
+        return self.load_game(identifier)
+
+    async def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids"""
+        return super().get_games_by_ids(identifiers)
+
+    async def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Get the top_n games"""
+        return super().get_top_games(num_of_games, game_mode)
+
+    async def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard"""
+        return super().get_game_rank(identifier, game_mode)
+
+    async def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard"""
+        return super().get_user_rank(user, game_mode)
+
+    async def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game."""
+        return self.load_game_state(identifier)
+
+    async def get_game_states(
+        self, identifiers: Sequence[str]
+    ) -> tuple[GameState, ...]:
+        """Returns the current states of several games."""
+        return super().get_game_states(identifiers)
+
+    async def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a given game state to the database."""
+        self.store_game_state(identifier, gamestate)
+
+    async def save_move(
+        self, identifier: str, move: Move, gamestate: GameState
+    ) -> None:
+        """Saves the state of a game after a move."""
+        self.store_game_state(identifier, gamestate)
+
+    async def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves the state of a game after moves."""
+        self.store_game_state(identifier, gamestate)
+
+    async def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """The moves are not applied by the database, always None"""
+        return None
+
+    async def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboards."""
+        super().save_score(game)
+
+    async def save_game(self, game: Game) -> None:
+        """Saves the state of a given game."""
+        self.store_game(game)
+
+    async def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game owned by the specified User object,
+        or by no one if owner is None."""
+        return self.new_game(owner, gamemode, size)
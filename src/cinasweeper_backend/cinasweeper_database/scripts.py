@@ -0,0 +1,299 @@
+"""The scripts redis runs on the stored states of the games
+
+MOVE_SCRIPT plays moves on a state stored by BinaryStateCodec with the
+cells uncompressed, like minesweeper.main does on a loaded board. It runs
+atomically, so concurrent moves on a game cannot overwrite each other, and
+only the results and the changed cells are sent back.
+
+LOG_TAIL_SCRIPT reads the moves logged since the last snapshot of a game,
+so the event-sourced states are read in one pipeline, however many moves
+the last snapshot is behind.
+"""
+from __future__ import annotations
+
+import hashlib
+from string import Template
+from typing import TYPE_CHECKING
+
+from ..cinasweeper_logic import MoveOutcome
+from ..cinasweeper_logic.board import COUNT, FLAG, MINE, OPEN
+from ..cinasweeper_logic.exceptions import CellOutOfBoardError, GameEndedError
+from .codec import (DECIDED, FIRST_CLICK, FORMAT_VERSION, HAS_CELLS,
+                    HAS_FIRST_CLICK, HAS_PROGRESS, HEADER, PROGRESS)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from ..cinasweeper_logic import Move
+
+# cells changed one by one with SETRANGE, above that the value is rewritten
+SETRANGE_LIMIT = 64
+
+# KEYS[1]: the state; ARGV: "1" to send back the whole state, then the row,
+# the column and the action of every move. The moves are played in order,
+# until one decides the game; a move flagging an open cell is skipped.
+# Returns the status, the result of the last move played, then the version,
+# the cells changed by the moves, the mines once the game is decided, the
+# result of every move played and, if asked for, the state after the moves;
+# the cells are flat lists of row, column and value.
+# The integers are read and written byte by byte, so no library is needed.
+_MOVE_SCRIPT = Template(
+    """
+local function has(value, flag)
+  return math.floor(value / flag) % 2 == 1
+end
+local function u32(data, offset)
+  local a, b, c, d = string.byte(data, offset + 1, offset + 4)
+  return a + b * 256 + c * 65536 + d * 16777216
+end
+local function p32(value)
+  return string.char(value % 256, math.floor(value / 256) % 256,
+    math.floor(value / 65536) % 256, math.floor(value / 16777216) % 256)
+end
+
+local data = redis.call("GET", KEYS[1])
+if not data then
+  return {"missing"}
+end
+local flags = string.byte(data, 2)
+if string.byte(data, 1) ~= $format_version or not has(flags, $has_cells)
+    or not has(flags, $has_progress) then
+  return {"unsupported"}
+end
+if has(flags, $decided) then
+  return {"ended"}
+end
+local height, width = u32(data, 2), u32(data, 6)
+local version, moves = u32(data, 14), u32(data, 18)
+local num_mines, safe_cells = u32(data, $header), u32(data, $header + 4)
+local correct, wrong = u32(data, $header + 8), u32(data, $header + 12)
+local opened = u32(data, $header + 16)
+local base = $header + $progress
+if has(flags, $has_first_click) then
+  base = base + $first_click
+end
+local full = ARGV[1] == "1"
+local count = (#ARGV - 1) / 3
+for move = 0, count - 1 do
+  local row, col = tonumber(ARGV[move * 3 + 2]), tonumber(ARGV[move * 3 + 3])
+  if row < 0 or row >= height or col < 0 or col >= width then
+    return {"outside"}
+  end
+end
+
+local cells = {}
+local function cell(index)
+  return cells[index] or string.byte(data, base + index + 1)
+end
+local changed = {}
+local function expand(current)
+  local r, c = math.floor(current / width), current % width
+  for nr = math.max(r - 1, 0), math.min(r + 1, height - 1) do
+    for nc = math.max(c - 1, 0), math.min(c + 1, width - 1) do
+      local neighbour = nr * width + nc
+      local around = cell(neighbour)
+      if not has(around, $open) and not has(around, $flag) then
+        cells[neighbour] = around + $open
+        changed[#changed + 1] = neighbour
+      end
+    end
+  end
+end
+local results = {}
+local result = nil
+local played = moves
+for move = 0, count - 1 do
+  local row, col = tonumber(ARGV[move * 3 + 2]), tonumber(ARGV[move * 3 + 3])
+  local action = tonumber(ARGV[move * 3 + 4])
+  local first = #changed + 1
+  local check = true
+  local index = row * width + col
+  local value = cell(index)
+  result = nil
+  if action ~= 0 then
+    if has(value, $flag) then
+      check = false
+    elseif has(value, $mine) then
+      result = "Lose"
+      check = false
+      changed[first] = index
+    elseif not has(value, $open) or value % $count_mod == 0 then
+      if has(value, $open) then
+        -- an open 0 opens again the cells unflagged around it
+        expand(index)
+      else
+        cells[index] = value + $open
+        changed[first] = index
+      end
+      local next = first
+      while next <= #changed do
+        local current = changed[next]
+        next = next + 1
+        if cell(current) % $count_mod == 0 then
+          expand(current)
+        end
+      end
+      opened = opened + #changed - first + 1
+    end
+  elseif has(value, $open) then
+    result = "Open"
+    check = false
+  else
+    local change = 1
+    if has(value, $flag) then
+      cells[index] = value - $flag
+      change = -1
+    else
+      cells[index] = value + $flag
+    end
+    changed[first] = index
+    if has(value, $mine) then
+      correct = correct + change
+    else
+      wrong = wrong + change
+    end
+  end
+  if check and ((correct == num_mines and wrong == 0) or opened == safe_cells) then
+    result = "Win"
+  end
+  if result ~= "Open" then
+    if #changed >= first then
+      version = version + 1
+    end
+    moves = moves + 1
+  end
+  results[#results + 1] = result or ""
+  if result == "Win" or result == "Lose" then
+    break
+  end
+end
+if moves == played then
+  return {result or "", version, {}, {}, results, full and data or nil}
+end
+
+local written = {}
+for position in pairs(cells) do
+  written[#written + 1] = position
+end
+if #written > $setrange_limit then
+  table.sort(written)
+  local pieces, from = {}, 1
+  for _, position in ipairs(written) do
+    local at = base + position + 1
+    pieces[#pieces + 1] = string.sub(data, from, at - 1)
+    pieces[#pieces + 1] = string.char(cells[position])
+    from = at + 1
+  end
+  pieces[#pieces + 1] = string.sub(data, from)
+  redis.call("SET", KEYS[1], table.concat(pieces))
+else
+  for _, position in ipairs(written) do
+    redis.call("SETRANGE", KEYS[1], base + position, string.char(cells[position]))
+  end
+end
+redis.call("SETRANGE", KEYS[1], 14, p32(version) .. p32(moves))
+redis.call("SETRANGE", KEYS[1], $header + 8, p32(correct) .. p32(wrong) .. p32(opened))
+
+local changes, mines, seen = {}, {}, {}
+for _, position in ipairs(changed) do
+  if not seen[position] then
+    seen[position] = true
+    changes[#changes + 1] = math.floor(position / width)
+    changes[#changes + 1] = position % width
+    changes[#changes + 1] = cell(position)
+  end
+end
+if result == "Win" or result == "Lose" then
+  redis.call("SETRANGE", KEYS[1], 1, string.char(flags + $decided))
+  for position = 0, height * width - 1 do
+    local around = cell(position)
+    if has(around, $mine) then
+      mines[#mines + 1] = math.floor(position / width)
+      mines[#mines + 1] = position % width
+      mines[#mines + 1] = around
+    end
+  end
+end
+if full then
+  data = redis.call("GET", KEYS[1])
+end
+return {result or "", version, changes, mines, results, full and data or nil}
+"""
+)
+MOVE_SCRIPT = _MOVE_SCRIPT.substitute(
+    format_version=FORMAT_VERSION,
+    has_cells=HAS_CELLS,
+    has_progress=HAS_PROGRESS,
+    has_first_click=HAS_FIRST_CLICK,
+    decided=DECIDED,
+    header=HEADER.size,
+    progress=PROGRESS.size,
+    first_click=FIRST_CLICK.size,
+    open=OPEN,
+    flag=FLAG,
+    mine=MINE,
+    count_mod=COUNT + 1,
+    setrange_limit=SETRANGE_LIMIT,
+)
+MOVE_SCRIPT_SHA = hashlib.sha1(MOVE_SCRIPT.encode()).hexdigest()
+
+# KEYS[1]: the log of the moves, KEYS[2]: the number of moves in the last
+# snapshot, missing before the first one. Returns the length of the log and
+# the moves logged since the snapshot.
+LOG_TAIL_SCRIPT = """
+local first = tonumber(redis.call("GET", KEYS[2]) or "0")
+return {redis.call("LLEN", KEYS[1]), redis.call("LRANGE", KEYS[1], first, -1)}
+"""
+
+
+def move_script_arguments(
+    identifier: str, moves: Sequence[Move], with_state: bool = False
+) -> tuple:
+    """Returns the number of keys, the keys and the arguments of MOVE_SCRIPT
+
+    Args:
+        identifier (str): The ID of the game
+        moves (Sequence[Move]): The moves, in order
+        with_state (bool): Send back the state after the moves.
+            Defaults to False.
+
+    Returns:
+        tuple: The arguments of EVAL and EVALSHA after the script
+    """
+    arguments = [value for move in moves for value in (move.x, move.y, move.action)]
+    return (1, f"state:{identifier}", int(with_state), *arguments)
+
+
+def outcome_from_reply(reply: list) -> MoveOutcome | None:
+    """Builds the outcome of the moves from the reply of MOVE_SCRIPT
+
+    Args:
+        reply (list): The reply
+
+    Raises:
+        GameEndedError: The game was already decided.
+        CellOutOfBoardError: A move is outside of the board, none was played.
+
+    Returns:
+        MoveOutcome | None: The outcome, None if the state is not stored in
+            a form the script can change, such as before the first move.
+    """
+    status = reply[0].decode() if isinstance(reply[0], bytes) else reply[0]
+    if status in ("missing", "unsupported"):
+        return None
+    if status == "ended":
+        raise GameEndedError
+    if status == "outside":
+        raise CellOutOfBoardError
+    changes, mines = reply[2], reply[3]
+    results = [
+        (result.decode() if isinstance(result, bytes) else result) or None
+        for result in reply[4]
+    ]
+    return MoveOutcome(
+        status or None,
+        reply[1],
+        [tuple(changes[start : start + 3]) for start in range(0, len(changes), 3)],
+        [tuple(mines[start : start + 3]) for start in range(0, len(mines), 3)],
+        results,
+    )
@@ -0,0 +1,453 @@
+"""A request-scoped unit of work over the redis database, sync or async"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable
+
+from ..cinasweeper_logic.exceptions import GameNotFoundError
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from redis.client import Pipeline
+
+    from ..cinasweeper_logic import (BoardSize, Game, GameMode, GameState,
+                                     Leaderboard, Move, MoveOutcome, User)
+    from .asyncdatabase import AsyncRedisDatabase
+    from .cache import GameCache
+    from .database import RedisDatabase
+
+
+class UnitOfWork:
+    """Keeps the games and states loaded during a request and their writes
+
+    A game is loaded together with its state in one round trip, and every
+    object is loaded only once. The writes are queued and sent in one
+    pipeline on commit; they are discarded if the request fails. With a
+    cache, the loaded games and the saved games are written to it once they
+    are read or sent. The games are always read from redis, as the claims
+    and the moves are authorized with them: a cached game may have been
+    claimed or ended by another instance since, and reading it with its
+    state costs no other round trip.
+
+    Usage:
+        with UnitOfWork(database) as unit:
+            game = unit.get_game(identifier)
+            game.play_move(move)
+    """
+
+    # the moves are played on the loaded states, to be written on commit
+    scripted_moves = False
+
+    def __init__(
+        self, database: RedisDatabase, cache: GameCache | None = None
+    ) -> None:
+        """Initializes the unit of work
+
+        Args:
+            database (RedisDatabase): The database to load from and write to
+            cache (GameCache | None): The cache of the games. Defaults to None.
+        """
+        self.database = database
+        self.cache = cache
+        self.games: dict[str, Game] = {}
+        self.states: dict[str, GameState] = {}
+        self.writes: list[Callable[[RedisDatabase], None]] = []
+        self.saved: dict[str, Game] = {}
+
+    def __enter__(self) -> UnitOfWork:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+
+    def load(self, *identifiers: str) -> None:
+        """Loads games and their states in one round trip
+
+        Args:
+            *identifiers (str): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+        pipeline = self.database.redis_client.pipeline(transaction=False)
+        bounds = self.queue_load(pipeline, identifiers)
+        self.finish_load(identifiers, bounds, pipeline.execute())
+
+    def queue_load(self, pipeline: Pipeline, identifiers: Sequence[str]) -> list[int]:
+        """Queues the reads of games and their states on a pipeline
+
+        Args:
+            pipeline (Pipeline): The pipeline
+            identifiers (Sequence[str]): The ids of the games
+
+        Returns:
+            list[int]: The bounds of the replies of every game
+        """
+        bounds = [0]
+        for identifier in identifiers:
+            pipeline.json().get(f"game:{identifier}")
+            self.database.read_game_state(pipeline, identifier)
+            bounds.append(len(pipeline))
+        return bounds
+
+    def finish_load(
+        self, identifiers: Sequence[str], bounds: list[int], replies: list
+    ) -> None:
+        """Keeps the games and states read by queue_load
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+            bounds (list[int]): The bounds of the replies of every game
+            replies (list): The replies of the pipeline
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+        for identifier, start, end in zip(identifiers, bounds, bounds[1:]):
+            game, *state = replies[start:end]
+            if game is None:
+                raise GameNotFoundError(identifier)
+            if self.cache is not None:
+                self.cache.put(identifier, game)
+            self.games[identifier] = self.database.serializer.from_json(game)
+            self.games[identifier].database = self
+            self.states[identifier] = self.database.game_state_from_replies(
+                identifier, state
+            )
+            self.states[identifier].database = self
+
+    def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id, loading it with its state if needed
+
+        Args:
+            identifier (str): The id of the game
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            Game: The game
+        """
+        if identifier not in self.games:
+            self.load(identifier)
+        return self.games[identifier]
+
+    def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids, loading the missing ones
+        with their states in one round trip
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[Game, ...]: The games, in the order of the ids
+        """
+        missing = [
+            identifier for identifier in identifiers if identifier not in self.games
+        ]
+        if missing:
+            self.load(*dict.fromkeys(missing))
+        return tuple(self.games[identifier] for identifier in identifiers)
+
+    def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game, loading it if needed
+
+        Args:
+            identifier (str): The ID of the game to retrieve the state for.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+
+        Returns:
+            GameState: The state of the game
+        """
+        if identifier not in self.states:
+            self.load(identifier)
+        return self.states[identifier]
+
+    def get_game_states(self, identifiers: Sequence[str]) -> tuple[GameState, ...]:
+        """Returns the current states of several games, loading the missing
+        ones in one round trip
+
+        Args:
+            identifiers (Sequence[str]): The IDs of the games.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+
+        Returns:
+            tuple[GameState, ...]: The states, in the order of the IDs.
+        """
+        missing = [
+            identifier for identifier in identifiers if identifier not in self.states
+        ]
+        if missing:
+            self.load(*dict.fromkeys(missing))
+        return tuple(self.states[identifier] for identifier in identifiers)
+
+    def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object."""
+        return self.database.get_games(owner, offset, limit)
+
+    def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Returns the top games."""
+        return self.database.get_top_games(num_of_games, game_mode)
+
+    def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard."""
+        return self.database.get_game_rank(identifier, game_mode)
+
+    def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard."""
+        return self.database.get_user_rank(user, game_mode)
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard."""
+        return self.database.get_leaderboard(game_mode)
+
+    def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game right away."""
+        return self.database.create_game(owner, gamemode, size)
+
+    def save_game(self, game: Game) -> None:
+        """Queues saving a game
+
+        Args:
+            game (Game): The Game object to save.
+        """
+        self.games[game.identifier] = game
+        self.saved[game.identifier] = game
+        self.writes.append(lambda database: database.save_game(game))
+
+    def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Queues saving a game state
+
+        Args:
+            identifier (str): The ID of the game to save the state for.
+            gamestate (GameState): The GameState object to save.
+        """
+        self.states[identifier] = gamestate
+        self.writes.append(
+            lambda database: database.save_game_state(identifier, gamestate)
+        )
+
+    def save_score(self, game: Game) -> None:
+        """Queues adding an ended game to the leaderboard
+
+        Args:
+            game (Game): The ended game.
+        """
+        self.writes.append(lambda database: database.save_score(game))
+
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Queues saving a move and the state after it
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+        self.states[identifier] = gamestate
+        self.writes.append(
+            lambda database: database.save_move(identifier, move, gamestate)
+        )
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Queues saving moves and the state after them, as one write
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves, in order.
+            gamestate (GameState): The GameState object after the moves.
+        """
+        self.states[identifier] = gamestate
+        self.writes.append(
+            lambda database: database.save_moves(identifier, moves, gamestate)
+        )
+
+    def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """The moves are not applied by the unit of work, always None"""
+        return None
+
+    def commit(self) -> None:
+        """Sends all the queued writes in one pipeline"""
+        if not self.writes:
+            return
+        pipeline = self.database.redis_client.pipeline(transaction=False)
+        self.queue_writes(pipeline)
+        pipeline.execute()
+        self.writes = []
+        self.cache_saved()
+
+    def cache_saved(self) -> None:
+        """Writes the games saved by the sent writes to the cache"""
+        if self.cache is not None:
+            for identifier, game in self.saved.items():
+                self.cache.put(identifier, self.database.serializer.to_json(game))
+        self.saved = {}
+
+    def queue_writes(self, pipeline: Pipeline) -> None:
+        """Queues all the writes on a pipeline
+
+        Args:
+            pipeline (Pipeline): The pipeline
+        """
+        database = self.database.with_client(pipeline)
+        for write in self.writes:
+            write(database)
+
+
+class AsyncUnitOfWork(UnitOfWork):
+    """A unit of work over an async database, used with async with
+
+    The loads, the saves and the commit are coroutines.
+
+    Usage:
+        async with AsyncUnitOfWork(database) as unit:
+            game = await unit.get_game(identifier)
+            await game.play_move_async(move)
+    """
+
+    database: AsyncRedisDatabase
+
+    async def __aenter__(self) -> AsyncUnitOfWork:
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            await self.commit()
+
+    async def load(self, *identifiers: str) -> None:
+        """Loads games and their states in one round trip
+
+        Args:
+            *identifiers (str): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+        pipeline = self.database.redis_client.pipeline(transaction=False)
+        bounds = self.queue_load(pipeline, identifiers)
+        self.finish_load(identifiers, bounds, await pipeline.execute())
+
+    async def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id, loading it with its state if needed"""
+        if identifier not in self.games:
+            await self.load(identifier)
+        return self.games[identifier]
+
+    async def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids, loading the missing ones
+        with their states in one round trip"""
+        missing = [
+            identifier for identifier in identifiers if identifier not in self.games
+        ]
+        if missing:
+            await self.load(*dict.fromkeys(missing))
+        return tuple(self.games[identifier] for identifier in identifiers)
+
+    async def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game, loading it if needed"""
+        if identifier not in self.states:
+            await self.load(identifier)
+        return self.states[identifier]
+
+    async def get_game_states(
+        self, identifiers: Sequence[str]
+    ) -> tuple[GameState, ...]:
+        """Returns the current states of several games, loading the missing
+        ones in one round trip"""
+        missing = [
+            identifier for identifier in identifiers if identifier not in self.states
+        ]
+        if missing:
+            await self.load(*dict.fromkeys(missing))
+        return tuple(self.states[identifier] for identifier in identifiers)
+
+    async def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object."""
+        return await self.database.get_games(owner, offset, limit)
+
+    async def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Returns the top games."""
+        return await self.database.get_top_games(num_of_games, game_mode)
+
+    async def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard."""
+        return await self.database.get_game_rank(identifier, game_mode)
+
+    async def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard."""
+        return await self.database.get_user_rank(user, game_mode)
+
+    async def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game right away."""
+        return await self.database.create_game(owner, gamemode, size)
+
+    async def save_game(self, game: Game) -> None:
+        """Queues saving a game"""
+        super().save_game(game)
+
+    async def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Queues saving a game state"""
+        super().save_game_state(identifier, gamestate)
+
+    async def save_score(self, game: Game) -> None:
+        """Queues adding an ended game to the leaderboard"""
+        super().save_score(game)
+
+    async def save_move(
+        self, identifier: str, move: Move, gamestate: GameState
+    ) -> None:
+        """Queues saving a move and the state after it"""
+        super().save_move(identifier, move, gamestate)
+
+    async def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Queues saving moves and the state after them, as one write"""
+        super().save_moves(identifier, moves, gamestate)
+
+    async def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """The moves are not applied by the unit of work, always None"""
+        return None
+
+    async def commit(self) -> None:
+        """Sends all the queued writes in one pipeline"""
+        if not self.writes:
+            return
+        pipeline = self.database.redis_client.pipeline(transaction=False)
+        self.queue_writes(pipeline)
+        await pipeline.execute()
+        self.writes = []
+        self.cache_saved()
@@ -1,24 +1,36 @@
 """The logic of the game"""
-from .database import Database
+from .board import Board
+from .boardsize import BoardSize, Difficulty
+from .database import AsyncDatabase, Database
 from .exceptions import (GameEndedError, GameNotStartedError,
-                         PlayingAgainstSelfError, CellAlreadyOpenError)
+                         PlayingAgainstSelfError, CellAlreadyOpenError,
+                         InvalidBoardSizeError, CellOutOfBoardError,
+                         UnknownStateFormatError)
 from .game import Game
 from .gamemode import GameMode
 from .gamestate import GameState
 from .leaderboard import Leaderboard
-from .move import Move
+from .move import Move, MoveOutcome
 from .user import User
 
 __all__ = [
+    "Board",
+    "BoardSize",
+    "Difficulty",
     "Game",
     "GameMode",
     "GameState",
     "Leaderboard",
     "User",
     "Move",
+    "MoveOutcome",
     "Database",
+    "AsyncDatabase",
     "GameEndedError",
     "GameNotStartedError",
     "PlayingAgainstSelfError",
-    "CellAlreadyOpenError"
+    "CellAlreadyOpenError",
+    "InvalidBoardSizeError",
+    "CellOutOfBoardError",
+    "UnknownStateFormatError",
 ]
@@ -0,0 +1,282 @@
+"""A compact, array-backed minesweeper board"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from types import ModuleType
+
+COUNT = 0x0F
+OPEN = 0x10
+FLAG = 0x20
+MINE = 0x40
+
+# Keeps only the OPEN and FLAG bits of a cell when used with bytes.translate
+MARKS_TABLE = bytes(cell & (OPEN | FLAG) for cell in range(256))
+
+# Boards with more cells compute the neighbours on the fly
+# instead of keeping a table in memory; a table of this many cells
+# takes about 1.5 MB, the presets take a fraction of that.
+NEIGHBOUR_TABLE_LIMIT = 2**12
+# Below this number of cells the mine count using the neighbour table
+# is faster than converting the mines for numpy.
+NUMPY_THRESHOLD = NEIGHBOUR_TABLE_LIMIT
+
+
+@lru_cache(maxsize=None)
+def _numpy() -> ModuleType | None:
+    """Imports numpy when it is first needed, to keep it out of cold starts
+
+    Returns:
+        ModuleType | None: numpy, None if it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:  # numpy is an optional speedup
+        return None
+    return numpy
+
+
+def _neighbours_of(height: int, width: int, index: int) -> tuple[int, ...]:
+    """Returns the indexes of the cells around a cell
+
+    Args:
+        height (int): The number of rows
+        width (int): The number of columns
+        index (int): The index of the cell
+
+    Returns:
+        tuple[int, ...]: The indexes of the neighbouring cells
+    """
+    row, col = divmod(index, width)
+    return tuple(
+        y * width + x
+        for y in range(max(row - 1, 0), min(row + 2, height))
+        for x in range(max(col - 1, 0), min(col + 2, width))
+        if y != row or x != col
+    )
+
+
+@lru_cache(maxsize=4)
+def neighbour_table(height: int, width: int) -> tuple[tuple[int, ...], ...]:
+    """Returns the neighbours of every cell of a board of the given size
+
+    The tables of the last few board sizes are cached, which bounds the
+    memory they keep to a few MB per process.
+
+    Args:
+        height (int): The number of rows
+        width (int): The number of columns
+
+    Returns:
+        tuple[tuple[int, ...], ...]: The neighbour indexes for every cell index
+    """
+    return tuple(
+        _neighbours_of(height, width, index) for index in range(height * width)
+    )
+
+
+@dataclass
+class Board:
+    """A minesweeper board stored as one byte per cell.
+
+    The lower four bits of a cell hold the number of mines around it,
+    the upper bits are the OPEN, FLAG and MINE flags.
+    """
+
+    height: int
+    width: int
+    cells: bytearray = field(default_factory=bytearray)
+    _neighbours: tuple[tuple[int, ...], ...] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if not self.cells:
+            self.cells = bytearray(self.height * self.width)
+        if self.height * self.width <= NEIGHBOUR_TABLE_LIMIT:
+            self._neighbours = neighbour_table(self.height, self.width)
+
+    def index(self, row: int, col: int) -> int:
+        """Returns the index of a cell in the cells array
+
+        Args:
+            row (int): The row of the cell
+            col (int): The column of the cell
+
+        Returns:
+            int: The index of the cell
+        """
+        return row * self.width + col
+
+    def inside(self, row: int, col: int) -> bool:
+        """Checks whether the coordinates are inside the board
+
+        Args:
+            row (int): The row of the cell
+            col (int): The column of the cell
+
+        Returns:
+            bool: True if the cell is on the board
+        """
+        return 0 <= row < self.height and 0 <= col < self.width
+
+    def neighbours(self, index: int) -> tuple[int, ...]:
+        """Returns the indexes of the cells around a cell
+
+        Args:
+            index (int): The index of the cell
+
+        Returns:
+            tuple[int, ...]: The indexes of the neighbouring cells
+        """
+        if self._neighbours is not None:
+            return self._neighbours[index]
+        return _neighbours_of(self.height, self.width, index)
+
+    def is_open(self, row: int, col: int) -> bool:
+        """Checks whether a cell is open"""
+        return bool(self.cells[self.index(row, col)] & OPEN)
+
+    def is_flagged(self, row: int, col: int) -> bool:
+        """Checks whether a cell is flagged"""
+        return bool(self.cells[self.index(row, col)] & FLAG)
+
+    def is_mine(self, row: int, col: int) -> bool:
+        """Checks whether a cell is a mine"""
+        return bool(self.cells[self.index(row, col)] & MINE)
+
+    def count(self, row: int, col: int) -> int:
+        """Returns the number of mines around a cell"""
+        return self.cells[self.index(row, col)] & COUNT
+
+    def open(self, row: int, col: int) -> None:
+        """Opens a cell"""
+        self.cells[self.index(row, col)] |= OPEN
+
+    def toggle_flag(self, row: int, col: int) -> None:
+        """Sets or removes a flag on a cell"""
+        self.cells[self.index(row, col)] ^= FLAG
+
+    def place_mines(self, mines: list[tuple[int, int]]) -> None:
+        """Places the mines and counts the mines around every cell
+
+        Uses numpy to count the mines in one step on large boards
+        when it is installed.
+
+        Args:
+            mines (list[tuple[int, int]]): The coordinates of the mines
+        """
+        if mines and len(self.cells) > NUMPY_THRESHOLD and _numpy() is not None:
+            self._place_mines_numpy(mines)
+            return
+        cells = self.cells
+        for row, col in mines:
+            cells[self.index(row, col)] |= MINE
+        for row, col in mines:
+            for neighbour in self.neighbours(self.index(row, col)):
+                if not cells[neighbour] & MINE:
+                    cells[neighbour] += 1
+
+    def _place_mines_numpy(self, mines: list[tuple[int, int]]) -> None:
+        """Places the mines, counting them with a 3x3 kernel over the mine mask
+
+        Args:
+            mines (list[tuple[int, int]]): The coordinates of the mines
+        """
+        numpy = _numpy()
+        rows, cols = numpy.array(mines, dtype=numpy.intp).T
+        mask = numpy.zeros((self.height + 2, self.width + 2), dtype=numpy.uint8)
+        mask[rows + 1, cols + 1] = 1
+        counts = sum(
+            mask[y:y + self.height, x:x + self.width]
+            for y in range(3)
+            for x in range(3)
+        )
+        inner = mask[1:-1, 1:-1]
+        cells = numpy.frombuffer(self.cells, dtype=numpy.uint8).reshape(
+            self.height, self.width
+        )
+        cells |= numpy.where(inner, MINE, counts).astype(numpy.uint8)
+
+    @property
+    def mines(self) -> list[tuple[int, int]]:
+        """The coordinates of all mines on the board"""
+        return [
+            divmod(index, self.width)
+            for index, cell in enumerate(self.cells)
+            if cell & MINE
+        ]
+
+    def marks(self) -> bytes:
+        """Returns the OPEN and FLAG bits of every cell
+
+        Everything else can be rebuilt from the seed of the board.
+
+        Returns:
+            bytes: The marks of the player, one byte per cell
+        """
+        return self.cells.translate(MARKS_TABLE)
+
+    def apply_marks(self, marks: bytes) -> None:
+        """Sets the OPEN and FLAG bits saved with marks()
+
+        Args:
+            marks (bytes): The marks of the player, one byte per cell
+        """
+        size = len(self.cells)
+        self.cells[:] = (
+            int.from_bytes(self.cells, "big") | int.from_bytes(marks, "big")
+        ).to_bytes(size, "big")
+
+    def rows(
+        self,
+        top: int = 0,
+        left: int = 0,
+        height: int | None = None,
+        width: int | None = None,
+    ) -> Iterator[bytearray]:
+        """Iterates over the rows of the board, or of a part of it
+
+        Args:
+            top (int): The first row. Defaults to 0.
+            left (int): The first column. Defaults to 0.
+            height (int | None): The number of rows. Defaults to all of them.
+            width (int | None): The number of columns. Defaults to all of them.
+
+        Yields:
+            bytearray: The cells of a row
+        """
+        bottom = self.height if height is None else min(top + height, self.height)
+        right = self.width if width is None else min(left + width, self.width)
+        for row in range(top, bottom):
+            start = row * self.width
+            yield self.cells[start + left:start + right]
+
+    @classmethod
+    def from_legacy(cls, gameboard: list[list], game_info: list[list]) -> Board:
+        """Builds a board from the old list-of-lists representation
+
+        In the old representation closed cells are their own coordinates,
+        flagged cells are "F" and open cells are the number of mines around,
+        while game_info holds -1 for mines and the counts for other cells.
+
+        Args:
+            gameboard (list[list]): The board visible to the player
+            game_info (list[list]): The board with all the mines and counts
+
+        Returns:
+            Board: The equivalent compact board
+        """
+        board = cls(len(game_info), len(game_info[0]))
+        for row, (visible_row, info_row) in enumerate(zip(gameboard, game_info)):
+            for col, (visible, info) in enumerate(zip(visible_row, info_row)):
+                cell = MINE if info == -1 else info
+                if visible == "F":
+                    cell |= FLAG
+                elif isinstance(visible, int):
+                    cell |= OPEN
+                board.cells[board.index(row, col)] = cell
+        return board
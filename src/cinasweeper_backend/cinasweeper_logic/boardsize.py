@@ -0,0 +1,68 @@
+"""The size of a board and the number of mines on it"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+
+from .exceptions import InvalidBoardSizeError
+
+MAX_SIDE = 1000
+
+
+class Difficulty(Enum):
+    """The board presets"""
+
+    BEGINNER = "beginner"
+    CLASSIC = "classic"
+    INTERMEDIATE = "intermediate"
+    EXPERT = "expert"
+
+
+@dataclass(frozen=True)
+class BoardSize:
+    """The size of a board and the number of mines on it"""
+
+    height: int = 14
+    width: int = 14
+    num_mines: int = 30
+
+    def __post_init__(self) -> None:
+        """Validates the size
+
+        Raises:
+            InvalidBoardSizeError: The board is too small or too large,
+                or there is no room for the mines outside the first click.
+        """
+        if not (3 <= self.height <= MAX_SIDE and 3 <= self.width <= MAX_SIDE):
+            raise InvalidBoardSizeError(
+                f"The sides of the board must be between 3 and {MAX_SIDE}"
+            )
+        if not 1 <= self.num_mines <= self.cells - 9:
+            raise InvalidBoardSizeError(
+                f"The number of mines must be between 1 and {self.cells - 9}"
+            )
+
+    @property
+    def cells(self) -> int:
+        """The number of cells on the board"""
+        return self.height * self.width
+
+    @classmethod
+    def from_difficulty(cls, difficulty: Difficulty) -> BoardSize:
+        """Returns the size of a preset
+
+        Args:
+            difficulty (Difficulty): The preset
+
+        Returns:
+            BoardSize: The size of the board of the preset
+        """
+        return PRESETS[difficulty]
+
+
+PRESETS = {
+    Difficulty.BEGINNER: BoardSize(9, 9, 10),
+    Difficulty.CLASSIC: BoardSize(14, 14, 30),
+    Difficulty.INTERMEDIATE: BoardSize(16, 16, 40),
+    Difficulty.EXPERT: BoardSize(16, 30, 99),
+}
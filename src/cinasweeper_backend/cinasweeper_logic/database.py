@@ -4,22 +4,34 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Protocol
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .boardsize import BoardSize
     from .game import Game
     from .gamemode import GameMode
     from .gamestate import GameState
     from .leaderboard import Leaderboard
+    from .move import Move, MoveOutcome
     from .user import User
 
 
 class Database(Protocol):
     """A protocol representing a database of games."""
 
-    def get_games(self, owner: User) -> tuple[Game, ...]:
+    # whether apply_moves plays the moves in the database
+    scripted_moves: bool
+
+    def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
         """
-        Returns all games owned by a given User object.
+        Returns a page of the games owned by a given User object,
+        best games first.
 
         Args:
             owner (User): The User object to retrieve games for.
+            offset (int): The number of games to skip. Defaults to 0.
+            limit (int): The maximal number of games to return. Defaults to 10.
         """
 
     def get_game(self, identifier: str) -> Game:
@@ -32,14 +44,56 @@ class Database(Protocol):
             GameNotFoundError: The game was not found.
         """
 
-    def get_leaderboard(self) -> Leaderboard:
-        """Returns the leaderboard."""
+    def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids at once
+
+        Args:
+            identifiers (Sequence[str]): The ids of the games
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard.
+
+        Args:
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+        """
 
-    def get_top_games(self, num_of_games: int) -> tuple[Game, ...]:
+    def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
         """Returns the top games.
 
         Args:
             num_of_games (int): The number of games to return.
+            game_mode (GameMode | None): The game mode of the games,
+                None for all the game modes.
+        """
+
+    def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard, starting from 1.
+
+        Args:
+            identifier (str): The ID of the game.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
+        """
+
+    def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard,
+        starting from 1.
+
+        Args:
+            user (User): The user.
+            game_mode (GameMode | None): The game mode of the leaderboard,
+                None for all the game modes.
         """
 
     def get_game_state(self, identifier: str) -> GameState:
@@ -55,6 +109,16 @@ class Database(Protocol):
             identifier (str): The ID of the game to retrieve the state for.
         """
 
+    def get_game_states(self, identifiers: Sequence[str]) -> tuple[GameState, ...]:
+        """Returns the current states of several games at once.
+
+        Args:
+            identifiers (Sequence[str]): The IDs of the games.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+
     def save_game(self, game: Game) -> None:
         """
         Saves the state of a given game.
@@ -71,7 +135,57 @@ class Database(Protocol):
             gamestate (GameState): The GameState object to save.
         """
 
-    def create_game(self, owner: User | None, gamemode: GameMode) -> Game:
+    def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboard, the lost games are not ranked.
+
+        Args:
+            game (Game): The ended game.
+        """
+
+    def save_move(self, identifier: str, move: Move, gamestate: GameState) -> None:
+        """Saves a move played on a game and the state after it.
+
+        Args:
+            identifier (str): The ID of the game the move was played on.
+            move (Move): The move.
+            gamestate (GameState): The GameState object after the move.
+        """
+
+    def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves moves played on a game and the state after the last one.
+
+        Args:
+            identifier (str): The ID of the game the moves were played on.
+            moves (Sequence[Move]): The moves, in order.
+            gamestate (GameState): The GameState object after the moves.
+        """
+
+    def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Applies moves to the stored state of a game atomically,
+        without loading it.
+
+        Args:
+            identifier (str): The ID of the game.
+            moves (Sequence[Move]): The moves, in order.
+            with_state (bool): Send back the state after the moves with the
+                outcome. Defaults to False.
+
+        Raises:
+            GameEndedError: The game was already decided.
+            CellOutOfBoardError: A move is outside of the board.
+
+        Returns:
+            MoveOutcome | None: The outcome of the moves, None if the database
+                cannot apply them; they are then played on the loaded state.
+        """
+
+    def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
         """
         Creates a new game owned by the specified User object,
         or by no one if owner is None.
@@ -80,4 +194,97 @@ class Database(Protocol):
             owner (User | None): The User object to create the game for,
                 or None if the game should have no owner.
             gamemode (GameMode): The GameMode object to create the game for.
+            size (BoardSize | None): The size of the board.
+                Defaults to the classic 14x14 board with 30 mines.
+        """
+
+
+class AsyncDatabase(Protocol):
+    """The async version of Database; the methods are the same, as coroutines,
+    except get_leaderboard."""
+
+    scripted_moves: bool
+
+    async def get_games(
+        self, owner: User, offset: int = 0, limit: int = 10
+    ) -> tuple[Game, ...]:
+        """Returns a page of the games owned by a given User object."""
+
+    async def get_game(self, identifier: str) -> Game:
+        """Returns a game by its id
+
+        Raises:
+            GameNotFoundError: The game was not found.
+        """
+
+    async def get_games_by_ids(self, identifiers: Sequence[str]) -> tuple[Game, ...]:
+        """Returns several games by their ids at once
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
         """
+
+    def get_leaderboard(self, game_mode: GameMode | None = None) -> Leaderboard:
+        """Returns the leaderboard, whose methods return coroutines."""
+
+    async def get_top_games(
+        self, num_of_games: int, game_mode: GameMode | None = None
+    ) -> tuple[Game, ...]:
+        """Returns the top games."""
+
+    async def get_game_rank(
+        self, identifier: str, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of a game on the leaderboard, starting from 1."""
+
+    async def get_user_rank(
+        self, user: User, game_mode: GameMode | None = None
+    ) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard."""
+
+    async def get_game_state(self, identifier: str) -> GameState:
+        """Returns the current state of a given game.
+
+        Raises:
+            GameNotFoundError: The game was not found.
+        """
+
+    async def get_game_states(
+        self, identifiers: Sequence[str]
+    ) -> tuple[GameState, ...]:
+        """Returns the current states of several games at once.
+
+        Raises:
+            GameNotFoundError: One of the games was not found.
+        """
+
+    async def save_game(self, game: Game) -> None:
+        """Saves the state of a given game."""
+
+    async def save_game_state(self, identifier: str, gamestate: GameState) -> None:
+        """Saves a given game state to the database."""
+
+    async def save_score(self, game: Game) -> None:
+        """Adds a won game to the leaderboard, the lost games are not ranked."""
+
+    async def save_move(
+        self, identifier: str, move: Move, gamestate: GameState
+    ) -> None:
+        """Saves a move played on a game and the state after it."""
+
+    async def save_moves(
+        self, identifier: str, moves: Sequence[Move], gamestate: GameState
+    ) -> None:
+        """Saves moves played on a game and the state after the last one."""
+
+    async def apply_moves(
+        self, identifier: str, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Applies moves to the stored state of a game atomically,
+        None if the database cannot."""
+
+    async def create_game(
+        self, owner: User | None, gamemode: GameMode, size: BoardSize | None = None
+    ) -> Game:
+        """Creates a new game owned by the specified User object,
+        or by no one if owner is None."""
@@ -28,3 +28,22 @@ class PlayingAgainstSelfError(Exception):
 class CellAlreadyOpenError(Exception):
     """The ceil is open, you can't flaged it"""
 
+
+class InvalidBoardSizeError(Exception):
+    """The size of the board or the number of mines is not valid"""
+
+
+class CellOutOfBoardError(Exception):
+    """The move is outside of the board"""
+
+
+class UnknownStateFormatError(Exception):
+    """The state of the game was stored in a format that is not known"""
+
+    def __init__(self, format_version: int) -> None:
+        """Initializes the exception
+
+        Args:
+            format_version (int): The version of the format of the state
+        """
+        super().__init__(f"Unknown format {format_version} of a game state")
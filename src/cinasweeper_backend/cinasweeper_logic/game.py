@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
 from .exceptions import (GameEndedError, GameNotStartedError,
@@ -10,11 +10,12 @@ from .exceptions import (GameEndedError, GameNotStartedError,
 
 if TYPE_CHECKING:
     import datetime
+    from collections.abc import Sequence
 
-    from .database import Database
+    from .database import AsyncDatabase, Database
     from .gamemode import GameMode
     from .gamestate import GameState
-    from .move import Move
+    from .move import Move, MoveOutcome
     from .user import User
 
 
@@ -26,20 +27,38 @@ class Game:
     owner: User | None
     started_time: datetime.datetime
     game_mode: GameMode
-    database: Database
+    database: Database | AsyncDatabase
     opponent_id: str | None
     started: bool = False
     score: int = 0
     ended: bool = False
+    _state: GameState | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @property
     def state(self) -> GameState:
         """Returns the current state of the game.
 
+        The state is loaded once and kept, so the state a move
+        was played on can be read again without the database.
+
         Returns:
             GameState: The current state of the game.
         """
-        return self.database.get_game_state(self.identifier)
+        if self._state is None:
+            self._state = self.database.get_game_state(self.identifier)
+        return self._state
+
+    async def get_state_async(self) -> GameState:
+        """Returns the current state of the game from an async database.
+
+        Returns:
+            GameState: The current state of the game.
+        """
+        if self._state is None:
+            self._state = await self.database.get_game_state(self.identifier)
+        return self._state
 
     def play_move(self, move: Move) -> bool:
         """Plays a move on the game board based on the given Move object.
@@ -54,23 +73,269 @@ class Game:
         Returns:
             bool: True if the state of the game has changed, False otherwise.
         """
+        self._check_playable()
+        state = self.state
+        game_changed = self._apply_move(state, move)
+        self.database.save_move(self.identifier, move, state)
+        if game_changed:
+            self.database.save_game(self)
+            self.database.save_score(self)
+        return game_changed
+
+    async def play_move_async(self, move: Move) -> bool:
+        """Plays a move like play_move, on a game from an async database.
+
+        Args:
+            move (Move): The Move object to play.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+
+        Returns:
+            bool: True if the state of the game has changed, False otherwise.
+        """
+        self._check_playable()
+        state = await self.get_state_async()
+        game_changed = self._apply_move(state, move)
+        await self.database.save_move(self.identifier, move, state)
+        if game_changed:
+            await self.database.save_game(self)
+            await self.database.save_score(self)
+        return game_changed
+
+    def play_move_atomic(
+        self, move: Move, with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays a move inside the database, which changes the stored board
+        atomically; the state of the game is not loaded, but it can be sent
+        back with the outcome.
+
+        Args:
+            move (Move): The Move object to play.
+            with_state (bool): Keep the state after the move, sent back by the
+                database. Defaults to False.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellAlreadyOpenError: If the cell is already open.
+
+        Returns:
+            MoveOutcome | None: The outcome of the move, None if the database
+                cannot apply it, the move must then be played with play_move.
+        """
+        self._check_playable()
+        outcome = self.database.apply_moves(self.identifier, [move], with_state)
+        if outcome is None:
+            return None
+        self._state = outcome.state
+        if self._conclude(outcome.result):
+            self.database.save_game(self)
+            self.database.save_score(self)
+        return outcome
+
+    async def play_move_atomic_async(
+        self, move: Move, with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays a move like play_move_atomic, on a game from an async database.
+
+        Args:
+            move (Move): The Move object to play.
+            with_state (bool): Keep the state after the move. Defaults to False.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellAlreadyOpenError: If the cell is already open.
+
+        Returns:
+            MoveOutcome | None: The outcome of the move, None if the database
+                cannot apply it.
+        """
+        self._check_playable()
+        outcome = await self.database.apply_moves(self.identifier, [move], with_state)
+        if outcome is None:
+            return None
+        self._state = outcome.state
+        if self._conclude(outcome.result):
+            await self.database.save_game(self)
+            await self.database.save_score(self)
+        return outcome
+
+    def play_moves(self, moves: Sequence[Move]) -> list[str | None]:
+        """Plays moves in order on the state, loaded once, until one of them
+        ends the game, and saves them together. A move flagging an open cell
+        is skipped, with the result "Open".
+
+        Args:
+            moves (Sequence[Move]): The Move objects to play.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellOutOfBoardError: If a move is outside of the board; no move
+                is played then.
+
+        Returns:
+            list[str | None]: The results of the moves played.
+        """
+        self._check_playable()
+        state = self.state
+        results = state.play_moves(moves)
+        played = [move for move, result in zip(moves, results) if result != "Open"]
+        if played:
+            self.database.save_moves(self.identifier, played, state)
+        if self._conclude_moves(results):
+            self.database.save_game(self)
+            self.database.save_score(self)
+        return results
+
+    async def play_moves_async(self, moves: Sequence[Move]) -> list[str | None]:
+        """Plays moves like play_moves, on a game from an async database.
+
+        Args:
+            moves (Sequence[Move]): The Move objects to play.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellOutOfBoardError: If a move is outside of the board.
+
+        Returns:
+            list[str | None]: The results of the moves played.
+        """
+        self._check_playable()
+        state = await self.get_state_async()
+        results = state.play_moves(moves)
+        played = [move for move, result in zip(moves, results) if result != "Open"]
+        if played:
+            await self.database.save_moves(self.identifier, played, state)
+        if self._conclude_moves(results):
+            await self.database.save_game(self)
+            await self.database.save_score(self)
+        return results
+
+    def play_moves_atomic(
+        self, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays moves like play_moves, inside the database, which changes
+        the stored board atomically; the state of the game is not loaded.
+
+        Args:
+            moves (Sequence[Move]): The Move objects to play.
+            with_state (bool): Keep the state after the moves, sent back by the
+                database. Defaults to False.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellOutOfBoardError: If a move is outside of the board.
+
+        Returns:
+            MoveOutcome | None: The outcome of the moves, None if the database
+                cannot apply them, they must then be played with play_moves.
+        """
+        self._check_playable()
+        outcome = self.database.apply_moves(self.identifier, moves, with_state)
+        if outcome is None:
+            return None
+        self._state = outcome.state
+        if self._conclude_moves(outcome.results):
+            self.database.save_game(self)
+            self.database.save_score(self)
+        return outcome
+
+    async def play_moves_atomic_async(
+        self, moves: Sequence[Move], with_state: bool = False
+    ) -> MoveOutcome | None:
+        """Plays moves like play_moves_atomic, on a game from an async database.
+
+        Args:
+            moves (Sequence[Move]): The Move objects to play.
+            with_state (bool): Keep the state after the moves. Defaults to False.
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+            CellOutOfBoardError: If a move is outside of the board.
+
+        Returns:
+            MoveOutcome | None: The outcome of the moves, None if the database
+                cannot apply them.
+        """
+        self._check_playable()
+        outcome = await self.database.apply_moves(self.identifier, moves, with_state)
+        if outcome is None:
+            return None
+        self._state = outcome.state
+        if self._conclude_moves(outcome.results):
+            await self.database.save_game(self)
+            await self.database.save_score(self)
+        return outcome
+
+    def _check_playable(self) -> None:
+        """Checks that a move can be played on the game
+
+        Raises:
+            GameEndedError: If the game has already ended.
+            GameNotStartedError: If the game has not started yet.
+        """
         if self.ended:
             raise GameEndedError
         if not self.started:
             raise GameNotStartedError
-        state = self.state
-        game_move = state.play_move(move)
+
+    def _apply_move(self, state: GameState, move: Move) -> bool:
+        """Plays a move on the state, and ends the game if it was decided
+
+        Args:
+            state (GameState): The state of the game.
+            move (Move): The Move object to play.
+
+        Raises:
+            CellAlreadyOpenError: If the cell is already open.
+
+        Returns:
+            bool: True if the game has ended, False otherwise.
+        """
+        return self._conclude(state.play_move(move))
+
+    def _conclude_moves(self, results: list[str | None]) -> bool:
+        """Ends the game if it was decided by the last of the moves played
+
+        Args:
+            results (list[str | None]): The results of the moves.
+
+        Returns:
+            bool: True if the game has ended, False otherwise.
+        """
+        last = results[-1] if results else None
+        return last != "Open" and self._conclude(last)
+
+    def _conclude(self, game_move: str | None) -> bool:
+        """Ends the game if it was decided by a move
+
+        Args:
+            game_move (str | None): The result of the move.
+
+        Raises:
+            CellAlreadyOpenError: If the cell is already open.
+
+        Returns:
+            bool: True if the game has ended, False otherwise.
+        """
         if game_move == 'Open':
             raise CellAlreadyOpenError
-        self.database.save_game_state(self.identifier, state)
         if game_move in ["Win", "Lose"]:
             if game_move == "Win":
-                time = int(
-                    (datetime.datetime.now() - self.started_time).total_seconds()
+                # a game won within the first second scores as one won in a second
+                time = max(
+                    int((datetime.datetime.now() - self.started_time).total_seconds()),
+                    1,
                 )
                 self.score = int(((1 / time) * 10000) ** 2)
             self.ended = True
-            self.database.save_game(self)
             return True
         return False
 
@@ -89,15 +354,45 @@ class Game:
             return
 
         opponent_game = self.database.get_game(self.opponent_id)
+        self._start_against(opponent_game, user)
+        self.database.save_game(opponent_game)
+        self.database.save_game(self)
+
+    async def claim_async(self, user: User) -> None:
+        """Claims the game like claim, on a game from an async database.
 
+        Args:
+            user (User): The user to assign the game to.
+
+        Raises:
+            PlayingAgainstSelfError:
+                If the user is already the owner of the opponent game.
+        """
+        if self.owner is not None or self.opponent_id is None:
+            return
+
+        opponent_game = await self.database.get_game(self.opponent_id)
+        self._start_against(opponent_game, user)
+        await self.database.save_game(opponent_game)
+        await self.database.save_game(self)
+
+    def _start_against(self, opponent_game: Game, user: User) -> None:
+        """Gives the game to the user and starts it along with the opponent game
+
+        Args:
+            opponent_game (Game): The opponent game.
+            user (User): The user to assign the game to.
+
+        Raises:
+            PlayingAgainstSelfError:
+                If the user is already the owner of the opponent game.
+        """
         if opponent_game.owner and user.identifier == opponent_game.owner.identifier:
             raise PlayingAgainstSelfError
 
         opponent_game.started = True
         opponent_game.started_time = datetime.datetime.now()
-        self.database.save_game(opponent_game)
 
         self.owner = user
         self.started = True
         self.started_time = datetime.datetime.now()
-        self.database.save_game(self)
@@ -1,25 +1,65 @@
 """The state of a given game"""
 from __future__ import annotations
 
+import random
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
-from .minesweeper import generate_board, get_info_board, main, set_mines
+from .boardsize import BoardSize
+from .exceptions import CellOutOfBoardError
+from .minesweeper import Progress, create_board, main
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .board import Board
     from .database import Database
     from .move import Move
 
 
 @dataclass
 class GameState:
-    """The state of a given game"""
+    """The state of a given game
+
+    The mines are generated from the seed and the first click, so only those
+    and the marks of the player (open and flagged cells) need to be stored.
+    The board is rebuilt from them when it is first needed. The seed can be
+    chosen before the first move, otherwise it is picked on the first move.
+
+    The version is increased by every move that changes the board,
+    the cells changed by the last move are kept in changes.
+    moves counts all the moves played.
+    """
 
     database: Database
-    gameboard: list[list[tuple[int, int] | int]] | None = None
-    mines: list[tuple[int, int]] | None = None
-    game_info: list[list[tuple[int, int] | int]] | None = None
-    zeros: list = field(default_factory=list)
+    size: BoardSize = field(default_factory=BoardSize)
+    seed: int | None = None
+    first_click: tuple[int, int] | None = None
+    marks: bytes | None = None
+    progress: Progress | None = None
+    version: int = 0
+    moves: int = 0
+    changes: list[tuple[int, int]] = field(default_factory=list, compare=False)
+    _board: Board | None = field(default=None, init=False, repr=False)
+
+    @property
+    def board(self) -> Board | None:
+        """The board of the game, None if the first move was not made yet"""
+        if self._board is None and self.first_click is not None:
+            self._board = create_board(
+                self.size.height,
+                self.size.width,
+                self.size.num_mines,
+                self.first_click,
+                self.seed,
+            )
+            if self.marks is not None:
+                self._board.apply_marks(self.marks)
+        return self._board
+
+    @board.setter
+    def board(self, board: Board | None) -> None:
+        self._board = board
 
     def play_move(self, move: Move) -> str:
         """Plays a move on the gameboard
@@ -27,18 +67,59 @@ class GameState:
         Args:
             move (Move): The move to play
 
+        Raises:
+            CellOutOfBoardError: The move is outside of the board.
+
         Returns:
             str: The result of the move
         """
-        if self.gameboard is None:
-            self.gameboard = generate_board(14, 14)
-            self.mines = set_mines(14, 14, 30, (move.x, move.y))
-            self.game_info = get_info_board(14, 14, self.mines)
-        return main(
-            self.gameboard,
-            self.mines,
-            self.game_info,
-            self.zeros,
+        if not (0 <= move.x < self.size.height and 0 <= move.y < self.size.width):
+            raise CellOutOfBoardError
+        if self.board is None:
+            if self.seed is None:
+                self.seed = random.getrandbits(32)
+            self.first_click = (move.x, move.y)
+            self.progress = Progress(
+                self.size.num_mines, self.size.cells - self.size.num_mines
+            )
+        elif self.progress is None:
+            self.progress = Progress.from_board(self.board)
+        self.changes = []
+        result = main(
+            self.board,
+            self.progress,
             move.action,
             (move.x, move.y),
+            self.changes,
         )
+        if self.changes:
+            self.version += 1
+        if result != "Open":
+            self.moves += 1
+        return result
+
+    def play_moves(self, moves: Sequence[Move]) -> list[str | None]:
+        """Plays moves in order, until one of them wins or loses the game;
+        changes then holds the cells changed by all of them
+
+        Args:
+            moves (Sequence[Move]): The moves to play
+
+        Raises:
+            CellOutOfBoardError: A move is outside of the board, none is played.
+
+        Returns:
+            list[str | None]: The results of the moves played
+        """
+        for move in moves:
+            if not (0 <= move.x < self.size.height and 0 <= move.y < self.size.width):
+                raise CellOutOfBoardError
+        changes = []
+        results = []
+        for move in moves:
+            results.append(self.play_move(move))
+            changes.extend(self.changes)
+            if results[-1] in ("Win", "Lose"):
+                break
+        self.changes = changes
+        return results
@@ -7,13 +7,16 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .database import Database
     from .game import Game
+    from .gamemode import GameMode
+    from .user import User
 
 
 @dataclass
 class Leaderboard:
-    """The games leaderboard"""
+    """The games leaderboard, of one game mode or of all of them"""
 
     database: Database
+    game_mode: GameMode | None = None
 
     def top_n(self, num_games: int = 10) -> tuple[Game, ...]:
         """Returns the top n games
@@ -24,4 +27,28 @@ class Leaderboard:
         Returns:
             tuple[Game, ...]: The top n games
         """
-        return self.database.get_top_games(num_games)
+        return self.database.get_top_games(num_games, self.game_mode)
+
+    def game_rank(self, game: Game) -> int | None:
+        """Returns the place of a game on the leaderboard
+
+        Args:
+            game (Game): The game
+
+        Returns:
+            int | None: The place of the game, starting from 1,
+                or None if the game was not won.
+        """
+        return self.database.get_game_rank(game.identifier, self.game_mode)
+
+    def user_rank(self, user: User) -> int | None:
+        """Returns the place of the best game of a user on the leaderboard
+
+        Args:
+            user (User): The user
+
+        Returns:
+            int | None: The place of the user, starting from 1,
+                or None if the user has not won any game.
+        """
+        return self.database.get_user_rank(user, self.game_mode)
@@ -3,9 +3,14 @@ Functions for Cin-Cin Game.
 """
 from __future__ import annotations
 
-from random import randint
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+from random import Random
 from sys import exit
 
+from .board import COUNT, FLAG, MINE, OPEN, Board
+
 
 # generate board with indexes and without mines.
 def generate_board(height: int, width: int) -> list[list]:
@@ -24,24 +29,41 @@ def generate_board(height: int, width: int) -> list[list]:
     # set mines at the board.
 
 
-def set_mines(height: int, width: int, num_mines: int, step: tuple[int, int]) -> list:
+def set_mines(
+    height: int,
+    width: int,
+    num_mines: int,
+    step: tuple[int, int],
+    seed: int | None = None,
+) -> list:
     """
-    Set mines at the field ignoring step`s coordinates
+    Set mines at the field ignoring step`s coordinates and the ceils around it.
+    The same seed and step always give the same mines.
     :param num_mines: number of mines.
     :param step: tuple with coordinates of the first step.
     :param height: number of rows.
     :param width: number of columns.
+    :param seed: seed of the random generator.
     Return list of mines` coordinates.
-    >>> len(set_mines(8, 8, 10))
+    >>> len(set_mines(8, 8, 10, (0, 0)))
     10
+    >>> set_mines(8, 8, 10, (0, 0), 42) == set_mines(8, 8, 10, (0, 0), 42)
+    True
     """
-    mines: set[tuple[int, int]] = set()
-    while len(mines) < num_mines:
-        mines.add((randint(0, height - 1), randint(0, width - 1)))
-        for x in range(step[0] - 1, step[0] + 2):
-            for y in range(step[1] - 1, step[1] + 2):
-                mines.discard((x, y))
-    return list(mines)
+    ignored = sorted(
+        row * width + col
+        for row in range(step[0] - 1, step[0] + 2)
+        for col in range(step[1] - 1, step[1] + 2)
+        if 0 <= row < height and 0 <= col < width
+    )
+    # sample among the allowed ceils and shift the indexes past the ignored ones
+    shifts = [ignored_index - num for num, ignored_index in enumerate(ignored)]
+    return [
+        divmod(index + bisect_right(shifts, index), width)
+        for index in Random(seed).sample(
+            range(height * width - len(ignored)), num_mines
+        )
+    ]
 
     # number of mines around
 
@@ -56,8 +78,9 @@ def get_info_board(height: int, width: int, mines: list) -> list[list]:
     >>> ceil_info_board(3, 3, [(0, 0), (1, 2), (2, 2)])
     [[-1, 2, 1], [1, 3, -1], [0, 2, -1]]
     """
+    mines_set = set(map(tuple, mines))
     board = [
-        [-1 if (ind_row, ind_col) in mines else 0 for ind_col in range(width)]
+        [-1 if (ind_row, ind_col) in mines_set else 0 for ind_col in range(width)]
         for ind_row in range(height)
     ]
     for mine in mines:  # increase value around mines
@@ -70,17 +93,37 @@ def get_info_board(height: int, width: int, mines: list) -> list[list]:
     return board
 
 
-def flag(board: list[list], step: tuple) -> None:
+def create_board(
+    height: int,
+    width: int,
+    num_mines: int,
+    step: tuple[int, int],
+    seed: int | None = None,
+) -> Board:
+    """
+    Create a compact board with mines set around the first step.
+    :param height: number of rows.
+    :param width: number of columns.
+    :param num_mines: number of mines.
+    :param step: tuple with coordinates of the first step.
+    :param seed: seed of the random generator.
+    Return board.
+    >>> len(create_board(8, 8, 10, (0, 0)).mines)
+    10
+    """
+    board = Board(height, width)
+    board.place_mines(set_mines(height, width, num_mines, step, seed))
+    return board
+
+
+def flag(board: Board, step: tuple) -> None:
     """
     Set or delete flag.
     :param board: board to change.
     :param step: ceil coordinates to mark.
     Return None.
     """
-    if board[step[0]][step[1]] == "F":
-        board[step[0]][step[1]] = step
-    else:
-        board[step[0]][step[1]] = "F"
+    board.toggle_flag(step[0], step[1])
 
 
 def end_game(board: list[list], info_board: list[list]):
@@ -102,38 +145,42 @@ def end_game(board: list[list], info_board: list[list]):
     # check ceil (if 0 then...)
 
 
-def check_ceil(board: list[list], info_board: list[list], step: tuple, zeros):
+def check_ceil(board: Board, step: tuple) -> list[tuple[int, int]] | str:
     """
-    Set a value to the ceil.
-    Return None.
+    Open the ceil; if it is 0 open all the ceils around it.
+    The open cells of the board are used as the visited set,
+    so every ceil is checked only once.
+    An open 0 opens again the ceils around it, flagged during a previous
+    opening and unflagged since.
+    :param board: board to change.
+    :param step: ceil coordinates to open.
+    Return "FLAG" or "LOST", otherwise the list of opened ceils.
     """
-    if board[step[0]][step[1]] == "F":
+    if board.is_flagged(step[0], step[1]):
         return "FLAG"
-    if not info_board[step[0]][step[1]]:  # if 0 open 0s around
-        board[step[0]][step[1]] = 0
-        zeros.append(step)  # mark the ceil like already checked
-        for y in range(-1, 2):
-            if step[0] + y >= 0 and step[0] + y < len(
-                board
-            ):  # the ceil is inside the board (Y)
-                for x in range(-1, 2):
-                    if step[1] + x >= 0 and step[1] + x < len(
-                        board[0]
-                    ):  # the ceil is inside the board (X)
-                        #  not a mine                                    we did not check the ceil
-                        if (
-                            info_board[step[0] + y][step[1] + x] >= 0
-                            and (step[0] + y, step[1] + x) not in zeros
-                        ):
-                            check_ceil(
-                                board, info_board, (step[0] + y, step[1] + x), zeros
-                            )  # recurseve check ceils around
-    elif info_board[step[0]][step[1]] == -1:  # it is a mine
+    if board.is_mine(step[0], step[1]):  # it is a mine
         return "LOST"
-    else:  # neither 0 or mine
-        board[step[0]][step[1]] = info_board[step[0]][
-            step[1]
-        ]  # show the value to the user
+    cells = board.cells
+    index = board.index(step[0], step[1])
+    if cells[index] & OPEN:
+        if cells[index] & COUNT:
+            return []
+        opened = []
+        queue = deque([index])
+    else:
+        cells[index] |= OPEN  # show the value to the user
+        opened = [index]
+        queue = deque(opened)
+    while queue:
+        index = queue.popleft()
+        if cells[index] & COUNT:  # open 0s around only
+            continue
+        for neighbour in board.neighbours(index):
+            if not cells[neighbour] & (OPEN | FLAG):  # we did not check the ceil
+                cells[neighbour] |= OPEN
+                opened.append(neighbour)
+                queue.append(neighbour)
+    return [divmod(index, board.width) for index in opened]
 
 
 # CHECK IS IT INSIDE BOARD
@@ -142,27 +189,84 @@ def get_step(x, y) -> tuple:
     return (max(0, x), max(0, y))
 
 
-def check_win(
-    board: list[list], info_board: list[list], mines: list[list[int]]
-) -> bool:
-    flags_on_mines = 0
-    for x, row in enumerate(board):
-        for y, ceil in enumerate(row):  # ceil in mines
-            if ceil == "F":
-                if [x, y] in mines:
-                    flags_on_mines += 1
-                else:
-                    return False
-    return flags_on_mines == len(mines)
+@dataclass
+class Progress:
+    """
+    Running counters of the game, updated on every move,
+    so the end of the game is decided without scanning the board.
+    """
+
+    num_mines: int
+    safe_cells: int
+    correct_flags: int = 0
+    wrong_flags: int = 0
+    opened_cells: int = 0
+
+    @classmethod
+    def from_board(cls, board: Board) -> Progress:
+        """
+        Count the progress of a board with one scan.
+        :param board: board to count.
+        Return progress.
+        """
+        progress = cls(0, 0)
+        for cell in board.cells:
+            if cell & MINE:
+                progress.num_mines += 1
+                progress.correct_flags += bool(cell & FLAG)
+            else:
+                progress.safe_cells += 1
+                progress.wrong_flags += bool(cell & FLAG)
+                progress.opened_cells += bool(cell & OPEN)
+        return progress
 
 
-def main(board, mines, info_board, zeros, action, coord: tuple[int, int]):
+def check_win(progress: Progress) -> bool:
+    """
+    Check whether all the mines are flagged and nothing else is,
+    or every safe ceil is open.
+    """
+    return (
+        progress.correct_flags == progress.num_mines and not progress.wrong_flags
+    ) or progress.opened_cells == progress.safe_cells
+
+
+def main(
+    board: Board,
+    progress: Progress,
+    action,
+    coord: tuple[int, int],
+    changed: list[tuple[int, int]] | None = None,
+):
+    """
+    Play a move.
+    :param board: board to change.
+    :param progress: counters of the game to update.
+    :param action: 1 to open the ceil, 0 to set or delete a flag.
+    :param coord: ceil coordinates.
+    :param changed: list to add the coordinates of the changed ceils to.
+    Return "Lose", "Win", "Open" if the ceil to flag is open, otherwise None.
+    """
+    changed = [] if changed is None else changed
+    step = get_step(coord[0], coord[1])
     if action:
-        if check_ceil(board, info_board, get_step(coord[0], coord[1]), zeros) == "LOST":
+        opened = check_ceil(board, step)
+        if opened == "LOST":
+            changed.append(step)
             return "Lose"
+        if opened == "FLAG":
+            return None
+        progress.opened_cells += len(opened)
+        changed.extend(opened)
     else:
-        if isinstance(board[coord[0]][coord[1]], int):
+        if board.is_open(coord[0], coord[1]):
             return "Open"
-        flag(board, get_step(coord[0], coord[1]))
-        if check_win(board, info_board, mines):
-            return "Win"
+        flag(board, step)
+        changed.append(step)
+        change = 1 if board.is_flagged(step[0], step[1]) else -1
+        if board.is_mine(step[0], step[1]):
+            progress.correct_flags += change
+        else:
+            progress.wrong_flags += change
+    if check_win(progress):
+        return "Win"
@@ -1,7 +1,11 @@
 """A single move in a game of Cinasweeper."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .gamestate import GameState
 
 
 @dataclass
@@ -19,3 +23,32 @@ class Move:
     y: int
     action: int
 
+
+@dataclass
+class MoveOutcome:
+    """Moves applied by the database to the stored board, without loading it.
+
+    Attributes:
+        result (str | None): The result of the last move played, as returned
+            by GameState.play_move: "Win", "Lose", "Open" or None.
+        version (int): The version of the state after the moves.
+        changes (list[tuple[int, int, int]]): The row, the column and the
+            value of the cells changed by the moves.
+        mines (list[tuple[int, int, int]]): The row, the column and the
+            value of every mine, once the game is decided.
+        results (list[str | None]): The result of every move played, in
+            order; the moves after the one deciding the game are not played.
+        state (GameState | None): The state after the moves, if the
+            database was asked to send it back.
+    """
+    result: str | None
+    version: int
+    changes: list[tuple[int, int, int]]
+    mines: list[tuple[int, int, int]] = field(default_factory=list)
+    results: list[str | None] = field(default_factory=list)
+    state: GameState | None = None
+
+    @property
+    def decided(self) -> bool:
+        """Whether the move has won or lost the game"""
+        return self.result in ("Win", "Lose")
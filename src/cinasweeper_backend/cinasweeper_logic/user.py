@@ -1,7 +1,7 @@
 """A user, owning cinasweeper games."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -11,10 +11,15 @@ if TYPE_CHECKING:
 
 @dataclass
 class User:
-    """A user, owning cinasweeper games."""
+    """A user, owning cinasweeper games.
+
+    The display name is only known when it is stored with the games,
+    it is not compared.
+    """
 
     identifier: str
     database: Database
+    name: str | None = field(default=None, compare=False)
 
     @property
     def games(self) -> tuple[Game, ...]:
@@ -0,0 +1,86 @@
+"""The engine of the first version of minesweeper.py, on lists of lists
+
+Kept as the reference the compact boards are compared with. A closed cell
+holds its own coordinates, a flagged one "F" and an open one the number of
+mines around it; the info board holds -1 for the mines.
+"""
+from __future__ import annotations
+
+
+def generate_board(height: int, width: int) -> list[list]:
+    return [[(row, col) for col in range(width)] for row in range(height)]
+
+
+def get_info_board(height: int, width: int, mines: list) -> list[list]:
+    board = [
+        [-1 if (ind_row, ind_col) in mines else 0 for ind_col in range(width)]
+        for ind_row in range(height)
+    ]
+    for mine in mines:  # increase value around mines
+        for y in range(-1, 2):
+            if mine[0] + y >= 0 and mine[0] + y < len(board):
+                for x in range(-1, 2):
+                    if mine[1] + x >= 0 and mine[1] + x < len(board[0]):
+                        if board[mine[0] + y][mine[1] + x] >= 0:
+                            board[mine[0] + y][mine[1] + x] += 1
+    return board
+
+
+def flag(board: list[list], step: tuple) -> None:
+    if board[step[0]][step[1]] == "F":
+        board[step[0]][step[1]] = step
+    else:
+        board[step[0]][step[1]] = "F"
+
+
+def check_ceil(board: list[list], info_board: list[list], step: tuple, zeros):
+    if board[step[0]][step[1]] == "F":
+        return "FLAG"
+    if not info_board[step[0]][step[1]]:  # if 0 open 0s around
+        board[step[0]][step[1]] = 0
+        zeros.append(step)  # mark the ceil like already checked
+        for y in range(-1, 2):
+            if step[0] + y >= 0 and step[0] + y < len(board):
+                for x in range(-1, 2):
+                    if step[1] + x >= 0 and step[1] + x < len(board[0]):
+                        if (
+                            info_board[step[0] + y][step[1] + x] >= 0
+                            and (step[0] + y, step[1] + x) not in zeros
+                        ):
+                            check_ceil(
+                                board, info_board, (step[0] + y, step[1] + x), zeros
+                            )
+    elif info_board[step[0]][step[1]] == -1:  # it is a mine
+        return "LOST"
+    else:  # neither 0 or mine
+        board[step[0]][step[1]] = info_board[step[0]][step[1]]
+
+
+def get_step(x, y) -> tuple:
+    return (max(0, x), max(0, y))
+
+
+def check_win(
+    board: list[list], info_board: list[list], mines: list[list[int]]
+) -> bool:
+    flags_on_mines = 0
+    for x, row in enumerate(board):
+        for y, ceil in enumerate(row):  # ceil in mines
+            if ceil == "F":
+                if [x, y] in mines:
+                    flags_on_mines += 1
+                else:
+                    return False
+    return flags_on_mines == len(mines)
+
+
+def main(board, mines, info_board, zeros, action, coord: tuple[int, int]):
+    if action:
+        if check_ceil(board, info_board, get_step(coord[0], coord[1]), zeros) == "LOST":
+            return "Lose"
+    else:
+        if isinstance(board[coord[0]][coord[1]], int):
+            return "Open"
+        flag(board, get_step(coord[0], coord[1]))
+        if check_win(board, info_board, mines):
+            return "Win"
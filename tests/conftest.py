@@ -0,0 +1,8 @@
+"""The fixtures shared by the tests"""
+import sys
+from pathlib import Path
+
+# the package is imported from the source tree, like in the benchmarks, and
+# the baseline engine from the tests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(1, str(Path(__file__).resolve().parent))
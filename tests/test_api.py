@@ -0,0 +1,277 @@
+"""Tests of the API against fakeredis and the in-memory database, with a stub
+instead of Firebase"""
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from fastapi.websockets import WebSocketDisconnect
+
+from cinasweeper_backend.cinasweeper_api import api
+from cinasweeper_backend.cinasweeper_api.events import EventBus
+from cinasweeper_backend.cinasweeper_api.leaderboard import LeaderboardSnapshots
+from cinasweeper_backend.cinasweeper_database import (AsyncDatabase,
+                                                      AsyncInMemoryDatabase,
+                                                      BinaryStateCodec,
+                                                      Database,
+                                                      EventSourcedDatabase)
+
+
+class StubAuthManager:
+    """Accepts every token as the id of the user"""
+
+    def verify(self, token):
+        return {"user_id": token, "email": f"{token}@example.com"} if token else None
+
+    def name_from_token(self, token):
+        return None
+
+    def display_names(self, user_ids):
+        return {user_id: user_id.title() for user_id in user_ids}
+
+
+def memory_storage():
+    database = AsyncInMemoryDatabase()
+    return database, database.load_game_state
+
+
+def redis_storage(database_class, codec=None):
+    server = fakeredis.FakeServer()
+    database = database_class(fakeredis.FakeRedis(server=server), state_codec=codec)
+    async_database = AsyncDatabase(
+        database, fakeredis.aioredis.FakeRedis(server=server)
+    )
+    return async_database, database.get_game_state
+
+
+def script_storage():
+    pytest.importorskip("lupa")
+    return redis_storage(Database, BinaryStateCodec(raw_cells=True))
+
+
+STORAGES = {
+    "json": lambda: redis_storage(Database),
+    "script": script_storage,
+    "events": lambda: redis_storage(EventSourcedDatabase, BinaryStateCodec()),
+    "memory": memory_storage,
+}
+
+
+def provide(value):
+    """A dependency returning the value, on the event loop"""
+
+    async def dependency():
+        return value
+
+    return dependency
+
+
+@pytest.fixture(params=STORAGES)
+def storage(request):
+    database, get_state = STORAGES[request.param]()
+    overrides = {
+        api.database_dependency: database,
+        api.manager_dependency: StubAuthManager(),
+        api.leaderboards_dependency: LeaderboardSnapshots(),
+        api.events_dependency: EventBus(),
+    }
+    for dependency, value in overrides.items():
+        api.app.dependency_overrides[dependency] = provide(value)
+    with TestClient(api.app) as client:
+        yield SimpleNamespace(client=client, get_state=get_state)
+    api.app.dependency_overrides.clear()
+
+
+def auth(user):
+    return {"Authorization": f"Bearer {user}"}
+
+
+def create_game(storage, user="alice", **body):
+    body = {"gamemode": "singleplayer", **body}
+    response = storage.client.post("/games", json=body, headers=auth(user))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def move(storage, game_id, x, y, action, user="alice", query=""):
+    return storage.client.post(
+        f"/games/{game_id}/moves?{query}",
+        json={"x": x, "y": y, "action": action},
+        headers=auth(user),
+    )
+
+
+def start(storage, **body):
+    """Creates a 9x9 game and opens its center"""
+    game = create_game(storage, height=9, width=9, mines=10, **body)
+    assert move(storage, game["identifier"], 4, 4, 1).status_code == 200
+    return game["identifier"], storage.get_state(game["identifier"]).board
+
+
+def test_game_is_created(storage):
+    game = create_game(storage, difficulty="beginner")
+
+    assert game["owner"] == "Alice"
+    assert not game["ended"] and game["started"]
+    assert storage.client.get(f"/games/{game['identifier']}").json() == game
+    state = storage.client.get(f"/games/{game['identifier']}/state").json()
+    assert state["board"] == [[None] * 9] * 9
+
+
+# the games of a user are searched with RediSearch, which fakeredis lacks
+@pytest.mark.parametrize("storage", ["memory"], indirect=True)
+def test_own_games_are_listed(storage):
+    games = [create_game(storage)["identifier"] for _ in range(3)]
+    create_game(storage, user="bob")
+
+    listed = storage.client.get("/games?limit=2", headers=auth("alice")).json()
+    rest = storage.client.get("/games?offset=2", headers=auth("alice")).json()
+
+    assert sorted(game["identifier"] for game in listed + rest) == sorted(games)
+
+
+def test_invalid_size_is_refused(storage):
+    response = storage.client.post(
+        "/games",
+        json={"gamemode": "singleplayer", "height": 3, "width": 3, "mines": 9},
+        headers=auth("alice"),
+    )
+
+    assert response.status_code == 400
+
+
+def test_requests_need_a_token(storage):
+    assert storage.client.get("/games").status_code in (401, 403)
+
+
+def test_move_sends_the_board(storage):
+    identifier, board = start(storage)
+    row, col = board.mines[0]
+
+    response = move(storage, identifier, row, col, 0)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["game_changed"] is False
+    assert result["state"]["board"][row][col] == -2
+    assert result["state"]["board"][4][4] == 0
+    viewport = move(storage, identifier, row, col, 0, query="rows=2&cols=3").json()
+    assert [len(cells) for cells in viewport["state"]["board"]] == [3, 3]
+
+
+def test_move_sends_the_changed_cells(storage):
+    identifier, board = start(storage)
+    row, col = board.mines[0]
+
+    delta = move(storage, identifier, row, col, 0, query="delta=true").json()
+
+    assert delta["cells"] == [{"x": row, "y": col, "value": -2}]
+    assert delta["game_changed"] is False
+    assert delta["version"] == storage.get_state(identifier).version
+
+
+def test_lost_game_shows_the_mines(storage):
+    identifier, board = start(storage)
+    row, col = board.mines[0]
+
+    delta = move(storage, identifier, row, col, 1, query="delta=true").json()
+
+    assert delta["game_changed"] is True
+    mines = {(cell["x"], cell["y"]) for cell in delta["cells"] if cell["value"] == -1}
+    assert mines == set(board.mines)
+    assert move(storage, identifier, 0, 0, 1).status_code == 409
+    game = storage.client.get(f"/games/{identifier}").json()
+    assert game["ended"] and game["score"] == 0
+    rank = storage.client.get(f"/games/{identifier}/rank").json()
+    assert rank == {"rank": None}
+
+
+def test_game_won_at_once_is_ranked(storage):
+    # the first click cannot be next to a mine, the 7 other cells are mines
+    game = create_game(storage, height=4, width=4, mines=7)
+    identifier = game["identifier"]
+
+    result = move(storage, identifier, 1, 1, 1).json()
+
+    assert result["game_changed"] is True
+    game = storage.client.get(f"/games/{identifier}").json()
+    assert game["ended"] and game["score"] > 0
+    assert storage.client.get(f"/games/{identifier}/rank").json() == {"rank": 1}
+    assert storage.client.get(
+        "/leaders_board/rank", headers=auth("alice")
+    ).json() == {"rank": 1}
+    leaders = storage.client.get("/leaders_board")
+    assert [game["identifier"] for game in leaders.json()] == [identifier]
+    cached = storage.client.get(
+        "/leaders_board", headers={"If-None-Match": leaders.headers["ETag"]}
+    )
+    assert cached.status_code == 304
+
+
+def test_moves_are_played_in_a_batch(storage):
+    identifier, board = start(storage)
+    flags = [{"x": row, "y": col, "action": 0} for row, col in board.mines[:3]]
+    opened = {"x": 4, "y": 4, "action": 0}
+
+    response = storage.client.post(
+        f"/games/{identifier}/moves/batch?delta=true",
+        json=flags + [opened],
+        headers=auth("alice"),
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["results"] == [None, None, None, "Open"]
+    assert sorted((cell["x"], cell["y"]) for cell in result["cells"]) == sorted(
+        board.mines[:3]
+    )
+    state = storage.get_state(identifier)
+    assert all(state.board.is_flagged(row, col) for row, col in board.mines[:3])
+
+
+def test_batch_is_limited(storage):
+    identifier, _ = start(storage)
+    url = f"/games/{identifier}/moves/batch"
+    flag = {"x": 0, "y": 0, "action": 0}
+
+    for moves in ([], [flag] * (api.MAX_BATCH_MOVES + 1)):
+        response = storage.client.post(url, json=moves, headers=auth("alice"))
+        assert response.status_code == 422
+
+
+def test_moves_need_the_owner(storage):
+    identifier, _ = start(storage)
+
+    assert move(storage, identifier, 0, 0, 0, user="bob").status_code == 403
+    assert move(storage, identifier, 9, 0, 0).status_code == 400
+
+
+def test_claimed_game_is_followed_live(storage):
+    game = create_game(storage, gamemode="1v1", height=9, width=9, mines=10)
+    identifier, opponent = game["identifier"], game["opponent_id"]
+    client = storage.client
+
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(f"/games/{identifier}/live?token=bob"):
+            pass
+    assert refused.value.code == 1008
+    assert move(storage, identifier, 4, 4, 1).status_code == 409
+    with client.websocket_connect(f"/games/{identifier}/live?token=alice") as live:
+        games = live.receive_json()
+        assert games["type"] == "games"
+        assert {game["identifier"] for game in games["games"]} == {
+            identifier,
+            opponent,
+        }
+
+        claimed = client.put(f"/games/{opponent}", headers=auth("bob")).json()
+        assert claimed["owner"] == "Bob"
+        assert live.receive_json() == {"type": "start", "game": claimed}
+
+        live.send_json({"x": 4, "y": 4, "action": 1})
+        messages = [live.receive_json(), live.receive_json()]
+        live.send_text("not a move")
+        assert live.receive_json()["status"] == 422
+
+    assert {message["type"] for message in messages} == {"result", "move"}
+    assert storage.get_state(identifier).board.is_open(4, 4)
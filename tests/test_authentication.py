@@ -0,0 +1,280 @@
+"""Tests of the authentication of the users"""
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("cryptography")
+
+import firebase_admin  # noqa: E402
+import google.auth.transport.requests  # noqa: E402
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from firebase_admin import auth, credentials, exceptions  # noqa: E402
+from google.auth import crypt, jwt  # noqa: E402
+
+from cinasweeper_backend.cinasweeper_api.authentication import (  # noqa: E402
+    CERTIFICATE_REFRESH_AT, CERTIFICATE_RETRY, CERTIFICATE_URL, GET_USERS_LIMIT,
+    TOKEN_ISSUER, AuthManager, TokenVerificationError)
+
+PROJECT = "cinasweeper"
+
+
+class Response:
+    def __init__(self, status, cache_control, certificates=None):
+        self.status = status
+        self.headers = {"Cache-Control": cache_control}
+        self.data = json.dumps(certificates or {}).encode()
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def manager(monkeypatch, clock):
+    monkeypatch.setattr(credentials, "Certificate", lambda path: None)
+    monkeypatch.setattr(
+        firebase_admin,
+        "initialize_app",
+        lambda cred: SimpleNamespace(project_id=PROJECT),
+    )
+    return AuthManager(clock=clock)
+
+
+class Fetches(list):
+    """The requests of the certificates, answered with response"""
+
+    response = None
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    fetches = Fetches()
+
+    class Request:
+        def __call__(self, url, headers=None, timeout=None):
+            fetches.append((url, headers))
+            return fetches.response
+
+    monkeypatch.setattr(google.auth.transport.requests, "Request", Request)
+    return fetches
+
+
+class Key:
+    """A signing key of Google, with its certificate"""
+
+    def __init__(self, key_id):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.signer = crypt.RSASigner.from_string(
+            private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ),
+            key_id,
+        )
+        self.certificates = {
+            key_id: private_key.public_key()
+            .public_bytes(
+                serialization.Encoding.PEM,
+                serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+            .decode()
+        }
+
+    def sign(self, **claims):
+        """Returns an ID token of firebase for jane, valid for an hour"""
+        now = int(time.time())
+        payload = {
+            "iss": TOKEN_ISSUER + PROJECT,
+            "aud": PROJECT,
+            "sub": "jane",
+            "user_id": "jane",
+            "email": "jane.doe.pn@ucu.edu.ua",
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        return jwt.encode(self.signer, payload).decode()
+
+
+@pytest.fixture(scope="module")
+def key():
+    return Key("current")
+
+
+@pytest.fixture
+def published(fetched, key):
+    """The certificates of the key are published for 20000 seconds"""
+    fetched.response = Response(
+        200, "public, max-age=20000, must-revalidate", key.certificates
+    )
+    return fetched
+
+
+def test_certificates_are_refreshed_before_they_expire(manager, published, key):
+    manager.refresh_certificates()
+
+    assert published == [(CERTIFICATE_URL, {"Cache-Control": "no-cache"})]
+    assert manager.certificates == key.certificates
+    assert manager.certificates_due == 1000.0 + 20000 * CERTIFICATE_REFRESH_AT
+    assert manager.stats()["refresh_failures"] == 0
+
+
+def test_failed_refresh_is_retried(manager, fetched):
+    fetched.response = Response(503, "no-store")
+
+    manager.refresh_certificates()
+
+    assert manager.certificates == {}
+    assert manager.certificates_due == 1000.0 + CERTIFICATE_RETRY
+    assert manager.stats()["refresh_failures"] == 1
+
+
+def test_tokens_are_verified_against_the_fetched_certificates(
+    manager, published, key
+):
+    user = manager.verify(key.sign())
+
+    assert user["uid"] == user["user_id"] == "jane"
+    assert manager.verify(key.sign(sub="john", user_id="john"))["uid"] == "john"
+    # the certificates are only fetched before the first verification
+    assert len(published) == 1
+
+
+def test_certificates_are_refreshed_in_the_background(
+    manager, published, key, clock
+):
+    manager.verify(key.sign())
+    next_key = Key("next")
+    published.response = Response(200, "max-age=20000", next_key.certificates)
+    clock.now = manager.certificates_due
+
+    # verified against the current certificates while they are refreshed
+    assert manager.verify(key.sign(sub="john")) is not None
+    refreshing = manager.refreshing
+    if refreshing is not None:
+        refreshing.join()
+
+    assert len(published) == 2
+    assert manager.verify(next_key.sign()) is not None
+
+
+def test_tokens_are_cached_until_they_expire(manager, published, key, clock):
+    token = key.sign()
+
+    assert manager.verify(token) == manager.verify(token)
+    manager.certificates_due = float("inf")
+    clock.now = jwt.decode(token, verify=False)["exp"]
+    manager.verify(token)
+
+    assert manager.stats()["hits"] == 1
+    assert manager.verifications == 2
+
+
+def test_invalid_tokens_are_rejected(manager, published, key):
+    tokens = [
+        "forged",
+        Key("current").sign(),
+        key.sign(aud="another-project"),
+        key.sign(iss=TOKEN_ISSUER + "another-project"),
+        key.sign(sub=""),
+        key.sign(exp=int(time.time()) - 600),
+        Key("unknown").sign(),
+    ]
+
+    assert [manager.verify(token) for token in tokens] == [None] * len(tokens)
+    assert manager.stats()["rejected"] == len(tokens)
+
+
+def test_emails_are_restricted(manager, published, key):
+    manager.restrict_users = True
+
+    assert manager.verify(key.sign()) is not None
+    assert manager.verify(key.sign(sub="john", email="john@example.com")) is None
+
+
+def test_unfetched_certificates_fail_the_verification(
+    manager, fetched, key, clock
+):
+    fetched.response = Response(503, "no-store")
+
+    with pytest.raises(TokenVerificationError):
+        manager.verify(key.sign())
+    # the fetch is not retried by every request
+    with pytest.raises(TokenVerificationError):
+        manager.verify(key.sign())
+    assert len(fetched) == 1
+
+    fetched.response = Response(200, "max-age=20000", key.certificates)
+    clock.now += CERTIFICATE_RETRY
+
+    assert manager.verify(key.sign()) is not None
+    assert manager.stats()["rejected"] == 0
+
+
+class Lookups(list):
+    """The batches of users looked up, failing while unavailable"""
+
+    unavailable = False
+
+
+@pytest.fixture
+def looked_up(monkeypatch):
+    """The users are named after their ids but "nameless", and "missing"
+    is not found"""
+    batches = Lookups()
+
+    def get_users(identifiers, app):
+        batch = [identifier.uid for identifier in identifiers]
+        batches.append(batch)
+        if batches.unavailable:
+            raise exceptions.UnavailableError("unavailable")
+        return SimpleNamespace(
+            users=[
+                SimpleNamespace(
+                    uid=uid, display_name=None if uid == "nameless" else uid.title()
+                )
+                for uid in batch
+                if uid != "missing"
+            ]
+        )
+
+    monkeypatch.setattr(auth, "get_users", get_users)
+    return batches
+
+
+def test_names_are_looked_up_in_batches(manager, looked_up):
+    users = [f"user{number}" for number in range(GET_USERS_LIMIT + 1)]
+
+    names = manager.display_names(users + ["nameless", "missing", "user0"])
+
+    assert [len(batch) for batch in looked_up] == [GET_USERS_LIMIT, 3]
+    assert names["user0"] == "User0"
+    assert names["nameless"] is None and names["missing"] is None
+    assert manager.display_names(["user0", "missing"]) == {
+        "user0": "User0",
+        "missing": None,
+    }
+    assert len(looked_up) == 2
+
+
+def test_failed_lookup_is_not_cached(manager, looked_up):
+    looked_up.unavailable = True
+
+    assert manager.display_names(["user0"]) == {"user0": None}
+    looked_up.unavailable = False
+
+    assert manager.display_names(["user0"]) == {"user0": "User0"}
+    assert manager.stats()["name_failures"] == 1
@@ -0,0 +1,88 @@
+"""Tests of the cache of the games"""
+import asyncio
+import os
+import uuid
+
+import fakeredis
+import pytest
+import redis.asyncio
+
+from cinasweeper_backend.cinasweeper_database import (AsyncDatabase, Database,
+                                                      GameCache)
+from cinasweeper_backend.cinasweeper_logic import GameMode, User
+
+
+def test_changes_are_authorized_with_the_stored_game():
+    server = fakeredis.FakeServer()
+    other_instance = Database(fakeredis.FakeRedis(server=server))
+    database = AsyncDatabase(
+        Database(fakeredis.FakeRedis(server=server)),
+        fakeredis.aioredis.FakeRedis(server=server),
+        GameCache(),
+    )
+    identifier = other_instance.create_game(None, GameMode.SINGLEPLAYER).identifier
+
+    async def claim_elsewhere():
+        assert (await database.get_game(identifier)).owner is None
+        game = other_instance.get_game(identifier)
+        game.owner = User("other", other_instance)
+        other_instance.save_game(game)
+
+        # the cached game is stale until its ttl, the changes do not use it
+        assert (await database.get_game(identifier)).owner is None
+        async with database.unit_of_work() as unit:
+            loaded = await unit.get_game(identifier)
+        fresh = await database.get_game(identifier, cached=False)
+        return loaded.owner, fresh.owner, await database.get_game(identifier)
+
+    loaded, fresh, cached = asyncio.run(claim_elsewhere())
+
+    assert loaded.identifier == fresh.identifier == "other"
+    # the games read for a change are cached again
+    assert cached.owner.identifier == "other"
+
+
+async def waited(condition):
+    """Waits until the condition holds, for at most 5 seconds"""
+
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), 5)
+
+
+# fakeredis does not track the keys; the database of REDIS_TEST_URL is flushed
+@pytest.mark.skipif(
+    not os.getenv("REDIS_TEST_URL"), reason="needs a redis server in REDIS_TEST_URL"
+)
+def test_changed_games_are_invalidated():
+    prefix = f"test:{uuid.uuid4()}:"
+    cache = GameCache()
+
+    async def follow():
+        client = redis.asyncio.Redis.from_url(os.environ["REDIS_TEST_URL"])
+        other_instance = redis.asyncio.Redis.from_url(os.environ["REDIS_TEST_URL"])
+        cache.put("missed", {})
+        task = asyncio.create_task(cache.follow_invalidations(client, prefix))
+        try:
+            # the changes missed before the subscription drop everything
+            await waited(lambda: not cache.records)
+
+            cache.put("changed", {})
+            cache.put("kept", {})
+            await other_instance.set(prefix + "changed", "{}")
+            await waited(lambda: "changed" not in cache.records)
+            assert "kept" in cache.records
+
+            # the flushes are sent without the keys
+            await other_instance.flushdb()
+            await waited(lambda: not cache.records)
+            assert not task.done()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+            await other_instance.close()
+
+    asyncio.run(follow())
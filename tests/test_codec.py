@@ -0,0 +1,134 @@
+"""Tests of the formats of the stored states"""
+import baseline
+import fakeredis
+import pytest
+
+from cinasweeper_backend.cinasweeper_database import (BinaryStateCodec,
+                                                      Database,
+                                                      JsonStateCodec)
+from cinasweeper_backend.cinasweeper_logic import (BoardSize, GameMode, Move,
+                                                   UnknownStateFormatError)
+from cinasweeper_backend.cinasweeper_logic.board import Board
+from cinasweeper_backend.cinasweeper_logic.gamestate import GameState
+from cinasweeper_backend.cinasweeper_logic.minesweeper import (Progress,
+                                                               set_mines)
+
+CODECS = {
+    "json": JsonStateCodec,
+    "binary": BinaryStateCodec,
+    "raw_cells": lambda: BinaryStateCodec(raw_cells=True),
+}
+
+
+@pytest.fixture(params=CODECS)
+def database(request):
+    return Database(fakeredis.FakeRedis(), CODECS[request.param]())
+
+
+def assert_same_state(state, expected):
+    assert (state.size, state.seed, state.first_click) == (
+        expected.size,
+        expected.seed,
+        expected.first_click,
+    )
+    assert (state.version, state.moves) == (expected.version, expected.moves)
+    assert state.board.cells == expected.board.cells
+    assert Progress.from_board(state.board) == Progress.from_board(expected.board)
+
+
+def test_new_state_round_trips(database):
+    game = database.create_game(None, GameMode.SINGLEPLAYER, BoardSize(9, 9, 10))
+
+    state = database.get_game_state(game.identifier)
+
+    assert state.board is None
+    assert state.size == BoardSize(9, 9, 10)
+
+
+def test_played_state_round_trips(database):
+    game = database.create_game(None, GameMode.SINGLEPLAYER, BoardSize(16, 30, 99))
+    state = database.get_game_state(game.identifier)
+    state.play_move(Move(7, 7, 1))
+    for mine in state.board.mines[:5]:
+        state.play_move(Move(*mine, 0))
+    state.play_move(Move(*state.board.mines[0], 0))
+    database.save_game_state(game.identifier, state)
+
+    assert_same_state(database.get_game_state(game.identifier), state)
+
+
+def test_converted_board_round_trips(database):
+    board = Board(9, 9)
+    board.place_mines(set_mines(9, 9, 10, (4, 4), 1))
+    board.open(4, 4)
+    state = GameState(
+        database=database,
+        size=BoardSize(9, 9, 10),
+        progress=Progress.from_board(board),
+        version=3,
+        moves=2,
+    )
+    state.board = board
+    database.save_game_state("converted", state)
+
+    assert_same_state(database.get_game_state("converted"), state)
+
+
+def legacy_document():
+    """A state as stored before the compact boards, on a 14x14 board"""
+    mines = set_mines(14, 14, 30, (7, 7), 2)
+    info = baseline.get_info_board(14, 14, mines)
+    gameboard = baseline.generate_board(14, 14)
+    baseline.check_ceil(gameboard, info, (7, 7), zeros := [])
+    baseline.flag(gameboard, mines[0])
+    document = {
+        "gameboard": gameboard,
+        "game_info": info,
+        "mines": [list(mine) for mine in mines],
+        "zeros": zeros,
+    }
+    return document, mines
+
+
+def test_legacy_state_is_migrated():
+    database = Database(fakeredis.FakeRedis(), BinaryStateCodec())
+    document, mines = legacy_document()
+    database.redis_client.json().set("gamestate:legacy", "$", document)
+
+    state = database.get_game_state("legacy")
+
+    assert sorted(state.board.mines) == sorted(mines)
+    assert state.board.is_flagged(*mines[0])
+    assert all(
+        cell == state.board.count(row, col)
+        if state.board.is_open(row, col)
+        else not isinstance(cell, int)
+        for row, cells in enumerate(document["gameboard"])
+        for col, cell in enumerate(cells)
+    )
+
+    state.play_move(Move(*mines[1], 0))
+    database.save_game_state("legacy", state)
+
+    assert not database.redis_client.exists("gamestate:legacy")
+    assert_same_state(database.get_game_state("legacy"), state)
+
+
+def test_legacy_state_is_read_as_json():
+    database = Database(fakeredis.FakeRedis())
+    document, mines = legacy_document()
+    database.redis_client.json().set("gamestate:legacy", "$", document)
+
+    state = database.get_game_state("legacy")
+    state.play_move(Move(*mines[1], 0))
+    database.save_game_state("legacy", state)
+
+    assert_same_state(database.get_game_state("legacy"), state)
+
+
+def test_newer_format_is_refused():
+    database = Database(fakeredis.FakeRedis(), BinaryStateCodec())
+    database.redis_client.set("state:newer", b"\xff" + bytes(40))
+
+    with pytest.raises(UnknownStateFormatError):
+        database.get_game_state("newer")
@@ -0,0 +1,199 @@
+"""Tests of the game engine: the compact boards against the baseline engine"""
+import random
+
+import baseline
+import pytest
+
+from cinasweeper_backend.cinasweeper_logic import board as board_module
+from cinasweeper_backend.cinasweeper_logic.board import FLAG, OPEN, Board
+from cinasweeper_backend.cinasweeper_logic.minesweeper import (Progress,
+                                                               check_ceil,
+                                                               create_board,
+                                                               get_info_board,
+                                                               main, set_mines)
+
+SIZES = [(5, 5), (9, 9), (16, 16), (16, 30)]
+
+
+def visible(board: Board) -> list[list]:
+    """The board as the baseline shows it to the player"""
+    return [
+        [
+            board.count(row, col)
+            if board.is_open(row, col)
+            else "F"
+            if board.is_flagged(row, col)
+            else (row, col)
+            for col in range(board.width)
+        ]
+        for row in range(board.height)
+    ]
+
+
+def test_set_mines_avoids_the_first_step():
+    for height, width in SIZES:
+        step = (random.randrange(height), random.randrange(width))
+        mines = set_mines(height, width, height * width // 4, step)
+
+        assert len(set(mines)) == len(mines) == height * width // 4
+        assert all(0 <= row < height and 0 <= col < width for row, col in mines)
+        assert not [
+            mine
+            for mine in mines
+            if abs(mine[0] - step[0]) <= 1 and abs(mine[1] - step[1]) <= 1
+        ]
+
+
+def test_set_mines_is_seeded():
+    assert set_mines(16, 30, 99, (3, 4), 42) == set_mines(16, 30, 99, (3, 4), 42)
+    assert set_mines(16, 30, 99, (3, 4), 42) != set_mines(16, 30, 99, (3, 4), 43)
+
+
+def test_set_mines_fills_every_allowed_cell():
+    # only the 3x3 square around the step is left without a mine
+    mines = set_mines(5, 5, 16, (2, 2))
+
+    assert sorted(mines) == sorted(
+        (row, col)
+        for row in range(5)
+        for col in range(5)
+        if abs(row - 2) > 1 or abs(col - 2) > 1
+    )
+
+
+@pytest.mark.parametrize("height, width", SIZES)
+def test_counts_match_the_baseline(height, width):
+    rng = random.Random(height * width)
+    mines = set_mines(height, width, height * width // 5, (0, 0), rng.random())
+    board = Board(height, width)
+    board.place_mines(mines)
+
+    info = baseline.get_info_board(height, width, mines)
+
+    assert get_info_board(height, width, mines) == info
+    assert [
+        [
+            -1 if board.is_mine(row, col) else board.count(row, col)
+            for col in range(width)
+        ]
+        for row in range(height)
+    ] == info
+
+
+def test_numpy_placement_matches_the_tables(monkeypatch):
+    pytest.importorskip("numpy")
+    boards = []
+    for height, width in SIZES + [(100, 100)]:
+        mines = set_mines(height, width, height * width // 5, (1, 1), 7)
+        board = Board(height, width)
+        board._place_mines_numpy(mines)
+        boards.append((board, mines))
+
+    monkeypatch.setattr(board_module, "_numpy", lambda: None)
+    for board, mines in boards:
+        with_tables = Board(board.height, board.width)
+        with_tables.place_mines(mines)
+
+        assert with_tables.cells == board.cells
+
+
+def test_neighbours_stay_on_the_board():
+    board = Board(3, 4)
+
+    assert sorted(board.neighbours(board.index(0, 0))) == [1, 4, 5]
+    assert sorted(board.neighbours(board.index(1, 3))) == [2, 3, 6, 10, 11]
+    assert len(board.neighbours(board.index(1, 1))) == 8
+
+
+def test_marks_rebuild_the_board():
+    board = create_board(16, 30, 99, (5, 5), 3)
+    check_ceil(board, (5, 5))
+    board.toggle_flag(*board.mines[0])
+
+    rebuilt = create_board(16, 30, 99, (5, 5), 3)
+    rebuilt.apply_marks(board.marks())
+
+    assert rebuilt.cells == board.cells
+    assert not any(mark & ~(OPEN | FLAG) for mark in board.marks())
+
+
+def test_legacy_board_is_converted():
+    mines = set_mines(9, 9, 10, (4, 4), 5)
+    info = baseline.get_info_board(9, 9, mines)
+    gameboard = baseline.generate_board(9, 9)
+    baseline.check_ceil(gameboard, info, (4, 4), [])
+    baseline.flag(gameboard, mines[0])
+
+    board = Board.from_legacy(gameboard, info)
+
+    assert visible(board) == gameboard
+    assert sorted(board.mines) == sorted(mines)
+
+
+def test_flood_fill_opens_each_cell_once():
+    board = Board(100, 100)
+    board.place_mines([(99, 99)])
+
+    opened = check_ceil(board, (0, 0))
+
+    assert len(opened) == len(set(opened)) == 100 * 100 - 1
+    assert check_ceil(board, (0, 0)) == []
+    assert check_ceil(board, (99, 99)) == "LOST"
+
+
+def test_open_zero_opens_the_unflagged_cells_around_it():
+    board = Board(3, 3)
+    board.place_mines([(2, 2)])
+    progress = Progress(1, 8)
+    main(board, progress, 0, (0, 1))
+    main(board, progress, 1, (0, 0))
+    main(board, progress, 0, (0, 1))
+
+    assert not board.is_open(0, 2)
+    assert main(board, progress, 1, (0, 0)) == "Win"
+    assert progress == Progress.from_board(board)
+    assert [board.is_open(*cell) for cell in [(0, 1), (0, 2), (1, 2)]] == [True] * 3
+
+
+def play_random_game(rng: random.Random, height: int, width: int):
+    """Plays the same random moves with both engines, comparing them
+
+    Yields:
+        tuple: The results of both engines, the board and the progress
+    """
+    num_mines = rng.randint(1, height * width // 4)
+    step = (rng.randrange(height), rng.randrange(width))
+    mines = set_mines(height, width, num_mines, step, rng.random())
+    board = Board(height, width)
+    board.place_mines(mines)
+    progress = Progress(num_mines, height * width - num_mines)
+    old_board = baseline.generate_board(height, width)
+    info = baseline.get_info_board(height, width, mines)
+    old_mines = [list(mine) for mine in mines]
+    zeros: list = []
+
+    moves = [(1, step)] + [
+        (rng.choice([0, 0, 1]), (rng.randrange(height), rng.randrange(width)))
+        for _ in range(150)
+    ]
+    for action, coord in moves:
+        old = baseline.main(old_board, old_mines, info, zeros, action, coord)
+        new = main(board, progress, action, coord)
+        assert visible(board) == old_board
+        yield old, new, board, progress
+        if new in ("Win", "Lose"):
+            return
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_moves_match_the_baseline(seed):
+    rng = random.Random(seed)
+    height, width = rng.choice(SIZES)
+
+    for old, new, board, progress in play_random_game(rng, height, width):
+        assert progress == Progress.from_board(board)
+        if new == "Win" and old != "Win":
+            # every safe cell is open, a win the baseline only got by flags
+            assert progress.opened_cells == progress.safe_cells
+        else:
+            assert new == old
@@ -0,0 +1,73 @@
+"""Tests of the states rebuilt from the snapshots and the logs of the moves"""
+import asyncio
+
+import fakeredis
+import pytest
+
+from cinasweeper_backend.cinasweeper_database import (AsyncDatabase,
+                                                      EventSourcedDatabase)
+from cinasweeper_backend.cinasweeper_logic import BoardSize, GameMode, Move, User
+
+pytest.importorskip("lupa")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def database(server):
+    return EventSourcedDatabase(fakeredis.FakeRedis(server=server), snapshot_every=3)
+
+
+def start_game(database):
+    """Creates a game, plays its first move and returns a closed cell of it"""
+    owner = User("player", database)
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(9, 9, 10))
+    game.play_move(Move(4, 4, 1))
+    board = game.state.board
+    cell = next((x, y) for x in range(9) for y in range(9) if not board.is_open(x, y))
+    return game, cell
+
+
+def assert_same_state(state, other):
+    assert (state.board.marks(), state.version, state.moves) == (
+        other.board.marks(),
+        other.version,
+        other.moves,
+    )
+
+
+def test_state_is_rebuilt_from_the_snapshot_and_the_log(database):
+    game, cell = start_game(database)
+    for _ in range(7):
+        game.play_move(Move(*cell, 0))
+
+    state = database.get_game_state(game.identifier)
+
+    assert state.moves == 8
+    assert_same_state(state, game.state)
+    assert_same_state(state, database.replay_game_state(game.identifier))
+
+
+def test_state_is_rebuilt_after_a_missed_snapshot(database, server, monkeypatch):
+    # the snapshots after the first move are lost, the log is far ahead of it
+    game, cell = start_game(database)
+    monkeypatch.setattr(database, "save_game_state", lambda *args: None)
+    for _ in range(10):
+        game.play_move(Move(*cell, 0))
+    monkeypatch.undo()
+
+    state = database.get_game_state(game.identifier)
+    # every read of the async database goes through its own client
+    async_database = AsyncDatabase(
+        database.with_client(fakeredis.FakeRedis()),
+        fakeredis.aioredis.FakeRedis(server=server),
+    )
+    async_state = asyncio.run(async_database.get_game_state(game.identifier))
+
+    assert state.moves == 11
+    assert_same_state(state, game.state)
+    assert_same_state(state, database.replay_game_state(game.identifier))
+    assert_same_state(async_state, state)
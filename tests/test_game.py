@@ -0,0 +1,25 @@
+"""Tests of the games: moves, endings and scores"""
+from cinasweeper_backend.cinasweeper_database import InMemoryDatabase
+from cinasweeper_backend.cinasweeper_logic import BoardSize, GameMode, Move, User
+
+
+def test_game_won_within_a_second_is_scored():
+    database = InMemoryDatabase()
+    owner = User("player", database)
+    # every mine is outside of the first click, which opens all the safe cells
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(4, 4, 7))
+
+    assert game.play_move(Move(1, 1, 1))
+    assert game.ended
+    assert game.score == 10000**2
+
+
+def test_games_of_an_unknown_user_are_not_indexed():
+    database = InMemoryDatabase()
+    game = database.create_game(User("player", database), GameMode.SINGLEPLAYER)
+
+    assert database.get_games(User("stranger", database)) == ()
+    assert [listed.identifier for listed in database.get_games(game.owner)] == [
+        game.identifier
+    ]
+    assert list(database.owned) == ["player"]
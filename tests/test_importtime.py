@@ -0,0 +1,62 @@
+"""Tests of the cold start of the Lambda handler"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+# the budget of the whole import of app.py, in milliseconds
+BUDGET = 500
+# imported by the requests that use them, not by the handler itself
+DEFERRED = ["firebase_admin", "numpy", "redis.commands.search"]
+# the fastest import is the least disturbed by the rest of the machine
+RUNS = 3
+
+IMPORT_APP = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def import_app() -> dict:
+    """Imports app.py in a fresh interpreter
+
+    Returns:
+        dict: The time the import took in milliseconds and the modules imported
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT / "src"), str(ROOT)]))
+    stdout = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(stdout)
+
+
+@pytest.fixture(scope="module")
+def imports():
+    pytest.importorskip("mangum")
+    return [import_app() for _ in range(RUNS)]
+
+
+@pytest.mark.parametrize("package", DEFERRED)
+def test_deferred_modules_are_not_imported(imports, package):
+    modules = imports[0]["modules"]
+    assert not [
+        module
+        for module in modules
+        if module == package or module.startswith(f"{package}.")
+    ]
+
+
+def test_import_is_within_the_budget(imports):
+    assert min(run["elapsed"] for run in imports) <= BUDGET
@@ -0,0 +1,87 @@
+"""Tests of the leaderboards"""
+import asyncio
+
+import fakeredis
+import pytest
+
+from cinasweeper_backend.cinasweeper_database import (AsyncDatabase, Database,
+                                                      InMemoryDatabase)
+from cinasweeper_backend.cinasweeper_logic import BoardSize, GameMode, Move, User
+
+
+def lose_game(database, owner):
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(9, 9, 10))
+    game.play_move(Move(4, 4, 1))
+    mine = game.state.board.mines[0]
+    game.play_move(Move(*mine, 1))
+    assert game.ended
+    return game
+
+
+def win_game(database, owner):
+    # every mine is outside of the first click, which opens all the safe cells
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(4, 4, 7))
+    game.play_move(Move(1, 1, 1))
+    assert game.ended
+    return game
+
+
+@pytest.fixture(params=["memory", "redis"])
+def database(request):
+    if request.param == "memory":
+        return InMemoryDatabase()
+    return Database(fakeredis.FakeRedis())
+
+
+def test_lost_games_are_not_ranked(database):
+    owner = User("player", database)
+    lost = lose_game(database, owner)
+    leaderboard = database.get_leaderboard()
+
+    assert leaderboard.top_n(10) == ()
+    assert leaderboard.user_rank(owner) is None
+    assert database.get_game_rank(lost.identifier) is None
+
+    won = win_game(database, owner)
+
+    assert [game.identifier for game in leaderboard.top_n(10)] == [won.identifier]
+    assert leaderboard.user_rank(owner) == 1
+
+
+def test_games_not_found_are_removed_from_the_leaderboard():
+    client = fakeredis.FakeRedis()
+    database = Database(client)
+    owner = User("player", database)
+    won = [win_game(database, owner) for _ in range(3)]
+    client.delete(f"game:{won[0].identifier}")
+    client.zadd("leaderboard:games:all", {"ghost": 10**9})
+
+    games = database.get_top_games(3)
+
+    # the games won within a second all have the same score
+    assert {game.identifier for game in games} == {
+        won[1].identifier,
+        won[2].identifier,
+    }
+    assert client.zscore("leaderboard:games:all", "ghost") is None
+    assert client.zcard("leaderboard:games:all") == 2
+
+
+def test_games_not_found_are_removed_from_the_leaderboard_async():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    database = Database(client)
+    owner = User("player", database)
+    won = [win_game(database, owner) for _ in range(3)]
+    client.delete(f"game:{won[0].identifier}")
+    async_database = AsyncDatabase(
+        database, fakeredis.aioredis.FakeRedis(server=server)
+    )
+
+    games = asyncio.run(async_database.get_top_games(3))
+
+    assert {game.identifier for game in games} == {
+        won[1].identifier,
+        won[2].identifier,
+    }
+    assert client.zcard("leaderboard:games:all") == 2
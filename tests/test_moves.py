@@ -0,0 +1,143 @@
+"""Tests of the moves played in redis by the move script"""
+import random
+
+import fakeredis
+import pytest
+
+from cinasweeper_backend.cinasweeper_database import BinaryStateCodec, Database
+from cinasweeper_backend.cinasweeper_logic import BoardSize, GameMode, Move, User
+from cinasweeper_backend.cinasweeper_logic.board import COUNT, FLAG, OPEN
+from cinasweeper_backend.cinasweeper_logic.exceptions import (
+    CellOutOfBoardError, GameEndedError)
+from cinasweeper_backend.cinasweeper_logic.minesweeper import Progress
+
+pytest.importorskip("lupa")
+
+
+@pytest.fixture
+def database():
+    return Database(fakeredis.FakeRedis(), BinaryStateCodec(raw_cells=True))
+
+
+def test_scripted_move_sends_back_the_state(database):
+    owner = User("player", database)
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(9, 9, 10))
+    # the first move places the mines, so it is played in python
+    assert game.play_move_atomic(Move(4, 4, 1)) is None
+    game.play_move(Move(4, 4, 1))
+    board = database.get_game_state(game.identifier).board
+    x, y = next(
+        (x, y)
+        for x in range(9)
+        for y in range(9)
+        if not board.is_open(x, y) and not board.is_mine(x, y)
+    )
+
+    outcome = game.play_move_atomic(Move(x, y, 1), with_state=True)
+
+    assert outcome.state is game.state
+    stored = database.get_game_state(game.identifier)
+    assert outcome.state.board.is_open(x, y)
+    assert outcome.state.version == stored.version
+    assert all(
+        outcome.state.board.is_open(i, j) == stored.board.is_open(i, j)
+        for i in range(9)
+        for j in range(9)
+    )
+
+
+def play_first_move(database, rng, height, width):
+    """Creates a game and plays its first move, None if it decides the game"""
+    mines = rng.randint(1, height * width // 5)
+    game = database.create_game(
+        None, GameMode.SINGLEPLAYER, BoardSize(height, width, mines)
+    )
+    # the mines are not placed yet, the script leaves the move to python
+    assert database.apply_moves(game.identifier, [Move(0, 0, 1)]) is None
+    state = database.get_game_state(game.identifier)
+    if state.play_move(Move(rng.randrange(height), rng.randrange(width), 1)):
+        return None
+    database.save_game_state(game.identifier, state)
+    return game
+
+
+def random_moves(rng, height, width, count):
+    # a few moves are outside of the board
+    return [
+        Move(
+            rng.randrange(-1, height + 1)
+            if rng.random() < 0.02
+            else rng.randrange(height),
+            rng.randrange(width),
+            rng.choice([0, 0, 1]),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("batch", [1, 12])
+def test_script_plays_like_python(database, batch):
+    rng = random.Random(batch)
+    for _ in range(30):
+        height, width = rng.choice([(5, 5), (9, 9), (14, 14), (30, 16)])
+        game = play_first_move(database, rng, height, width)
+        if game is None:
+            continue
+        expected = database.get_game_state(game.identifier)
+        for _ in range(40):
+            moves = random_moves(rng, height, width, rng.randint(1, batch))
+            try:
+                results = expected.play_moves(moves)
+            except CellOutOfBoardError:
+                with pytest.raises(CellOutOfBoardError):
+                    database.apply_moves(game.identifier, moves)
+                continue
+
+            outcome = database.apply_moves(game.identifier, moves)
+
+            assert outcome.results == results
+            assert outcome.result == results[-1]
+            assert outcome.version == expected.version
+            assert sorted(set(expected.changes)) == sorted(
+                (x, y) for x, y, _ in outcome.changes
+            )
+            assert all(
+                expected.board.cells[x * width + y] == value
+                for x, y, value in outcome.changes
+            )
+            stored = database.get_game_state(game.identifier)
+            assert stored.board.cells == expected.board.cells
+            assert stored.progress == expected.progress
+            assert stored.moves == expected.moves
+            if results[-1] in ("Win", "Lose"):
+                assert len(outcome.mines) == expected.progress.num_mines
+                with pytest.raises(GameEndedError):
+                    database.apply_moves(game.identifier, [Move(0, 0, 1)])
+                break
+
+
+def test_script_opens_again_around_an_open_zero(database):
+    game = None
+    while game is None:
+        game = play_first_move(database, random.Random(0), 9, 9)
+    state = database.get_game_state(game.identifier)
+    board = state.board
+    # a cell flagged while the zeros around it were opened
+    zero, cell = next(
+        (index, neighbour)
+        for index, value in enumerate(board.cells)
+        if value & OPEN and not value & COUNT
+        for neighbour in board.neighbours(index)
+    )
+    board.cells[cell] ^= OPEN | FLAG
+    state.progress = Progress.from_board(board)
+    database.save_game_state(game.identifier, state)
+    moves = [Move(*divmod(cell, 9), 0), Move(*divmod(zero, 9), 1)]
+    expected = database.get_game_state(game.identifier)
+
+    results = expected.play_moves(moves)
+    outcome = database.apply_moves(game.identifier, moves)
+
+    assert expected.board.cells[cell] & OPEN
+    assert outcome.results == results
+    assert database.get_game_state(game.identifier).board.cells == expected.board.cells
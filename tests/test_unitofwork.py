@@ -0,0 +1,116 @@
+"""Tests of the units of work of the requests"""
+import asyncio
+
+import fakeredis
+import pytest
+
+from cinasweeper_backend.cinasweeper_database import (AsyncDatabase, Database,
+                                                      GameCache)
+from cinasweeper_backend.cinasweeper_database.unitofwork import UnitOfWork
+from cinasweeper_backend.cinasweeper_logic import BoardSize, GameMode, Move, User
+from cinasweeper_backend.cinasweeper_logic.exceptions import GameNotFoundError
+
+
+class Pipelines(list):
+    """The pipelines opened on a client, one per round trip"""
+
+    def watch(self, monkeypatch, client):
+        pipeline = client.pipeline
+
+        def counted(*args, **kwargs):
+            self.append(args)
+            return pipeline(*args, **kwargs)
+
+        monkeypatch.setattr(client, "pipeline", counted)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def database(server):
+    return Database(fakeredis.FakeRedis(server=server))
+
+
+def new_game(database):
+    owner = User("player", database)
+    game = database.create_game(owner, GameMode.SINGLEPLAYER, BoardSize(9, 9, 10))
+    game.play_move(Move(4, 4, 1))
+    return game
+
+
+def test_game_is_loaded_with_its_state_once(database, monkeypatch):
+    identifier = new_game(database).identifier
+    pipelines = Pipelines()
+    pipelines.watch(monkeypatch, database.redis_client)
+
+    with UnitOfWork(database) as unit:
+        game = unit.get_game(identifier)
+        assert unit.get_game(identifier) is game
+        assert unit.get_game_state(identifier) is unit.get_game_state(identifier)
+
+    assert len(pipelines) == 1
+
+
+def test_writes_are_sent_on_commit(server, database, monkeypatch):
+    identifier = new_game(database).identifier
+    version = database.get_game_state(identifier).version
+    other_instance = Database(fakeredis.FakeRedis(server=server))
+    pipelines = Pipelines()
+    pipelines.watch(monkeypatch, database.redis_client)
+
+    with UnitOfWork(database) as unit:
+        state = unit.get_game_state(identifier)
+        flag = Move(*state.board.mines[0], 0)
+        unit.get_game(identifier).play_move(flag)
+        unit.get_game(identifier).play_move(Move(*state.board.mines[1], 0))
+        assert other_instance.get_game_state(identifier).version == version
+
+    assert len(pipelines) == 2
+    stored = database.get_game_state(identifier)
+    assert stored.version == version + 2
+    assert stored.board.is_flagged(flag.x, flag.y)
+
+
+def test_writes_are_discarded_on_error(database):
+    identifier = new_game(database).identifier
+    version = database.get_game_state(identifier).version
+
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(database) as unit:
+            state = unit.get_game_state(identifier)
+            unit.get_game(identifier).play_move(Move(*state.board.mines[0], 0))
+            raise RuntimeError
+
+    assert database.get_game_state(identifier).version == version
+
+
+def test_missing_game_is_not_found(database):
+    identifier = new_game(database).identifier
+
+    with pytest.raises(GameNotFoundError):
+        with UnitOfWork(database) as unit:
+            unit.get_games_by_ids([identifier, "missing"])
+
+
+def test_async_unit_of_work(server, database):
+    identifier = new_game(database).identifier
+    version = database.get_game_state(identifier).version
+    cache = GameCache()
+    async_database = AsyncDatabase(
+        database, fakeredis.aioredis.FakeRedis(server=server), cache
+    )
+
+    async def play():
+        async with async_database.unit_of_work() as unit:
+            game = await unit.get_game(identifier)
+            state = await unit.get_game_state(identifier)
+            await game.play_move_async(Move(*state.board.mines[0], 0))
+            assert database.get_game_state(identifier).version == version
+
+    asyncio.run(play())
+
+    assert database.get_game_state(identifier).version == version + 1
+    assert cache.get(identifier) is not None